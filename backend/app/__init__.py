@@ -1,2 +1,25 @@
 # BCS Assist Backend Application
+import os
 
+# Settings are read from the environment at import time, so a local .env file
+# is loaded here, before any module reads one. Like python-dotenv's
+# find_dotenv(), the nearest .env in the services directory or any directory
+# above it is used (backend/.env, the repository root, ...); python-dotenv is
+# only imported when there is a file to load (deployed containers configure
+# the environment).
+def _find_env_file():
+    directory = os.path.join(os.path.dirname(os.path.abspath(__file__)), "services")
+    while True:
+        path = os.path.join(directory, ".env")
+        if os.path.isfile(path):
+            return path
+        parent = os.path.dirname(directory)
+        if parent == directory:
+            return None
+        directory = parent
+
+
+_env_file = _find_env_file()
+if _env_file is not None:
+    from dotenv import load_dotenv
+    load_dotenv(_env_file)
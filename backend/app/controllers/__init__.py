@@ -1,4 +1,4 @@
 from .conversation_controller import ConversationController
+from .invalidation_controller import InvalidationController
 
-__all__ = ["ConversationController"]
-
+__all__ = ["ConversationController", "InvalidationController"]
@@ -1,7 +1,21 @@
-from app.models.schemas import MockAuthPayload, ProcessedConversationResponse
-from app.services.auth_service import get_genesys_auth_token
+from typing import Tuple
+
+from app.core.admission import ADMISSION_OVERLOAD_MODE, Overloaded, admitted
+from app.core.metrics import ADMISSION_FALLBACKS
+from app.core.profiling import run_in_threadpool
+from app.core.rate_limit import get_rate_limiter, rate_limit_key
+from app.core.recording import note_request
+from app.core.timing import timed
+from app.core.tracing import start_span
+from app.models.schemas import (
+    MockAuthPayload, PrepPackData, PrepPackDelta, ProcessedConversationResponse, SyncPayload
+)
+from app.services.auth_service import agent_id_from_token, get_genesys_auth_token
 from app.services.customer_service import get_genesys_customer_data
-from app.services.prep_pack_service import generate_prep_pack_data
+from app.services.prep_pack_service import changed_sections, generate_prep_pack_data
+from app.services.push_service import Subscription, get_update_hub
+from app.services.rng import request_rng
+from app.services.session_service import issue_session, verify_session
 
 
 class ConversationController:
@@ -13,27 +27,143 @@ class ConversationController:
     async def process_conversation(payload: MockAuthPayload) -> ProcessedConversationResponse:
         """
         Orchestrates the flow of authenticating, fetching customer data,
-        and generating the full prep pack data for the dashboard.
+        and generating the full prep pack data for the dashboard. The
+        response carries a session token for the dashboard's later /sync
+        and push calls, since the auth code cannot be exchanged twice.
         """
-        #  Authenticate with Genesys to get an access token
-        access_token = await get_genesys_auth_token(
-            auth_code=payload.authorizationCode,
-            code_verifier=payload.codeVerifier
-        )
+        with start_span("ConversationController.process_conversation",
+                        conversation_id=payload.conversationId) as span:
+            #  Authenticate with Genesys to get an access token
+            with timed("auth"):
+                access_token = await get_genesys_auth_token(
+                    auth_code=payload.authorizationCode,
+                    code_verifier=payload.codeVerifier
+                )
         
-        #  Get customer data from Genesys using the conversation ID
-        customer_data = await get_genesys_customer_data(
-            conversation_id=payload.conversationId,
-            access_token=access_token
-        )
+            #  Get customer data from Genesys using the conversation ID
+            with timed("customer"):
+                customer_data = await get_genesys_customer_data(
+                    conversation_id=payload.conversationId,
+                    access_token=access_token
+                )
+            note_request(conversation_id=payload.conversationId, customer_id=customer_data.customer_id)
+            agent_id = agent_id_from_token(access_token)
         
-        #  Generate the full prep pack data for the dashboard
-        prep_pack_data = generate_prep_pack_data(
-            customer_id=customer_data.customer_id
-        )
+            #  Generate the full prep pack data for the dashboard
+            prep_pack_data, degraded = await ConversationController.build_rate_limited(
+                agent_id, payload.conversationId, customer_data.customer_id
+            )
+            span.set_attribute("customer_id", customer_data.customer_id)
         
         # Return the consolidated response
         return ProcessedConversationResponse(
-            prep_pack_data=prep_pack_data
+            prep_pack_data=prep_pack_data,
+            degraded=degraded,
+            session_token=issue_session(payload.conversationId, customer_data.customer_id, agent_id)
+        )
+
+    @staticmethod
+    async def sync_conversation(payload: SyncPayload) -> PrepPackDelta:
+        """
+        Returns the sections whose version differs from the client's version
+        vector. The session token names the customer, so there is no auth
+        exchange or customer lookup; the pack comes from the cached sections,
+        and only sections evicted since (by TTL or a change event) are
+        queried again. Raises InvalidSession for a bad or expired token.
+        """
+        session = verify_session(payload.sessionToken)
+        with start_span("ConversationController.sync_conversation",
+                        conversation_id=session.conversation_id, customer_id=session.customer_id):
+            note_request(conversation_id=session.conversation_id, customer_id=session.customer_id)
+            prep_pack_data, _ = await ConversationController.build_prep_pack_or_fallback(session.customer_id)
+        with timed("diff"):
+            changed = changed_sections(prep_pack_data, payload.versions)
+        return PrepPackDelta(section_versions=prep_pack_data.section_versions, changed=changed)
+
+    @staticmethod
+    async def build_rate_limited(agent_id: str, conversation_id: str, customer_id: str) -> Tuple[PrepPackData, bool]:
+        """
+        build_prep_pack_or_fallback under the rate limiter, if one is
+        configured: the agent and the conversation each have a token bucket,
+        and repeat calls for a conversation share the build in flight, or
+        the most recent one once over a limit. Degraded packs are never
+        shared. Raises RateLimited when there is nothing to share.
+        """
+        limiter = get_rate_limiter()
+        if limiter is None:
+            return await ConversationController.build_prep_pack_or_fallback(customer_id)
+        key = rate_limit_key(conversation_id)
+        prep_pack_data, degraded = await limiter.run(
+            key,
+            {"agent": rate_limit_key(agent_id), "conversation": key},
+            lambda: ConversationController.build_prep_pack_or_fallback(customer_id),
+            keep=lambda result: not result[1],
         )
+        return prep_pack_data, degraded
+
+    @staticmethod
+    async def build_prep_pack(customer_id: str) -> PrepPackData:
+        """
+        Generates the customer's prep pack and offers it to any dashboards
+        subscribed to that customer, so every rebuild doubles as a push.
+        Builds wait for one of the worker's admission slots; if none comes in
+        time, Overloaded is raised.
+        """
+        async with admitted():
+            #  Mock values are drawn from a generator private to this request.
+            #  The BigQuery client is synchronous, so this runs on the thread
+            #  pool to keep the loop free.
+            prep_pack_data = await run_in_threadpool(
+                generate_prep_pack_data,
+                customer_id=customer_id,
+                rng=request_rng(customer_id)
+            )
+        get_update_hub().publish(customer_id, prep_pack_data)
+        return prep_pack_data
+
+    @staticmethod
+    async def build_prep_pack_or_fallback(customer_id: str) -> Tuple[PrepPackData, bool]:
+        """
+        build_prep_pack for requests that must get an answer: when the build
+        is not admitted and ADMISSION_OVERLOAD_MODE=fallback, a pack is
+        assembled from cached sections (fallback data for the rest) instead.
+        Returns the pack and whether it is such a degraded one, which is not
+        pushed and must not be cached or shared.
+        """
+        try:
+            return await ConversationController.build_prep_pack(customer_id), False
+        except Overloaded:
+            if ADMISSION_OVERLOAD_MODE != "fallback":
+                raise
+        ADMISSION_FALLBACKS.inc()
+        # No queries run, but a shared cache tier still does I/O, so this stays off the loop
+        with timed("overload_fallback"):
+            prep_pack_data = await run_in_threadpool(
+                generate_prep_pack_data, customer_id, request_rng(customer_id), cached_only=True
+            )
+        return prep_pack_data, True
 
+    @staticmethod
+    async def subscribe(payload: SyncPayload) -> Tuple[Subscription, PrepPackDelta]:
+        """
+        Opens a push subscription for a dashboard: checks its session token
+        like /sync, registers for the customer's updates and returns the
+        delta that brings the client's version vector up to date. Reconnects
+        present the same token, so none of them re-authenticates. Raises
+        InvalidSession for a bad or expired token.
+        """
+        session = verify_session(payload.sessionToken)
+        with start_span("ConversationController.subscribe",
+                        conversation_id=session.conversation_id, customer_id=session.customer_id):
+            # Registered before the build, so an update landing meanwhile is not missed
+            subscription = get_update_hub().subscribe(
+                session.customer_id, session.conversation_id, payload.versions
+            )
+            try:
+                await ConversationController.build_prep_pack(session.customer_id)
+            except BaseException:
+                get_update_hub().unsubscribe(subscription)
+                raise
+        # build_prep_pack already offered the new pack, which queued whatever
+        # the client lacked; hand that over as the first message
+        return subscription, PrepPackDelta(**subscription.take_pending())
@@ -0,0 +1,71 @@
+import asyncio
+import logging
+import os
+from typing import List, Set
+
+from app.controllers.conversation_controller import ConversationController
+from app.core.metrics import INVALIDATION_REFRESHES
+from app.core.profiling import run_in_threadpool
+from app.models.schemas import ChangeEvent, InvalidationResult
+from app.services.invalidation_service import evict_changed_sections
+from app.services.push_service import get_update_hub
+
+logger = logging.getLogger(__name__)
+
+# Prep pack rebuilds one batch of change events may run at once
+INVALIDATION_REFRESH_CONCURRENCY = int(os.getenv("INVALIDATION_REFRESH_CONCURRENCY", "4"))
+
+# Background refreshes still running; the loop only holds weak references to tasks
+_refresh_tasks: Set[asyncio.Task] = set()
+
+
+class InvalidationController:
+    """
+    Controller applying customer data change events from the webhook or the
+    change queue.
+    """
+
+    @staticmethod
+    async def apply_changes(events: List[ChangeEvent], source: str) -> InvalidationResult:
+        """
+        Evicts the changed sections and returns as soon as they are gone, so
+        a webhook caller or queue consumer is not held up by rebuilds. Every
+        affected customer that an open dashboard is watching is then rebuilt
+        in the background (refresh_watched); unwatched customers are rebuilt
+        lazily on their next request.
+        """
+        # Off the loop: with a shared tier or query cache, eviction does I/O
+        customers, evicted, ignored = await run_in_threadpool(evict_changed_sections, events, source)
+        hub = get_update_hub()
+        watched = [customer_id for customer_id in customers if hub.is_watched(customer_id)]
+        if watched:
+            task = asyncio.create_task(InvalidationController.refresh_watched(watched))
+            _refresh_tasks.add(task)
+            task.add_done_callback(_refresh_tasks.discard)
+        logger.info("Applied change events", extra={
+            "source": source, "events": len(events), "evicted": evicted, "refreshing": len(watched),
+        })
+        return InvalidationResult(evicted=evicted, ignored=ignored, refreshing=len(watched))
+
+    @staticmethod
+    async def refresh_watched(customer_ids: List[str]) -> int:
+        """
+        Rebuilds and pushes the packs of the given customers, at most
+        INVALIDATION_REFRESH_CONCURRENCY at a time, and returns how many
+        succeeded. A rebuild re-queries only the evicted sections (the rest
+        are cache hits); failures are logged, not raised.
+        """
+        semaphore = asyncio.Semaphore(INVALIDATION_REFRESH_CONCURRENCY)
+
+        async def refresh(customer_id: str) -> bool:
+            async with semaphore:
+                try:
+                    await ConversationController.build_prep_pack(customer_id)
+                except Exception as e:
+                    logger.error("Refreshing prep pack failed: %s", e, extra={"customer_id": customer_id})
+                    return False
+            INVALIDATION_REFRESHES.inc()
+            return True
+
+        refreshed = await asyncio.gather(*(refresh(customer_id) for customer_id in customer_ids))
+        return sum(refreshed)
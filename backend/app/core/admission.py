@@ -0,0 +1,133 @@
+import asyncio
+import logging
+import os
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque
+
+from app.core.metrics import (
+    ADMISSION_CONCURRENCY_LIMIT, ADMISSION_IN_FLIGHT, ADMISSION_QUEUE_LIMIT, ADMISSION_QUEUE_WAIT, ADMISSION_QUEUED,
+    ADMISSION_REJECTED,
+)
+from app.core.timing import timed
+
+logger = logging.getLogger(__name__)
+
+# Prep pack builds (BigQuery work) one worker runs at once; 0 disables admission control.
+# Keep it below the thread pool size (40 by default) so other blocking work still gets threads.
+ADMISSION_MAX_CONCURRENCY = int(os.getenv("ADMISSION_MAX_CONCURRENCY", "32"))
+# Builds that may wait for a slot; beyond this, requests are turned away at once
+ADMISSION_MAX_QUEUE = int(os.getenv("ADMISSION_MAX_QUEUE", "64"))
+# Longest a build waits for a slot before it is turned away
+ADMISSION_QUEUE_TIMEOUT_SECONDS = float(os.getenv("ADMISSION_QUEUE_TIMEOUT_SECONDS", "3"))
+ADMISSION_RETRY_AFTER_SECONDS = int(os.getenv("ADMISSION_RETRY_AFTER_SECONDS", "2"))
+# "fallback" serves a pack from cached sections (fallback data for the rest); "reject" returns 503
+ADMISSION_OVERLOAD_MODE = os.getenv("ADMISSION_OVERLOAD_MODE", "fallback")
+
+
+class Overloaded(Exception):
+    """Raised when work is not admitted: the wait queue is full or the wait ran out."""
+
+    def __init__(self, reason: str, retry_after: int):
+        super().__init__(f"Overloaded ({reason})")
+        self.reason = reason
+        self.retry_after = retry_after
+
+
+class AdmissionLimiter:
+    """
+    Per-worker concurrency limit with a bounded FIFO wait queue. At most
+    max_concurrency holders run at once and up to max_queue more wait, each
+    for at most queue_timeout seconds; anything beyond that fails fast with
+    Overloaded. When a dependency slows down, requests back up into this
+    bounded queue instead of into memory and every client's timeout at once.
+
+    Slots are handed straight to the next waiter on release, so a newcomer
+    cannot overtake the queue. Used from the event loop only.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int, queue_timeout: float, retry_after: int = 2):
+        self.max_concurrency = max_concurrency
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+        self.active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+    def _reject(self, reason: str) -> Overloaded:
+        ADMISSION_REJECTED.labels(reason).inc()
+        logger.warning("Request not admitted", extra={
+            "reason": reason, "active": self.active, "queued": self.queued,
+        })
+        return Overloaded(reason, self.retry_after)
+
+    async def acquire(self) -> None:
+        if self.active < self.max_concurrency and not self._waiters:
+            self.active += 1
+            ADMISSION_QUEUE_WAIT.observe(0.0)
+            return
+        if len(self._waiters) >= self.max_queue:
+            raise self._reject("queue_full")
+
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        start = time.perf_counter()
+        try:
+            await asyncio.wait_for(waiter, self.queue_timeout)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot was handed over just as the wait ended; pass it on
+                self.release()
+            else:
+                self._discard(waiter)
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise self._reject("queue_timeout") from None
+        ADMISSION_QUEUE_WAIT.observe(time.perf_counter() - start)
+
+    def _discard(self, waiter: asyncio.Future) -> None:
+        try:
+            self._waiters.remove(waiter)
+        except ValueError:
+            pass
+
+    def release(self) -> None:
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                # The slot passes to the waiter, so active stays the same
+                waiter.set_result(None)
+                return
+        self.active -= 1
+
+
+_limiter = AdmissionLimiter(ADMISSION_MAX_CONCURRENCY, ADMISSION_MAX_QUEUE, ADMISSION_QUEUE_TIMEOUT_SECONDS,
+                            ADMISSION_RETRY_AFTER_SECONDS)
+ADMISSION_IN_FLIGHT.set_function(lambda: _limiter.active)
+ADMISSION_QUEUED.set_function(lambda: _limiter.queued)
+ADMISSION_CONCURRENCY_LIMIT.set_function(lambda: _limiter.max_concurrency)
+ADMISSION_QUEUE_LIMIT.set_function(lambda: _limiter.max_queue)
+
+
+@asynccontextmanager
+async def admitted() -> AsyncIterator[None]:
+    """Holds one of this worker's build slots for the enclosed block (a no-op when disabled)."""
+    if _limiter.max_concurrency <= 0:
+        yield
+        return
+    # The wait shows up as its own Server-Timing stage and span
+    with timed("admission"):
+        await _limiter.acquire()
+    try:
+        yield
+    finally:
+        _limiter.release()
+
+
+def get_admission_limiter() -> AdmissionLimiter:
+    return _limiter
@@ -0,0 +1,166 @@
+import atexit
+import json
+import logging
+import os
+import queue
+import sys
+import uuid
+import zlib
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+from app.core.tracing import current_span
+
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+# Fraction of requests whose DEBUG lines are kept (all-or-nothing per request)
+DEBUG_SAMPLE_RATE = float(os.getenv("LOG_DEBUG_SAMPLE_RATE", "0.1"))
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+request_id_var: ContextVar[Optional[str]] = ContextVar("request_id", default=None)
+
+# Attributes every LogRecord has; anything else was passed via extra=
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "request_id", "trace_id"}
+
+
+class RequestContextFilter(logging.Filter):
+    """Stamps each record with the current request and trace IDs before it leaves the calling thread."""
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.request_id = request_id_var.get()
+        span = current_span()
+        record.trace_id = span.trace_id if span is not None else None
+        return True
+
+
+class DebugSamplingFilter(logging.Filter):
+    """
+    Keeps DEBUG records for a sampled subset of requests. The decision is a
+    hash of the request ID, so a sampled request keeps all of its debug lines.
+    """
+
+    def __init__(self, rate: float):
+        super().__init__()
+        self.threshold = int(max(0.0, min(rate, 1.0)) * 0xFFFFFFFF)
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > logging.DEBUG:
+            return True
+        request_id = getattr(record, "request_id", None)
+        if request_id is None:
+            return True
+        return zlib.crc32(request_id.encode()) <= self.threshold
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, with extra= fields lifted to the top level."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "timestamp": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "severity": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        if getattr(record, "request_id", None):
+            entry["request_id"] = record.request_id
+        if getattr(record, "trace_id", None):
+            entry["trace_id"] = record.trace_id
+        for key, value in record.__dict__.items():
+            if key not in _RESERVED_ATTRS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_text:
+            entry["exception"] = record.exc_text
+        return json.dumps(entry, default=str)
+
+
+class _NonBlockingQueueHandler(QueueHandler):
+    """Drops records rather than blocking the caller when the queue is full."""
+
+    def enqueue(self, record: logging.LogRecord) -> None:
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            pass
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # Render the exception here (the traceback cannot cross threads) but keep
+        # msg/args intact so the JSON formatter sees the original record fields
+        if record.exc_info and not record.exc_text:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+        record.exc_info = None
+        return record
+
+
+_listener: Optional[QueueListener] = None
+
+
+def configure_logging() -> None:
+    """
+    Routes all application logging through a bounded queue drained by a
+    background thread, so a log call on the event loop never waits on stdout.
+    Safe to call more than once.
+    """
+    global _listener
+    if _listener is not None:
+        return
+
+    log_queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_SIZE)
+    stream_handler = logging.StreamHandler(sys.stdout)
+    stream_handler.setFormatter(JsonFormatter())
+
+    queue_handler = _NonBlockingQueueHandler(log_queue)
+    queue_handler.addFilter(RequestContextFilter())
+    queue_handler.addFilter(DebugSamplingFilter(DEBUG_SAMPLE_RATE))
+
+    app_logger = logging.getLogger("app")
+    app_logger.setLevel(LOG_LEVEL)
+    app_logger.addHandler(queue_handler)
+    app_logger.propagate = False
+
+    _listener = QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """Flushes queued records and stops the writer thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+class RequestIdMiddleware:
+    """
+    Pure ASGI middleware that binds a request ID (from X-Request-ID, or a new
+    one) to the logging context and echoes it on the response.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        request_id = None
+        for name, value in scope["headers"]:
+            if name == b"x-request-id":
+                request_id = value.decode("latin-1")[:128]
+                break
+        if not request_id:
+            request_id = uuid.uuid4().hex
+
+        async def send_with_request_id(message):
+            if message["type"] == "http.response.start":
+                message["headers"] = [*message.get("headers", ()), (b"x-request-id", request_id.encode("latin-1"))]
+            await send(message)
+
+        token = request_id_var.set(request_id)
+        try:
+            await self.app(scope, receive, send_with_request_id)
+        finally:
+            request_id_var.reset(token)
@@ -0,0 +1,95 @@
+import asyncio
+import logging
+import os
+import sys
+import threading
+import time
+import traceback
+from typing import Optional
+
+from app.core.metrics import Counter, Gauge, Histogram
+
+LOOP_MONITOR_ENABLED = os.getenv("LOOP_MONITOR_ENABLED", "true").lower() == "true"
+LOOP_MONITOR_INTERVAL_MS = float(os.getenv("LOOP_MONITOR_INTERVAL_MS", "100"))
+LOOP_BLOCK_THRESHOLD_MS = float(os.getenv("LOOP_BLOCK_THRESHOLD_MS", "100"))
+
+logger = logging.getLogger(__name__)
+
+LOOP_LAG = Histogram(
+    "bcs_event_loop_lag_seconds", "Delay between a scheduled event loop wake-up and when it ran.",
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5)
+)
+LOOP_LAG_LAST = Gauge("bcs_event_loop_lag_last_seconds", "Most recent event loop lag sample.")
+LOOP_BLOCKED = Counter(
+    "bcs_event_loop_blocked_total", "Times a single callback blocked the event loop past the threshold."
+)
+
+
+class EventLoopMonitor:
+    """
+    Measures event loop lag continuously and reports callbacks that block it.
+
+    A coroutine on the loop sleeps for a fixed interval and records how late it
+    wakes up. A watchdog thread checks the coroutine's heartbeat; when it goes
+    stale for longer than the threshold, the loop thread is stuck inside one
+    callback, so the watchdog logs that thread's current stack once per stall.
+    """
+
+    def __init__(self, interval_ms: float = LOOP_MONITOR_INTERVAL_MS,
+                 block_threshold_ms: float = LOOP_BLOCK_THRESHOLD_MS):
+        self.interval = interval_ms / 1000
+        self.block_threshold = block_threshold_ms / 1000
+        self.last_lag = 0.0
+        self._heartbeat = time.monotonic()
+        self._loop_thread_id: Optional[int] = None
+        self._task: Optional[asyncio.Task] = None
+        self._stop = threading.Event()
+        self._watchdog: Optional[threading.Thread] = None
+        self._lag_child = LOOP_LAG.labels()
+        LOOP_LAG_LAST.set_function(lambda: self.last_lag)
+
+    def start(self) -> None:
+        self._loop_thread_id = threading.get_ident()
+        self._heartbeat = time.monotonic()
+        self._task = asyncio.get_running_loop().create_task(self._measure())
+        self._stop.clear()
+        self._watchdog = threading.Thread(target=self._watch, name="loop-watchdog", daemon=True)
+        self._watchdog.start()
+
+    async def stop(self) -> None:
+        self._stop.set()
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+        if self._watchdog is not None:
+            self._watchdog.join(timeout=1)
+
+    async def _measure(self) -> None:
+        loop = asyncio.get_running_loop()
+        while True:
+            scheduled = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - scheduled - self.interval)
+            self.last_lag = lag
+            self._lag_child.observe(lag)
+            self._heartbeat = time.monotonic()
+
+    def _watch(self) -> None:
+        reported_heartbeat = None
+        while not self._stop.wait(self.block_threshold / 2):
+            heartbeat = self._heartbeat
+            stalled_for = time.monotonic() - heartbeat - self.interval
+            if stalled_for < self.block_threshold or heartbeat == reported_heartbeat:
+                continue
+            reported_heartbeat = heartbeat
+            LOOP_BLOCKED.inc()
+            frame = sys._current_frames().get(self._loop_thread_id)
+            stack = "".join(traceback.format_stack(frame)) if frame is not None else "<unavailable>"
+            logger.warning("Event loop blocked", extra={
+                "blocked_for_ms": round(stalled_for * 1000, 1),
+                "threshold_ms": round(self.block_threshold * 1000, 1),
+                "stack": stack,
+            })
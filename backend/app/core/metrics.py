@@ -0,0 +1,379 @@
+import threading
+import time
+import weakref
+from bisect import bisect_left
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+class _ShardedValues:
+    """
+    A fixed-size vector of floats split into one shard per thread.
+
+    Writers only touch their own thread's shard, so increments need no lock
+    and allocate nothing after a thread's first write. Readers (the /metrics
+    scrape) sum across shards.
+    """
+
+    def __init__(self, size: int):
+        self._size = size
+        self._local = threading.local()
+        self._shards: List[List[float]] = []
+        self._lock = threading.Lock()
+
+    def shard(self) -> List[float]:
+        values = getattr(self._local, "values", None)
+        if values is None:
+            values = self._local.values = [0.0] * self._size
+            with self._lock:
+                self._shards.append(values)
+        return values
+
+    def totals(self) -> List[float]:
+        with self._lock:
+            shards = list(self._shards)
+        totals = [0.0] * self._size
+        for values in shards:
+            for i, value in enumerate(values):
+                totals[i] += value
+        return totals
+
+
+class _Metric:
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._children: Dict[Tuple[str, ...], object] = {}
+        self._lock = threading.Lock()
+        REGISTRY.append(self)
+
+    def _new_child(self):
+        raise NotImplementedError
+
+    def labels(self, *values: str):
+        """Returns the child for a label combination. Hold on to it on hot paths."""
+        child = self._children.get(values)
+        if child is None:
+            with self._lock:
+                child = self._children.get(values)
+                if child is None:
+                    child = self._children[values] = self._new_child()
+        return child
+
+    def _label_text(self, values: Tuple[str, ...], extra: str = "") -> str:
+        pairs = [f'{name}="{_escape(value)}"' for name, value in zip(self.labelnames, values)]
+        if extra:
+            pairs.append(extra)
+        return "{" + ",".join(pairs) + "}" if pairs else ""
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.documentation}", f"# TYPE {self.name} {self.kind}"]
+        for values, child in list(self._children.items()):
+            lines.extend(self._render_child(values, child))
+        return lines
+
+    def _render_child(self, values, child) -> List[str]:
+        raise NotImplementedError
+
+
+class _CounterChild:
+    __slots__ = ("_values",)
+
+    def __init__(self):
+        self._values = _ShardedValues(1)
+
+    def inc(self, amount: float = 1.0) -> None:
+        self._values.shard()[0] += amount
+
+    def get(self) -> float:
+        return self._values.totals()[0]
+
+
+class Counter(_Metric):
+    kind = "counter"
+
+    def _new_child(self):
+        return _CounterChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{self._label_text(values)} {_format(child.get())}"]
+
+
+class _GaugeChild(_CounterChild):
+    __slots__ = ()
+
+    def dec(self, amount: float = 1.0) -> None:
+        self._values.shard()[0] -= amount
+
+
+class Gauge(_Metric):
+    """A gauge that is moved with inc/dec, or computed at scrape time via set_function."""
+
+    kind = "gauge"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self._function: Optional[Callable[[], float]] = None
+
+    def _new_child(self):
+        return _GaugeChild()
+
+    def inc(self, amount: float = 1.0) -> None:
+        self.labels().inc(amount)
+
+    def dec(self, amount: float = 1.0) -> None:
+        self.labels().dec(amount)
+
+    def set_function(self, function: Callable[[], float]) -> None:
+        self._function = function
+
+    def render(self) -> List[str]:
+        if self._function is None:
+            return super().render()
+        return [
+            f"# HELP {self.name} {self.documentation}",
+            f"# TYPE {self.name} {self.kind}",
+            f"{self.name} {_format(self._function())}",
+        ]
+
+    def _render_child(self, values, child):
+        return [f"{self.name}{self._label_text(values)} {_format(child.get())}"]
+
+
+class _HistogramChild:
+    __slots__ = ("_bounds", "_values")
+
+    def __init__(self, bounds: Tuple[float, ...]):
+        self._bounds = bounds
+        # One slot per bucket (plus +Inf), then sum and count
+        self._values = _ShardedValues(len(bounds) + 3)
+
+    def observe(self, value: float) -> None:
+        values = self._values.shard()
+        values[bisect_left(self._bounds, value)] += 1
+        values[-2] += value
+        values[-1] += 1
+
+    def time(self) -> "_Timer":
+        return _Timer(self)
+
+
+class _Timer:
+    __slots__ = ("_child", "_start")
+
+    def __init__(self, child: _HistogramChild):
+        self._child = child
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self._child.observe(time.perf_counter() - self._start)
+
+
+class Histogram(_Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Sequence[str] = (),
+                 buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self.buckets = tuple(sorted(buckets))
+        super().__init__(name, documentation, labelnames)
+
+    def _new_child(self):
+        return _HistogramChild(self.buckets)
+
+    def observe(self, value: float) -> None:
+        self.labels().observe(value)
+
+    def _render_child(self, values, child):
+        totals = child._values.totals()
+        lines = []
+        cumulative = 0.0
+        for bound, count in zip(self.buckets + (float("inf"),), totals):
+            cumulative += count
+            le = "+Inf" if bound == float("inf") else _format(bound)
+            bucket_labels = self._label_text(values, 'le="' + le + '"')
+            lines.append(f"{self.name}_bucket{bucket_labels} {_format(cumulative)}")
+        lines.append(f"{self.name}_sum{self._label_text(values)} {_format(totals[-2])}")
+        lines.append(f"{self.name}_count{self._label_text(values)} {_format(totals[-1])}")
+        return lines
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format(value: float) -> str:
+    return repr(float(value))
+
+
+REGISTRY: List[_Metric] = []
+_caches: "weakref.WeakSet" = weakref.WeakSet()
+
+
+def register_cache(cache) -> None:
+    """Exports a cache's hit/miss counters and size. Read only at scrape time."""
+    _caches.add(cache)
+
+
+def _render_caches() -> List[str]:
+    caches = sorted(_caches, key=lambda c: c.name)
+    if not caches:
+        return []
+    lines = []
+    for name, kind, documentation, read in (
+        ("bcs_cache_hits_total", "counter", "Cache lookups served from the cache.", lambda c: c.hits),
+        ("bcs_cache_misses_total", "counter", "Cache lookups that missed.", lambda c: c.misses),
+        ("bcs_cache_entries", "gauge", "Entries currently held.", len),
+        ("bcs_cache_hit_ratio", "gauge", "Hits over total lookups since start.",
+         lambda c: c.hits / (c.hits + c.misses) if c.hits + c.misses else 0.0),
+    ):
+        lines.append(f"# HELP {name} {documentation}")
+        lines.append(f"# TYPE {name} {kind}")
+        for cache in caches:
+            lines.append(f'{name}{{cache="{_escape(cache.name)}"}} {_format(read(cache))}')
+    return lines
+
+
+def render_latest() -> str:
+    """Renders every registered metric in the Prometheus text exposition format."""
+    lines: List[str] = []
+    for metric in REGISTRY:
+        lines.extend(metric.render())
+    lines.extend(_render_caches())
+    return "\n".join(lines) + "\n"
+
+
+# --- Application metrics ---
+
+REQUEST_LATENCY = Histogram(
+    "bcs_http_request_duration_seconds", "HTTP request latency by route.", ["route"]
+)
+REQUESTS_TOTAL = Counter(
+    "bcs_http_requests_total", "HTTP requests by route and status class.", ["route", "status"]
+)
+REQUESTS_IN_FLIGHT = Gauge(
+    "bcs_http_requests_in_flight", "HTTP requests currently being handled."
+)
+STAGE_LATENCY = Histogram(
+    "bcs_prep_pack_stage_duration_seconds",
+    "Latency of each prep pack stage (auth, customer lookup, BigQuery sections, assembly, serialisation).",
+    ["stage"]
+)
+BIGQUERY_QUERIES = Counter(
+    "bcs_bigquery_queries_total", "BigQuery section queries issued.", ["table"]
+)
+BIGQUERY_ERRORS = Counter(
+    "bcs_bigquery_errors_total", "BigQuery section queries that raised an error.", ["table"]
+)
+BIGQUERY_FALLBACKS = Counter(
+    "bcs_bigquery_fallbacks_total", "Sections served from fallback mock data (error or no rows).", ["table"]
+)
+PUSH_SUBSCRIBERS = Gauge(
+    "bcs_push_subscribers", "Prep pack update subscriptions (open WebSockets) on this worker."
+)
+PUSH_UPDATES_PUBLISHED = Counter(
+    "bcs_push_updates_published_total", "Prep pack updates fanned out to at least one subscriber."
+)
+PUSH_MESSAGES_SENT = Counter(
+    "bcs_push_messages_sent_total", "Delta messages sent to subscribers."
+)
+PUSH_SECTIONS_COALESCED = Counter(
+    "bcs_push_sections_coalesced_total", "Section updates replaced by a newer one before they were sent."
+)
+PUSH_DISCONNECTS = Counter(
+    "bcs_push_disconnects_total", "Subscriptions closed by the server.", ["reason"]
+)
+INVALIDATION_EVENTS = Counter(
+    "bcs_invalidation_events_total", "Change events received, by source and table.", ["source", "table"]
+)
+INVALIDATION_REFRESHES = Counter(
+    "bcs_invalidation_refreshes_total", "Prep packs rebuilt and pushed after a change event."
+)
+INVALIDATION_SOURCE_ERRORS = Counter(
+    "bcs_invalidation_source_errors_total", "Failures receiving or applying a batch from the change queue."
+)
+ADMISSION_IN_FLIGHT = Gauge(
+    "bcs_admission_in_flight", "Prep pack builds holding an admission slot on this worker."
+)
+ADMISSION_QUEUED = Gauge(
+    "bcs_admission_queued", "Prep pack builds waiting for an admission slot on this worker."
+)
+ADMISSION_CONCURRENCY_LIMIT = Gauge(
+    "bcs_admission_concurrency_limit", "Admission slots per worker (ADMISSION_MAX_CONCURRENCY)."
+)
+ADMISSION_QUEUE_LIMIT = Gauge(
+    "bcs_admission_queue_limit", "Builds that may wait for a slot per worker (ADMISSION_MAX_QUEUE)."
+)
+ADMISSION_QUEUE_WAIT = Histogram(
+    "bcs_admission_queue_wait_seconds", "Time admitted builds waited for a slot."
+)
+ADMISSION_REJECTED = Counter(
+    "bcs_admission_rejected_total", "Builds not admitted, by reason (queue_full, queue_timeout).", ["reason"]
+)
+ADMISSION_FALLBACKS = Counter(
+    "bcs_admission_fallbacks_total", "Prep packs served from cached and fallback sections because of overload."
+)
+RATE_LIMIT_REQUESTS = Counter(
+    "bcs_rate_limit_requests_total",
+    "Rate-limited calls by outcome (allowed, coalesced_in_flight, coalesced_recent, rejected).", ["outcome"]
+)
+
+_STATUS_CLASSES = ("1xx", "2xx", "3xx", "4xx", "5xx")
+
+
+class MetricsMiddleware:
+    """
+    Pure ASGI middleware recording per-route latency, status and in-flight
+    count. Routes are labelled by their path template, never the raw URL.
+    Each route's label children are bound on its first request and reused,
+    so recording a request is a single dict lookup.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._in_flight = REQUESTS_IN_FLIGHT.labels()
+        self._routes: Dict[str, Tuple[_HistogramChild, Tuple[_CounterChild, ...]]] = {}
+
+    def _children(self, label: str) -> Tuple[_HistogramChild, Tuple[_CounterChild, ...]]:
+        children = self._routes.get(label)
+        if children is None:
+            children = self._routes[label] = (
+                REQUEST_LATENCY.labels(label),
+                tuple(REQUESTS_TOTAL.labels(label, status) for status in _STATUS_CLASSES),
+            )
+        return children
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_with_status(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        self._in_flight.inc()
+        start = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self._in_flight.dec()
+            route = scope.get("route")
+            latency, totals = self._children(route.path if route is not None else "unmatched")
+            latency.observe(time.perf_counter() - start)
+            totals[min(status_code // 100, 5) - 1].inc()
@@ -0,0 +1,254 @@
+import contextvars
+import logging
+import os
+import secrets
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter
+from types import FrameType
+from typing import Any, Callable, Dict, List, Optional, Set, TypeVar
+
+from starlette.concurrency import run_in_threadpool as _run_in_threadpool
+
+# Profiling is disabled unless a token is configured
+PROFILING_TOKEN = os.getenv("PROFILING_TOKEN")
+PROFILE_DIR = os.getenv("PROFILE_DIR", "/tmp/bcs-profiles")
+PROFILE_INTERVAL_MS = float(os.getenv("PROFILE_INTERVAL_MS", "5"))
+
+logger = logging.getLogger(__name__)
+
+# Leaf frames in these files are threads parked waiting for work
+_IDLE_FILES = ("threading.py", "selectors.py", "queue.py")
+
+
+def is_authorised(token: Optional[str]) -> bool:
+    return bool(PROFILING_TOKEN) and token is not None and secrets.compare_digest(token, PROFILING_TOKEN)
+
+
+T = TypeVar("T")
+
+
+class RequestThreads:
+    """
+    Where one request's work runs: the event loop thread while the request's
+    own task is running there (its root frame is on that thread's stack),
+    and thread pool workers while they run calls made for the request
+    through run_in_threadpool below. Other requests share both, so only
+    these samples belong to the request.
+    """
+
+    def __init__(self, root_frame: FrameType):
+        self.loop_thread = threading.get_ident()
+        self.root_frame = root_frame
+        # Added and removed by the worker threads themselves
+        self.workers: Set[int] = set()
+
+    def includes(self, thread_id: int, frame: FrameType) -> bool:
+        if thread_id in self.workers:
+            return True
+        if thread_id != self.loop_thread:
+            return False
+        while frame is not None:
+            if frame is self.root_frame:
+                return True
+            frame = frame.f_back
+        return False
+
+
+_profiled_request: contextvars.ContextVar[Optional[RequestThreads]] = contextvars.ContextVar(
+    "profiled_request", default=None
+)
+
+
+async def run_in_threadpool(func: Callable[..., T], *args: Any, **kwargs: Any) -> T:
+    """
+    starlette's run_in_threadpool, with the worker thread counted as part of
+    the request while it runs the call, if the request is being profiled.
+    """
+    threads = _profiled_request.get()
+    if threads is None:
+        return await _run_in_threadpool(func, *args, **kwargs)
+
+    def tracked() -> T:
+        thread_id = threading.get_ident()
+        threads.workers.add(thread_id)
+        try:
+            return func(*args, **kwargs)
+        finally:
+            threads.workers.discard(thread_id)
+
+    return await _run_in_threadpool(tracked)
+
+
+class SamplingProfiler:
+    """
+    Statistical profiler that samples Python stacks from a background
+    thread: every thread's, or with threads given, only those doing that
+    request's work. Results are in the folded-stack format read by
+    flamegraph.pl, speedscope and inferno ("thread;frame;frame count").
+    """
+
+    def __init__(self, interval_ms: float = PROFILE_INTERVAL_MS, threads: Optional[RequestThreads] = None):
+        self.interval = interval_ms / 1000
+        self.threads = threads
+        self.samples: Counter = Counter()
+        self.sample_count = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="sampling-profiler", daemon=True)
+
+    def start(self) -> None:
+        self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self) -> None:
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {t.ident: t.name for t in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id or frame.f_code.co_filename.endswith(_IDLE_FILES):
+                    continue
+                if self.threads is not None and not self.threads.includes(thread_id, frame):
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{os.path.basename(code.co_filename)}:{code.co_name}:{frame.f_lineno}")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.samples[";".join(reversed(stack))] += 1
+            self.sample_count += 1
+
+    def folded(self) -> str:
+        return "".join(f"{stack} {count}\n" for stack, count in self.samples.most_common())
+
+
+def save_profile(profiler: SamplingProfiler) -> str:
+    """Writes a folded profile under PROFILE_DIR and returns its ID."""
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    profile_id = uuid.uuid4().hex
+    with open(os.path.join(PROFILE_DIR, f"{profile_id}.folded"), "w") as f:
+        f.write(profiler.folded())
+    return profile_id
+
+
+def load_profile(profile_id: str) -> Optional[str]:
+    if not profile_id.isalnum():
+        return None
+    path = os.path.join(PROFILE_DIR, f"{profile_id}.folded")
+    if not os.path.exists(path):
+        return None
+    with open(path) as f:
+        return f.read()
+
+
+class ProfilingMiddleware:
+    """
+    Profiles a single request on demand. A request carrying the privileged
+    X-Profile-Token header is sampled for its whole duration, on the threads
+    doing its work only (see RequestThreads); the folded profile is stored
+    and its ID returned in the X-Profile-Id header. One request is profiled
+    at a time, and everything else pays only a header scan. The token is
+    only accepted as a header, never in the URL, where logs and traces
+    would record it.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._busy = threading.Lock()
+
+    def _requested_token(self, scope) -> Optional[str]:
+        for name, value in scope["headers"]:
+            if name == b"x-profile-token":
+                return value.decode("latin-1")
+        return None
+
+    async def __call__(self, scope, receive, send):
+        if (scope["type"] != "http" or not PROFILING_TOKEN
+                or not is_authorised(self._requested_token(scope))
+                or not self._busy.acquire(blocking=False)):
+            await self.app(scope, receive, send)
+            return
+
+        threads = RequestThreads(sys._getframe())
+        profiler = SamplingProfiler(threads=threads)
+        profile_id = None
+        start = time.perf_counter()
+
+        def finish() -> str:
+            profiler.stop()
+            return save_profile(profiler)
+
+        async def send_with_profile(message):
+            nonlocal profile_id
+            if message["type"] == "http.response.start":
+                # The handler has finished by the time headers go out. Joining
+                # the sampler and writing the file happen off the event loop.
+                profile_id = await _run_in_threadpool(finish)
+                message["headers"] = [*message.get("headers", ()), (b"x-profile-id", profile_id.encode())]
+            await send(message)
+
+        profiler.start()
+        token = _profiled_request.set(threads)
+        try:
+            await self.app(scope, receive, send_with_profile)
+        finally:
+            _profiled_request.reset(token)
+            if profile_id is None:
+                await _run_in_threadpool(profiler.stop)
+            self._busy.release()
+            logger.info("Request profiled", extra={
+                "path": scope["path"], "profile_id": profile_id, "samples": profiler.sample_count,
+                "duration_ms": round((time.perf_counter() - start) * 1000, 2)})
+
+
+# --- tracemalloc snapshots ---
+
+_snapshot_lock = threading.Lock()
+_last_snapshot: Optional[tracemalloc.Snapshot] = None
+
+
+def start_tracemalloc(frames: int = 10) -> None:
+    if not tracemalloc.is_tracing():
+        tracemalloc.start(frames)
+
+
+def stop_tracemalloc() -> None:
+    global _last_snapshot
+    with _snapshot_lock:
+        _last_snapshot = None
+    tracemalloc.stop()
+
+
+def take_tracemalloc_snapshot(limit: int = 25) -> Dict[str, object]:
+    """
+    Takes a snapshot and reports the top allocation sites, plus the growth
+    since the previous snapshot so repeated calls show what keeps growing.
+    """
+    global _last_snapshot
+    if not tracemalloc.is_tracing():
+        raise RuntimeError("tracemalloc is not running")
+    snapshot = tracemalloc.take_snapshot().filter_traces((
+        tracemalloc.Filter(False, tracemalloc.__file__),
+        tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+    ))
+    current, peak = tracemalloc.get_traced_memory()
+    with _snapshot_lock:
+        previous, _last_snapshot = _last_snapshot, snapshot
+
+    top: List[Dict[str, object]] = [
+        {"location": str(stat.traceback[0]), "size_bytes": stat.size, "count": stat.count}
+        for stat in snapshot.statistics("lineno")[:limit]
+    ]
+    growth: List[Dict[str, object]] = []
+    if previous is not None:
+        growth = [
+            {"location": str(stat.traceback[0]), "size_diff_bytes": stat.size_diff, "count_diff": stat.count_diff}
+            for stat in snapshot.compare_to(previous, "lineno")[:limit]
+        ]
+    return {"traced_current_bytes": current, "traced_peak_bytes": peak, "top": top, "growth_since_last": growth}
@@ -0,0 +1,325 @@
+import asyncio
+import hashlib
+import importlib
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Optional, Tuple
+
+from app.core.cache import TTLCache
+from app.core.metrics import RATE_LIMIT_REQUESTS
+from app.core.profiling import run_in_threadpool
+from app.core.shared_cache import SHARED_CACHE_PATH, SHARED_CACHE_URL, build_cache, redis_client
+from app.core.timing import timed
+
+logger = logging.getLogger(__name__)
+
+# Where token buckets live: none (off, the default) | memory (per worker) | sqlite
+# (SHARED_CACHE_PATH, shared by the workers of one host) | redis (SHARED_CACHE_URL,
+# shared by every instance) | package.module:Class (a TokenBuckets subclass)
+RATE_LIMIT_BACKEND = os.getenv("RATE_LIMIT_BACKEND", "none")
+# Sustained prep pack builds allowed per conversation, and the burst on top
+RATE_LIMIT_CONVERSATION_PER_SECOND = float(os.getenv("RATE_LIMIT_CONVERSATION_PER_SECOND", "0.5"))
+RATE_LIMIT_CONVERSATION_BURST = int(os.getenv("RATE_LIMIT_CONVERSATION_BURST", "3"))
+# The same per agent, across all of the agent's conversations
+RATE_LIMIT_AGENT_PER_SECOND = float(os.getenv("RATE_LIMIT_AGENT_PER_SECOND", "2"))
+RATE_LIMIT_AGENT_BURST = int(os.getenv("RATE_LIMIT_AGENT_BURST", "10"))
+# How long a result is kept for calls over the limit (in the shared cache tier, if configured)
+RATE_LIMIT_RESULT_TTL_SECONDS = float(os.getenv("RATE_LIMIT_RESULT_TTL_SECONDS", "60"))
+RATE_LIMIT_MAX_RESULTS = int(os.getenv("RATE_LIMIT_MAX_RESULTS", "2000"))
+RATE_LIMIT_MAX_KEYS = int(os.getenv("RATE_LIMIT_MAX_KEYS", "100000"))
+
+
+class RateLimited(Exception):
+    """Raised when a call is over a limit (scope) and there is no result to coalesce it onto."""
+
+    def __init__(self, retry_after: int, scope: str):
+        super().__init__(f"Rate limited per {scope}, retry after {retry_after}s")
+        self.retry_after = retry_after
+        self.scope = scope
+
+
+def rate_limit_key(*parts: str) -> str:
+    """A fixed-size key for the given identifiers, so they never reach a bucket store as they are."""
+    return hashlib.blake2b("\x1f".join(parts).encode(), digest_size=16).hexdigest()
+
+
+class TokenBuckets:
+    """
+    Token buckets by key: each holds up to burst tokens and refills at rate
+    tokens per second; a call takes one. Subclasses keep the state somewhere
+    (set blocking when take does I/O, so it runs off the event loop).
+    """
+
+    blocking = False
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = burst
+
+    def take(self, key: str) -> float:
+        """Takes a token: 0.0 if one was available, else the seconds until the next one."""
+        raise NotImplementedError
+
+    def _refill(self, tokens: float, updated_at: float, now: float) -> Tuple[float, float]:
+        """Returns the tokens left after taking one (or not) and the wait (0.0 when taken)."""
+        tokens = min(self.burst, tokens + max(0.0, now - updated_at) * self.rate)
+        if tokens >= 1:
+            return tokens - 1, 0.0
+        return tokens, (1 - tokens) / self.rate
+
+
+class InMemoryTokenBuckets(TokenBuckets):
+    """
+    Buckets in this process. The least recently used are dropped past
+    max_keys: an idle bucket has refilled anyway, so forgetting it only
+    matters for keys still mid-burst.
+    """
+
+    def __init__(self, rate: float, burst: int, max_keys: int = 100000):
+        super().__init__(rate, burst)
+        self.max_keys = max_keys
+        self._buckets: "OrderedDict[str, Tuple[float, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key: str) -> float:
+        now = time.monotonic()
+        with self._lock:
+            tokens, updated_at = self._buckets.get(key, (self.burst, now))
+            tokens, wait = self._refill(tokens, updated_at, now)
+            self._buckets[key] = (tokens, now)
+            self._buckets.move_to_end(key)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+        return wait
+
+
+class SQLiteTokenBuckets(TokenBuckets):
+    """
+    Buckets in an SQLite file, shared by the workers of one host. Each take
+    is one write transaction; errors let the call through, since failing
+    closed would turn a broken limiter into an outage.
+    """
+
+    blocking = True
+    PRUNE_EVERY = 1000
+
+    def __init__(self, path: str, rate: float, burst: int):
+        super().__init__(rate, burst)
+        self.path = path
+        self._local = threading.local()
+        self._takes = 0
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS rate_limit_buckets (key TEXT PRIMARY KEY, tokens REAL, updated_at REAL)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def take(self, key: str) -> float:
+        now = time.time()
+        db = self._connection()
+        try:
+            db.execute("BEGIN IMMEDIATE")
+            try:
+                row = db.execute("SELECT tokens, updated_at FROM rate_limit_buckets WHERE key = ?", (key,)).fetchone()
+                tokens, wait = self._refill(*(row or (self.burst, now)), now)
+                db.execute("INSERT OR REPLACE INTO rate_limit_buckets VALUES (?, ?, ?)", (key, tokens, now))
+                self._takes += 1
+                if self._takes % self.PRUNE_EVERY == 0:
+                    # Buckets idle this long are full again, the same as having no row
+                    db.execute("DELETE FROM rate_limit_buckets WHERE updated_at < ?", (now - self.burst / self.rate,))
+                db.execute("COMMIT")
+            except BaseException:
+                db.execute("ROLLBACK")
+                raise
+        except sqlite3.Error as e:
+            logger.debug("Rate limit bucket update failed: %s", e)
+            return 0.0
+        return wait
+
+
+# Refill and take in one atomic step on the Redis server, on the server's clock
+_REDIS_TAKE = """
+local burst = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local clock = redis.call('TIME')
+local now = tonumber(clock[1]) + tonumber(clock[2]) / 1000000
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated_at')
+local tokens = tonumber(state[1]) or burst
+local updated_at = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated_at) * rate)
+local wait = 0
+if tokens >= 1 then
+    tokens = tokens - 1
+else
+    wait = (1 - tokens) / rate
+end
+redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'updated_at', tostring(now))
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return tostring(wait)
+"""
+
+
+class RedisTokenBuckets(TokenBuckets):
+    """
+    Buckets in Redis, shared by every instance; a Lua script makes each take
+    atomic. Keys expire once their bucket would be full again. Errors let
+    the call through.
+    """
+
+    blocking = True
+
+    def __init__(self, client, rate: float, burst: int, prefix: str = "bcs:rate_limit:"):
+        super().__init__(rate, burst)
+        self.prefix = prefix
+        self._script = client.register_script(_REDIS_TAKE)
+
+    def take(self, key: str) -> float:
+        try:
+            return float(self._script(keys=[self.prefix + key], args=[self.burst, self.rate]))
+        except Exception as e:
+            logger.debug("Rate limit bucket update failed: %s", e)
+            return 0.0
+
+
+def buckets_from_setting(setting: str, rate: float, burst: int) -> Optional[TokenBuckets]:
+    if setting in ("", "none"):
+        return None
+    if setting == "memory":
+        return InMemoryTokenBuckets(rate, burst, RATE_LIMIT_MAX_KEYS)
+    if setting == "sqlite":
+        return SQLiteTokenBuckets(SHARED_CACHE_PATH, rate, burst)
+    if setting == "redis":
+        return RedisTokenBuckets(redis_client(SHARED_CACHE_URL, "RATE_LIMIT_BACKEND"), rate, burst)
+    module_name, _, class_name = setting.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)(rate, burst)
+
+
+class CoalescingLimiter:
+    """
+    Rate limits repeated calls without failing them. Each call names its key
+    (what identical calls share) and one bucket key per scope it is limited
+    in, such as the agent and the conversation.
+
+    A call joins the one already in flight for its key, if any (without
+    taking tokens); otherwise it takes a token in every scope and runs. A
+    call over any limit gets the key's most recent result instead of doing
+    new work, and RateLimited only when there is none (for example because
+    the last call failed).
+
+    keep decides whether a result may be shared at all. One it rejects (a
+    degraded answer) is neither stored as the key's recent result nor handed
+    to the calls that joined it; those run again on their own, as they do
+    when the call they joined was cancelled.
+    """
+
+    def __init__(self, buckets: Dict[str, TokenBuckets], results):
+        self.buckets = buckets
+        self.results = results
+        # A shared cache tier does I/O as well, so it is used off the loop too
+        self._results_blocking = not isinstance(results, TTLCache)
+        self._in_flight: Dict[str, asyncio.Future] = {}
+
+    async def _call(self, blocking: bool, func: Callable, *args: Any) -> Any:
+        if blocking:
+            return await run_in_threadpool(func, *args)
+        return func(*args)
+
+    async def _take(self, limits: Dict[str, str]) -> Tuple[float, str]:
+        """
+        Takes a token in each scope; returns the longest wait and the scope it
+        is for. Bucket keys are prefixed with their scope, so the scopes can
+        share one store.
+        """
+        wait, over = 0.0, ""
+        for scope, bucket_key in limits.items():
+            buckets = self.buckets[scope]
+            scope_wait = await self._call(buckets.blocking, buckets.take, f"{scope}:{bucket_key}")
+            if scope_wait > wait:
+                wait, over = scope_wait, scope
+        return wait, over
+
+    async def _join(self, in_flight: asyncio.Future, key: str, limits: Dict[str, str],
+                    produce: Callable[[], Awaitable[Any]], keep: Callable[[Any], bool]) -> Any:
+        with timed("coalesced"):
+            # Waits without being cancelled along with the call that runs it
+            await asyncio.wait({in_flight})
+        if in_flight.cancelled() or not keep(in_flight.result()):
+            return await self.run(key, limits, produce, keep)
+        RATE_LIMIT_REQUESTS.labels("coalesced_in_flight").inc()
+        return in_flight.result()
+
+    async def run(self, key: str, limits: Dict[str, str], produce: Callable[[], Awaitable[Any]],
+                  keep: Callable[[Any], bool] = lambda result: True) -> Any:
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            return await self._join(in_flight, key, limits, produce, keep)
+
+        wait, over = await self._take(limits)
+        # A call for the key may have started while a blocking bucket was checked
+        in_flight = self._in_flight.get(key)
+        if in_flight is not None:
+            return await self._join(in_flight, key, limits, produce, keep)
+        if wait > 0:
+            recent = await self._call(self._results_blocking, self.results.get, key)
+            if recent is not None:
+                RATE_LIMIT_REQUESTS.labels("coalesced_recent").inc()
+                with timed("coalesced"):
+                    return recent
+            RATE_LIMIT_REQUESTS.labels("rejected").inc()
+            raise RateLimited(max(1, math.ceil(wait)), over)
+
+        RATE_LIMIT_REQUESTS.labels("allowed").inc()
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            result = await produce()
+            future.set_result(result)
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except Exception as e:
+            future.set_exception(e)
+            # Mark the exception as retrieved when nobody else was waiting on it
+            future.exception()
+            raise
+        finally:
+            del self._in_flight[key]
+        if keep(result):
+            await self._call(self._results_blocking, self.results.set, key, result)
+        return result
+
+
+_limiter: Optional[CoalescingLimiter] = None
+_limiter_lock = threading.Lock()
+
+
+def get_rate_limiter() -> Optional[CoalescingLimiter]:
+    """
+    The limiter for prep pack builds requested through /api/v1/process, with
+    "agent" and "conversation" scopes; created on first use, None when
+    RATE_LIMIT_BACKEND=none.
+    """
+    global _limiter
+    if _limiter is None and RATE_LIMIT_BACKEND not in ("", "none"):
+        with _limiter_lock:
+            if _limiter is None:
+                buckets = {
+                    "agent": buckets_from_setting(RATE_LIMIT_BACKEND, RATE_LIMIT_AGENT_PER_SECOND,
+                                                  RATE_LIMIT_AGENT_BURST),
+                    "conversation": buckets_from_setting(RATE_LIMIT_BACKEND, RATE_LIMIT_CONVERSATION_PER_SECOND,
+                                                         RATE_LIMIT_CONVERSATION_BURST),
+                }
+                results = build_cache("recent_prep_packs", RATE_LIMIT_RESULT_TTL_SECONDS, RATE_LIMIT_MAX_RESULTS)
+                _limiter = CoalescingLimiter(buckets, results)
+    return _limiter
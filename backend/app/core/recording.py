@@ -0,0 +1,190 @@
+import gzip
+import hashlib
+import hmac
+import json
+import logging
+import os
+import queue
+import secrets
+import threading
+import time
+from contextvars import ContextVar
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+# Recording is off unless a trace file is configured; "{pid}" gives each worker its own file
+TRACE_RECORD_FILE = os.getenv("TRACE_RECORD_FILE")
+# Key for pseudonymising IDs; share it across workers so their tokens line up
+TRACE_RECORD_KEY = os.getenv("TRACE_RECORD_KEY")
+TRACE_RECORD_PATHS = tuple(p for p in os.getenv("TRACE_RECORD_PATHS", "/api/v1/process").split(",") if p)
+
+TRACE_FORMAT = "bcs-request-trace"
+TRACE_VERSION = 1
+
+logger = logging.getLogger(__name__)
+
+_current_record: ContextVar[Optional[Dict[str, Any]]] = ContextVar("trace_record", default=None)
+
+
+def note_request(**fields: str) -> None:
+    """
+    Attaches identifiers (conversation_id, customer_id) to the request being
+    recorded. They are pseudonymised before anything is written.
+    """
+    record = _current_record.get()
+    if record is not None:
+        record.update(fields)
+
+
+class TraceRecorder:
+    """
+    Appends one compact JSON line per request to a trace file from a
+    background thread. Conversation and customer IDs are replaced by keyed
+    hashes, so the file keeps the repetition structure (reloads, hot
+    customers) but no identifiers.
+
+    File layout: a header line ({"format", "version", "started_at"}) then
+    records {"t": seconds since start, "m": method, "p": path, "c": conversation
+    token, "u": customer token, "s": status, "d": duration ms}.
+    """
+
+    def __init__(self, path: str, key: Optional[str] = None, max_queue: int = 10000):
+        self.path = path.replace("{pid}", str(os.getpid()))
+        self._key = (key or secrets.token_hex(16)).encode()
+        self._start_wall = time.time()
+        self._start = time.perf_counter()
+        self.dropped = 0
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        opener = gzip.open if self.path.endswith(".gz") else open
+        self._file = opener(self.path, "at")
+        self._file.write(json.dumps({
+            "format": TRACE_FORMAT, "version": TRACE_VERSION,
+            "started_at": datetime.fromtimestamp(self._start_wall, timezone.utc).isoformat(),
+            "start_time": self._start_wall,
+        }) + "\n")
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="trace-recorder", daemon=True)
+        self._thread.start()
+
+    def pseudonymise(self, value: Optional[str]) -> Optional[str]:
+        if value is None:
+            return None
+        return hmac.new(self._key, value.encode(), hashlib.sha256).hexdigest()[:16]
+
+    def submit(self, started: float, method: str, path: str, fields: Dict[str, Any],
+               status: int, duration_ms: float) -> None:
+        entry = {
+            "t": round(started - self._start, 4),
+            "m": method,
+            "p": path,
+            "c": self.pseudonymise(fields.get("conversation_id")),
+            "u": self.pseudonymise(fields.get("customer_id")),
+            "s": status,
+            "d": round(duration_ms, 2),
+        }
+        try:
+            self._queue.put_nowait(entry)
+        except queue.Full:
+            self.dropped += 1
+
+    def _run(self) -> None:
+        while True:
+            entry = self._queue.get()
+            if entry is None:
+                break
+            lines = [entry]
+            while True:
+                try:
+                    entry = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if entry is None:
+                    self._write(lines)
+                    return
+                lines.append(entry)
+            self._write(lines)
+
+    def _write(self, entries: List[Dict[str, Any]]) -> None:
+        try:
+            self._file.writelines(json.dumps(e, separators=(",", ":")) + "\n" for e in entries)
+            self._file.flush()
+        except Exception as e:
+            logger.warning("Writing request trace failed: %s", e)
+
+    def close(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        self._file.close()
+        if self.dropped:
+            logger.warning("Request trace dropped %d records (queue full)", self.dropped)
+
+
+_recorder: Optional[TraceRecorder] = None
+
+
+def configure_recording() -> None:
+    """Starts recording to TRACE_RECORD_FILE if it is set, once."""
+    global _recorder
+    if _recorder is None and TRACE_RECORD_FILE:
+        _recorder = TraceRecorder(TRACE_RECORD_FILE, TRACE_RECORD_KEY)
+        logger.info("Recording request trace", extra={"trace_file": _recorder.path})
+
+
+def shutdown_recording() -> None:
+    global _recorder
+    if _recorder is not None:
+        _recorder.close()
+        _recorder = None
+
+
+class TraceRecorderMiddleware:
+    """Pure ASGI middleware that records timing and status for the configured paths."""
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        recorder = _recorder
+        if recorder is None or scope["type"] != "http" or scope["path"] not in TRACE_RECORD_PATHS:
+            await self.app(scope, receive, send)
+            return
+
+        fields: Dict[str, Any] = {}
+        token = _current_record.set(fields)
+        status = 500
+        started = time.perf_counter()
+
+        async def send_with_status(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            _current_record.reset(token)
+            recorder.submit(started, scope["method"], scope["path"], fields, status,
+                            (time.perf_counter() - started) * 1000)
+
+
+def read_trace(path: str) -> Iterator[Dict[str, Any]]:
+    """
+    Yields the records of a trace file with "at" set to absolute wall-clock
+    start time, so files from several workers can be merged.
+    """
+    opener = gzip.open if path.endswith(".gz") else open
+    start_time = None
+    with opener(path, "rt") as f:
+        for line in f:
+            entry = json.loads(line)
+            if entry.get("format") == TRACE_FORMAT:
+                # Appending to an existing file starts a new segment with its own header
+                start_time = entry["start_time"]
+                continue
+            if start_time is None:
+                raise ValueError(f"{path} is not a request trace file")
+            entry["at"] = start_time + entry["t"]
+            yield entry
@@ -0,0 +1,565 @@
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+import zlib
+from collections import OrderedDict
+from datetime import date, datetime
+from decimal import Decimal
+from typing import Any, Dict, Hashable, List, Optional, Tuple, Type
+
+from pydantic import BaseModel
+
+from app.core.cache import TTLCache
+from app.core.metrics import register_cache
+
+logger = logging.getLogger(__name__)
+
+# Second cache tier shared by every worker: none | sqlite | redis | memory
+# ("memory" is the in-process Redis stand-in, for tests)
+SHARED_CACHE_BACKEND = os.getenv("SHARED_CACHE_BACKEND", "none")
+# SQLite file for the sqlite backend; put it on a local disk (or tmpfs) all workers can see
+SHARED_CACHE_PATH = os.getenv("SHARED_CACHE_PATH", "/tmp/bcs-shared-cache.sqlite3")
+SHARED_CACHE_URL = os.getenv("SHARED_CACHE_URL", "redis://localhost:6379/0")
+# With a shared tier, the per-process tier only has to absorb repeat reads, so it
+# is kept short: that bounds how long another worker's eviction goes unseen here
+SHARED_CACHE_LOCAL_TTL_SECONDS = float(os.getenv("SHARED_CACHE_LOCAL_TTL_SECONDS", "30"))
+
+# Entries at least this large are zlib-compressed
+_COMPRESS_MIN_BYTES = 512
+# Entry tags: JSON, or zlib-compressed JSON
+_JSON, _ZLIB = b"\x00", b"\x01"
+
+# Models an entry may hold, by class name. Entries are plain data (JSON), so a
+# value written to a shared store by anyone else is at worst a failed read,
+# and models are validated as they are read back.
+_MODELS: Dict[str, Type[BaseModel]] = {}
+
+
+def register_models(*models: Type[BaseModel]) -> None:
+    """Allows instances of the given models in cache entries."""
+    for model in models:
+        _MODELS[model.__name__] = model
+
+
+def _encode_value(value: Any) -> Any:
+    if isinstance(value, BaseModel):
+        name = type(value).__name__
+        if _MODELS.get(name) is not type(value):
+            raise TypeError(f"{name} is not registered with register_models")
+        return {"__model__": name, "fields": value.model_dump(mode="json")}
+    if isinstance(value, datetime):
+        return {"__datetime__": value.isoformat()}
+    if isinstance(value, date):
+        return {"__date__": value.isoformat()}
+    if isinstance(value, Decimal):
+        return {"__decimal__": str(value)}
+    raise TypeError(f"{type(value).__name__} cannot be stored in the cache")
+
+
+def _decode_value(obj: Dict[str, Any]) -> Any:
+    if "__model__" in obj:
+        model = _MODELS.get(obj["__model__"])
+        if model is None:
+            raise ValueError(f"Unknown model in cache entry: {obj['__model__']!r}")
+        return model.model_validate(obj["fields"])
+    if "__datetime__" in obj:
+        return datetime.fromisoformat(obj["__datetime__"])
+    if "__date__" in obj:
+        return date.fromisoformat(obj["__date__"])
+    if "__decimal__" in obj:
+        return Decimal(obj["__decimal__"])
+    return obj
+
+
+def dumps(value: Any) -> bytes:
+    """
+    Compact entry encoding: JSON (registered models, dates and decimals
+    tagged), zlib-compressed when that pays off, behind a one-byte tag.
+    Tuples come back as lists. Raises TypeError for anything else.
+    """
+    data = json.dumps(value, default=_encode_value, separators=(",", ":")).encode()
+    if len(data) >= _COMPRESS_MIN_BYTES:
+        compressed = zlib.compress(data, 1)
+        if len(compressed) < len(data):
+            return _ZLIB + compressed
+    return _JSON + data
+
+
+def loads(blob: bytes) -> Any:
+    """Decodes an entry; raises ValueError (or zlib.error) for anything not written by dumps."""
+    tag, data = blob[:1], blob[1:]
+    if tag == _ZLIB:
+        data = zlib.decompress(data)
+    elif tag != _JSON:
+        raise ValueError(f"Unknown cache entry tag: {tag!r}")
+    return json.loads(data, object_hook=_decode_value)
+
+
+def _encode_key(key: Hashable) -> str:
+    return repr(key)
+
+
+class SQLiteCache:
+    """
+    Cache in an SQLite file that every worker process on the host opens, with
+    the same interface as TTLCache. Expiry uses wall-clock time so it means
+    the same thing in every process. Once an entry count exceeds max_size the
+    least recently read entries (recency is tracked to the minute) are
+    evicted in one batch, down to 90%.
+
+    Lock contention or I/O errors are treated as misses (and skipped writes):
+    the cache never fails a request.
+    """
+
+    # Evict only every this many writes, so a write does not pay for a COUNT
+    EVICT_CHECK_EVERY = 64
+    # Read recency is recorded at most this often per entry: eviction order only
+    # needs to be rough, and this keeps almost every hit a read-only query
+    TOUCH_INTERVAL_SECONDS = 60.0
+
+    def __init__(self, path: str, ttl_seconds: float, max_size: int = 10000, name: str = "cache"):
+        self.path = path
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._writes = 0
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with self._connection() as db:
+            db.execute(
+                "CREATE TABLE IF NOT EXISTS entries (namespace TEXT NOT NULL, key TEXT NOT NULL, "
+                "value BLOB NOT NULL, expires_at REAL NOT NULL, accessed_at REAL NOT NULL, "
+                "PRIMARY KEY (namespace, key)) WITHOUT ROWID"
+            )
+            db.execute("CREATE INDEX IF NOT EXISTS entries_accessed ON entries (namespace, accessed_at)")
+        register_cache(self)
+
+    def _connection(self) -> sqlite3.Connection:
+        # One connection per thread; WAL lets readers in any process run alongside the writer
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=0.5, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=OFF")
+        return db
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        encoded = _encode_key(key)
+        now = time.time()
+        try:
+            db = self._connection()
+            row = db.execute(
+                "SELECT value, expires_at, accessed_at FROM entries WHERE namespace = ? AND key = ?",
+                (self.name, encoded)
+            ).fetchone()
+            if row is None or row[1] <= now:
+                self.misses += 1
+                return default
+            value = loads(row[0])
+        except (sqlite3.Error, ValueError, zlib.error) as e:
+            logger.debug("Shared cache read failed: %s", e, extra={"cache": self.name})
+            self.misses += 1
+            return default
+        self.hits += 1
+        if now - row[2] >= self.TOUCH_INTERVAL_SECONDS:
+            try:
+                db.execute("UPDATE entries SET accessed_at = ? WHERE namespace = ? AND key = ?",
+                           (now, self.name, encoded))
+            except sqlite3.Error as e:
+                logger.debug("Shared cache touch failed: %s", e, extra={"cache": self.name})
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        now = time.time()
+        try:
+            db = self._connection()
+            db.execute(
+                "INSERT OR REPLACE INTO entries (namespace, key, value, expires_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?)",
+                (self.name, _encode_key(key), dumps(value), now + ttl, now)
+            )
+            self._writes += 1
+            if self._writes % self.EVICT_CHECK_EVERY == 0:
+                self._evict(db, now)
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.debug("Shared cache write failed: %s", e, extra={"cache": self.name})
+
+    def _evict(self, db: sqlite3.Connection, now: float) -> None:
+        db.execute("DELETE FROM entries WHERE namespace = ? AND expires_at <= ?", (self.name, now))
+        count = len(self)
+        if count > self.max_size:
+            db.execute(
+                "DELETE FROM entries WHERE namespace = ? AND key IN (SELECT key FROM entries "
+                "WHERE namespace = ? ORDER BY accessed_at LIMIT ?)",
+                (self.name, self.name, count - int(self.max_size * 0.9))
+            )
+
+    def delete(self, key: Hashable) -> None:
+        try:
+            self._connection().execute(
+                "DELETE FROM entries WHERE namespace = ? AND key = ?", (self.name, _encode_key(key))
+            )
+        except sqlite3.Error as e:
+            logger.warning("Shared cache delete failed: %s", e, extra={"cache": self.name})
+
+    def clear(self) -> None:
+        try:
+            self._connection().execute("DELETE FROM entries WHERE namespace = ?", (self.name,))
+        except sqlite3.Error as e:
+            logger.warning("Shared cache clear failed: %s", e, extra={"cache": self.name})
+
+    def __len__(self) -> int:
+        try:
+            return self._connection().execute(
+                "SELECT COUNT(*) FROM entries WHERE namespace = ?", (self.name,)
+            ).fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+
+class InMemoryRedis:
+    """
+    Stand-in for redis.Redis covering the calls RedisCache and
+    RedisBroadcastLog make, for tests and local runs. Bounded like a Redis
+    with maxmemory-policy allkeys-lru.
+    """
+
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._data: "OrderedDict[str, Tuple[bytes, Optional[float]]]" = OrderedDict()
+        self._streams: Dict[str, List[Tuple[bytes, Dict[bytes, bytes]]]] = {}
+        self._stream_ids = 0
+        self._lock = threading.Lock()
+
+    def get(self, name: str) -> Optional[bytes]:
+        with self._lock:
+            entry = self._data.get(name)
+            if entry is None:
+                return None
+            if entry[1] is not None and entry[1] <= time.monotonic():
+                del self._data[name]
+                return None
+            self._data.move_to_end(name)
+            return entry[0]
+
+    def set(self, name: str, value: bytes, px: Optional[int] = None) -> bool:
+        with self._lock:
+            self._data[name] = (value, time.monotonic() + px / 1000 if px else None)
+            self._data.move_to_end(name)
+            while len(self._data) > self.max_keys:
+                self._data.popitem(last=False)
+        return True
+
+    def delete(self, *names: str) -> int:
+        with self._lock:
+            return sum(self._data.pop(name, None) is not None for name in names)
+
+    def scan_iter(self, match: str, count: int = 1000):
+        prefix = match.rstrip("*")
+        with self._lock:
+            names = [name for name in self._data if name.startswith(prefix)]
+        return iter(names)
+
+    # Streams, as used by RedisBroadcastLog (IDs are "<n>-0" rather than time-based)
+
+    def xadd(self, name: str, fields: Dict[str, str], maxlen: Optional[int] = None,
+             approximate: bool = True) -> bytes:
+        with self._lock:
+            stream = self._streams.setdefault(name, [])
+            entry_id = f"{self._stream_ids + 1}-0".encode()
+            self._stream_ids += 1
+            stream.append((entry_id, {key.encode(): value.encode() for key, value in fields.items()}))
+            if maxlen is not None and len(stream) > maxlen:
+                del stream[:len(stream) - maxlen]
+        return entry_id
+
+    def xrevrange(self, name: str, max: str = "+", min: str = "-", count: Optional[int] = None) -> list:
+        with self._lock:
+            entries = list(reversed(self._streams.get(name, [])))
+        return entries[:count] if count is not None else entries
+
+    def xread(self, streams: Dict[str, str], count: Optional[int] = None) -> list:
+        result = []
+        with self._lock:
+            for name, after in streams.items():
+                after_id = _stream_id(after)
+                entries = [entry for entry in self._streams.get(name, []) if _stream_id(entry[0]) > after_id]
+                if entries:
+                    result.append([name.encode(), entries[:count] if count is not None else entries])
+        return result
+
+
+def _stream_id(entry_id) -> Tuple[int, int]:
+    if isinstance(entry_id, bytes):
+        entry_id = entry_id.decode()
+    milliseconds, _, sequence = entry_id.partition("-")
+    return int(milliseconds), int(sequence or 0)
+
+
+class RedisCache:
+    """
+    Cache in a network Redis shared by every instance, with the same interface
+    as TTLCache. Entries expire through Redis TTLs; bounding memory is left to
+    the server (maxmemory with an LRU policy), so max_size is advisory.
+    Connection errors are treated as misses.
+    """
+
+    def __init__(self, client, ttl_seconds: float, max_size: int = 10000, name: str = "cache",
+                 prefix: str = "bcs"):
+        self.client = client
+        self.ttl_seconds = ttl_seconds
+        self.max_size = max_size
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        self._prefix = f"{prefix}:{name}:"
+        register_cache(self)
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        try:
+            blob = self.client.get(self._prefix + _encode_key(key))
+            value = loads(blob) if blob is not None else None
+        except Exception as e:
+            logger.debug("Shared cache read failed: %s", e, extra={"cache": self.name})
+            blob = None
+        if blob is None:
+            self.misses += 1
+            return default
+        self.hits += 1
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        ttl = self.ttl_seconds if ttl_seconds is None else ttl_seconds
+        try:
+            self.client.set(self._prefix + _encode_key(key), dumps(value), px=max(1, int(ttl * 1000)))
+        except Exception as e:
+            logger.debug("Shared cache write failed: %s", e, extra={"cache": self.name})
+
+    def delete(self, key: Hashable) -> None:
+        try:
+            self.client.delete(self._prefix + _encode_key(key))
+        except Exception as e:
+            logger.warning("Shared cache delete failed: %s", e, extra={"cache": self.name})
+
+    def clear(self) -> None:
+        try:
+            names = list(self.client.scan_iter(match=self._prefix + "*", count=1000))
+            if names:
+                self.client.delete(*names)
+        except Exception as e:
+            logger.warning("Shared cache clear failed: %s", e, extra={"cache": self.name})
+
+    def __len__(self) -> int:
+        # A SCAN over the prefix, so only the metrics scrape should call this
+        try:
+            return sum(1 for _ in self.client.scan_iter(match=self._prefix + "*", count=1000))
+        except Exception:
+            return 0
+
+
+class TieredCache:
+    """
+    A per-process TTLCache in front of a shared cache. Reads fall through to
+    the shared tier and refill the local one; writes and deletes go to both.
+    The local tier's TTL bounds how long another worker's delete stays
+    invisible to this one.
+    """
+
+    def __init__(self, local: TTLCache, shared, name: str = "cache"):
+        self.local = local
+        self.shared = shared
+        self.name = name
+        self.ttl_seconds = shared.ttl_seconds
+
+    def get(self, key: Hashable, default: Any = None) -> Any:
+        value = self.local.get(key)
+        if value is not None:
+            return value
+        value = self.shared.get(key)
+        if value is None:
+            return default
+        self.local.set(key, value)
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl_seconds: Optional[float] = None) -> None:
+        self.shared.set(key, value, ttl_seconds)
+        self.local.set(key, value, min(ttl_seconds or self.local.ttl_seconds, self.local.ttl_seconds))
+
+    def delete(self, key: Hashable) -> None:
+        self.shared.delete(key)
+        self.local.delete(key)
+
+    def clear(self) -> None:
+        self.shared.clear()
+        self.local.clear()
+
+    def __len__(self) -> int:
+        return len(self.local)
+
+
+class SQLiteBroadcastLog:
+    """
+    Messages on a channel that every worker on the host sees, in an SQLite
+    table: publish appends a row, readers poll for rows after the last one
+    they read. Rows are pruned after retain_seconds; a reader that falls
+    further behind than that misses messages. Publish errors are logged and
+    dropped; read errors are raised to the poller.
+    """
+
+    PRUNE_EVERY = 100
+
+    def __init__(self, path: str, channel: str, retain_seconds: float = 600.0):
+        self.path = path
+        self.channel = channel
+        self.retain_seconds = retain_seconds
+        self._published = 0
+        self._local = threading.local()
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS broadcasts (seq INTEGER PRIMARY KEY AUTOINCREMENT, "
+            "channel TEXT NOT NULL, message TEXT NOT NULL, published_at REAL NOT NULL)"
+        )
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        now = time.time()
+        try:
+            db = self._connection()
+            db.execute("INSERT INTO broadcasts (channel, message, published_at) VALUES (?, ?, ?)",
+                       (self.channel, json.dumps(message), now))
+            self._published += 1
+            if self._published % self.PRUNE_EVERY == 0:
+                db.execute("DELETE FROM broadcasts WHERE published_at < ?", (now - self.retain_seconds,))
+        except sqlite3.Error as e:
+            logger.warning("Broadcast publish failed: %s", e, extra={"channel": self.channel})
+
+    def latest(self) -> str:
+        """A cursor positioned after every message published so far."""
+        row = self._connection().execute("SELECT MAX(seq) FROM broadcasts").fetchone()
+        return str(row[0] or 0)
+
+    def read(self, after: str, count: int = 500) -> List[Tuple[str, Dict[str, Any]]]:
+        """Messages published after the cursor, oldest first, each with its own cursor."""
+        rows = self._connection().execute(
+            "SELECT seq, message FROM broadcasts WHERE seq > ? AND channel = ? ORDER BY seq LIMIT ?",
+            (int(after), self.channel, count)
+        ).fetchall()
+        return [(str(seq), json.loads(message)) for seq, message in rows]
+
+
+class RedisBroadcastLog:
+    """
+    Messages on a channel that every instance sees, in a Redis stream:
+    publish is an XADD capped at max_length entries, readers poll with XREAD
+    from the last ID they read. Publish errors are logged and dropped; read
+    errors are raised to the poller.
+    """
+
+    def __init__(self, client, channel: str, max_length: int = 10000, prefix: str = "bcs"):
+        self.client = client
+        self.channel = channel
+        self.max_length = max_length
+        self._stream = f"{prefix}:broadcast:{channel}"
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        try:
+            self.client.xadd(self._stream, {"message": json.dumps(message)}, maxlen=self.max_length,
+                             approximate=True)
+        except Exception as e:
+            logger.warning("Broadcast publish failed: %s", e, extra={"channel": self.channel})
+
+    def latest(self) -> str:
+        entries = self.client.xrevrange(self._stream, "+", "-", count=1)
+        if not entries:
+            return "0-0"
+        entry_id = entries[0][0]
+        return entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+
+    def read(self, after: str, count: int = 500) -> List[Tuple[str, Dict[str, Any]]]:
+        messages = []
+        for _, entries in self.client.xread({self._stream: after}, count=count) or []:
+            for entry_id, fields in entries:
+                entry_id = entry_id.decode() if isinstance(entry_id, bytes) else entry_id
+                messages.append((entry_id, json.loads(fields[b"message"])))
+        return messages
+
+
+_memory_redis: Optional[InMemoryRedis] = None
+_redis_clients: Dict[str, Any] = {}
+_redis_clients_lock = threading.Lock()
+
+
+def redis_client(url: str = SHARED_CACHE_URL, setting: str = "SHARED_CACHE_BACKEND"):
+    """
+    The process's redis.Redis for url, created on first use. Caches, the
+    broadcast log and the rate limiter on the same URL all share it, and so
+    share one connection pool. setting names the option that asked for
+    Redis, for the error raised when the package is missing.
+    """
+    with _redis_clients_lock:
+        client = _redis_clients.get(url)
+        if client is None:
+            try:
+                import redis
+            except ImportError as e:
+                raise RuntimeError(f"{setting}=redis needs the redis package (pip install redis)") from e
+            client = _redis_clients[url] = redis.Redis.from_url(url)
+        return client
+
+
+def build_broadcast_log(channel: str):
+    """
+    The broadcast log for channel on the shared tier's store (SQLite file or
+    Redis), or None without a shared tier. With the in-process stand-in every
+    log of the process shares one InMemoryRedis.
+    """
+    global _memory_redis
+    if SHARED_CACHE_BACKEND in ("", "none"):
+        return None
+    if SHARED_CACHE_BACKEND == "sqlite":
+        return SQLiteBroadcastLog(SHARED_CACHE_PATH, channel)
+    if SHARED_CACHE_BACKEND == "redis":
+        return RedisBroadcastLog(redis_client(), channel)
+    if SHARED_CACHE_BACKEND == "memory":
+        if _memory_redis is None:
+            _memory_redis = InMemoryRedis()
+        return RedisBroadcastLog(_memory_redis, channel)
+    raise ValueError(f"Unknown SHARED_CACHE_BACKEND: {SHARED_CACHE_BACKEND!r}")
+
+
+def _shared_tier(name: str, ttl_seconds: float, max_size: int):
+    if SHARED_CACHE_BACKEND == "sqlite":
+        return SQLiteCache(SHARED_CACHE_PATH, ttl_seconds, max_size, name=f"{name}_shared")
+    if SHARED_CACHE_BACKEND == "redis":
+        return RedisCache(redis_client(), ttl_seconds, max_size, name=f"{name}_shared")
+    if SHARED_CACHE_BACKEND == "memory":
+        return RedisCache(InMemoryRedis(max_keys=max_size), ttl_seconds, max_size, name=f"{name}_shared")
+    raise ValueError(f"Unknown SHARED_CACHE_BACKEND: {SHARED_CACHE_BACKEND!r}")
+
+
+def build_cache(name: str, ttl_seconds: float, max_size: int = 10000):
+    """
+    The cache for name: a plain TTLCache, or with SHARED_CACHE_BACKEND set, a
+    TieredCache over the shared store. Both tiers report their own hit rates.
+    """
+    if SHARED_CACHE_BACKEND in ("", "none"):
+        return TTLCache(ttl_seconds=ttl_seconds, max_size=max_size, name=name)
+    local = TTLCache(ttl_seconds=min(ttl_seconds, SHARED_CACHE_LOCAL_TTL_SECONDS), max_size=max_size, name=name)
+    return TieredCache(local, _shared_tier(name, ttl_seconds, max_size), name=name)
@@ -0,0 +1,72 @@
+import logging
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Iterator, List, Optional, Tuple
+
+from fastapi import Request
+
+from app.core.metrics import STAGE_LATENCY
+from app.core.tracing import start_span
+
+logger = logging.getLogger("app.timing")
+
+_current_timings: ContextVar[Optional["RequestTimings"]] = ContextVar("request_timings", default=None)
+
+
+class RequestTimings:
+    """Named stage durations collected while one request is handled."""
+
+    def __init__(self):
+        self.spans: List[Tuple[str, float]] = []
+
+    def record(self, name: str, duration_ms: float) -> None:
+        self.spans.append((name, duration_ms))
+
+    def as_dict(self) -> dict:
+        return {name: round(duration_ms, 2) for name, duration_ms in self.spans}
+
+    def server_timing_header(self) -> str:
+        return ", ".join(f"{name};dur={duration_ms:.2f}" for name, duration_ms in self.spans)
+
+
+@contextmanager
+def timed(name: str) -> Iterator[None]:
+    """
+    Times the enclosed block as one stage of the current request, feeds the
+    per-stage latency histogram and records it as a trace span.
+    """
+    timings = _current_timings.get()
+    start = time.perf_counter()
+    try:
+        with start_span(name):
+            yield
+    finally:
+        elapsed = time.perf_counter() - start
+        STAGE_LATENCY.labels(name).observe(elapsed)
+        if timings is not None:
+            timings.record(name, elapsed * 1000)
+
+
+async def server_timing_middleware(request: Request, call_next):
+    """
+    Collects stage timings for the request, returns them in a Server-Timing
+    header and writes the same numbers to a structured log record.
+    """
+    timings = RequestTimings()
+    token = _current_timings.set(timings)
+    start = time.perf_counter()
+    try:
+        response = await call_next(request)
+    finally:
+        _current_timings.reset(token)
+    timings.record("total", (time.perf_counter() - start) * 1000)
+
+    response.headers["Server-Timing"] = timings.server_timing_header()
+    logger.info("request_timing", extra={
+        "method": request.method,
+        "path": request.url.path,
+        "status": response.status_code,
+        "timings_ms": timings.as_dict(),
+    })
+    return response
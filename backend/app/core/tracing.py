@@ -0,0 +1,271 @@
+import importlib
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+SERVICE_NAME = os.getenv("TRACE_SERVICE_NAME", "bcs-assist-backend")
+# none | console | file | "package.module:ExporterClass"
+TRACE_EXPORTER = os.getenv("TRACE_EXPORTER", "none")
+TRACE_FILE = os.getenv("TRACE_FILE", "traces.jsonl")
+# Fraction of new traces that are recorded; incoming traceparent flags are honoured
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", "1.0"))
+
+logger = logging.getLogger(__name__)
+
+_current_span: ContextVar[Optional["Span"]] = ContextVar("current_span", default=None)
+
+
+class Span:
+    """One timed operation in a trace. Attributes are plain JSON-friendly values."""
+
+    __slots__ = ("trace_id", "span_id", "parent_span_id", "name", "sampled",
+                 "attributes", "status", "start_time", "_start")
+
+    def __init__(self, name: str, trace_id: str, parent_span_id: Optional[str], sampled: bool):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = _random_hex(16)
+        self.parent_span_id = parent_span_id
+        self.sampled = sampled
+        self.attributes: Dict[str, Any] = {}
+        self.status = "ok"
+        self.start_time = time.time()
+        self._start = time.perf_counter()
+
+    def set_attribute(self, key: str, value: Any) -> None:
+        self.attributes[key] = value
+
+    def set_attributes(self, **attributes: Any) -> None:
+        self.attributes.update(attributes)
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_dict(self, duration_ms: float) -> Dict[str, Any]:
+        return {
+            "service": SERVICE_NAME,
+            "trace_id": self.trace_id,
+            "span_id": self.span_id,
+            "parent_span_id": self.parent_span_id,
+            "name": self.name,
+            "start_time": self.start_time,
+            "duration_ms": round(duration_ms, 3),
+            "status": self.status,
+            "attributes": self.attributes,
+        }
+
+
+def _random_hex(length: int) -> str:
+    return f"{random.getrandbits(length * 4):0{length}x}"
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Tuple[str, str, bool]]:
+    """Parses a W3C traceparent header into (trace_id, parent_span_id, sampled)."""
+    if not header:
+        return None
+    parts = header.strip().split("-")
+    if len(parts) < 4 or len(parts[1]) != 32 or len(parts[2]) != 16:
+        return None
+    try:
+        flags = int(parts[3][:2], 16)
+        int(parts[1], 16), int(parts[2], 16)
+    except ValueError:
+        return None
+    if parts[1] == "0" * 32 or parts[2] == "0" * 16:
+        return None
+    return parts[1], parts[2], bool(flags & 0x01)
+
+
+# --- Exporters ---
+
+class SpanExporter:
+    """Receives batches of finished spans (as dicts) on the export thread."""
+
+    def export(self, spans: List[Dict[str, Any]]) -> None:
+        raise NotImplementedError
+
+    def shutdown(self) -> None:
+        pass
+
+
+class ConsoleSpanExporter(SpanExporter):
+    """Writes one JSON line per span to stderr."""
+
+    def export(self, spans):
+        for span in spans:
+            sys.stderr.write(json.dumps(span, default=str) + "\n")
+        sys.stderr.flush()
+
+
+class FileSpanExporter(SpanExporter):
+    """Appends one JSON line per span to a local file; works fully offline."""
+
+    def __init__(self, path: str = TRACE_FILE):
+        self._file = open(path, "a", buffering=1)
+
+    def export(self, spans):
+        self._file.writelines(json.dumps(span, default=str) + "\n" for span in spans)
+
+    def shutdown(self):
+        self._file.close()
+
+
+class _ExportWorker:
+    """Hands finished spans to the exporter from a background thread in small batches."""
+
+    def __init__(self, exporter: SpanExporter, max_queue: int = 10000, batch_size: int = 256):
+        self.exporter = exporter
+        self.batch_size = batch_size
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue)
+        self._thread = threading.Thread(target=self._run, name="span-exporter", daemon=True)
+        self._thread.start()
+
+    def submit(self, span: Dict[str, Any]) -> None:
+        try:
+            self._queue.put_nowait(span)
+        except queue.Full:
+            pass
+
+    def _run(self) -> None:
+        while True:
+            item = self._queue.get()
+            if item is None:
+                break
+            batch = [item]
+            while len(batch) < self.batch_size:
+                try:
+                    item = self._queue.get_nowait()
+                except queue.Empty:
+                    break
+                if item is None:
+                    self._export(batch)
+                    return
+                batch.append(item)
+            self._export(batch)
+
+    def _export(self, batch: List[Dict[str, Any]]) -> None:
+        try:
+            self.exporter.export(batch)
+        except Exception as e:
+            logger.warning("Span export failed: %s", e)
+
+    def shutdown(self) -> None:
+        self._queue.put(None)
+        self._thread.join(timeout=5)
+        self.exporter.shutdown()
+
+
+_worker: Optional[_ExportWorker] = None
+
+
+def _exporter_from_setting(setting: str) -> Optional[SpanExporter]:
+    if setting in ("", "none"):
+        return None
+    if setting == "console":
+        return ConsoleSpanExporter()
+    if setting == "file":
+        return FileSpanExporter(TRACE_FILE)
+    module_name, _, class_name = setting.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+def set_exporter(exporter: Optional[SpanExporter]) -> None:
+    """Installs the exporter that receives finished spans (None disables export)."""
+    global _worker
+    if _worker is not None:
+        _worker.shutdown()
+        _worker = None
+    if exporter is not None:
+        _worker = _ExportWorker(exporter)
+
+
+def configure_tracing() -> None:
+    """Installs the exporter named by TRACE_EXPORTER, once."""
+    if _worker is None:
+        set_exporter(_exporter_from_setting(TRACE_EXPORTER))
+
+
+def shutdown_tracing() -> None:
+    set_exporter(None)
+
+
+# --- Span API ---
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+@contextmanager
+def start_span(name: str, parent: Optional[Tuple[str, str, bool]] = None, **attributes: Any) -> Iterator[Span]:
+    """
+    Opens a span as a child of the current span (or of an explicit remote
+    parent from parse_traceparent), making it current for the enclosed block.
+    """
+    current = _current_span.get()
+    if parent is not None:
+        trace_id, parent_span_id, sampled = parent
+    elif current is not None:
+        trace_id, parent_span_id, sampled = current.trace_id, current.span_id, current.sampled
+    else:
+        trace_id, parent_span_id = _random_hex(32), None
+        sampled = random.random() < TRACE_SAMPLE_RATE
+
+    span = Span(name, trace_id, parent_span_id, sampled)
+    if attributes:
+        span.attributes.update(attributes)
+    token = _current_span.set(span)
+    try:
+        yield span
+    except BaseException as e:
+        span.status = "error"
+        span.set_attribute("error.type", type(e).__name__)
+        raise
+    finally:
+        _current_span.reset(token)
+        worker = _worker
+        if worker is not None and span.sampled:
+            worker.submit(span.to_dict((time.perf_counter() - span._start) * 1000))
+
+
+class TracingMiddleware:
+    """
+    Pure ASGI middleware that continues an incoming W3C trace (traceparent
+    header) or starts a new one, with one server span per request.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        traceparent = None
+        for name, value in scope["headers"]:
+            if name == b"traceparent":
+                traceparent = value.decode("latin-1")
+                break
+
+        with start_span(f"{scope['method']} {scope['path']}", parent=parse_traceparent(traceparent),
+                        **{"http.method": scope["method"], "http.target": scope["path"]}) as span:
+            async def send_with_trace(message):
+                if message["type"] == "http.response.start":
+                    span.set_attribute("http.status_code", message["status"])
+                    message["headers"] = [*message.get("headers", ()), (b"traceparent", span.traceparent.encode())]
+                await send(message)
+
+            await self.app(scope, receive, send_with_trace)
+            route = scope.get("route")
+            if route is not None:
+                span.name = f"{scope['method']} {route.path}"
+                span.set_attribute("http.route", route.path)
@@ -1,13 +1,82 @@
-from fastapi import FastAPI
+from contextlib import asynccontextmanager
+from fastapi import FastAPI, Request
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import api_router, health_router
+from fastapi.responses import JSONResponse
+from app.core.admission import Overloaded
+from app.core.rate_limit import RateLimited
+from app.core.loop_monitor import LOOP_MONITOR_ENABLED, EventLoopMonitor
+from app.core.log import RequestIdMiddleware, configure_logging, shutdown_logging
+from app.core.metrics import MetricsMiddleware
+from app.core.profiling import ProfilingMiddleware
+from app.core.recording import TraceRecorderMiddleware, configure_recording, shutdown_recording
+from app.core.timing import server_timing_middleware
+from app.core.tracing import TracingMiddleware, configure_tracing, shutdown_tracing
+from app.controllers.invalidation_controller import InvalidationController
+from app.routers import api_router, debug_router, health_router, metrics_router
+from app.services.genesys_client import close_genesys_client
+from app.services.identity_service import start_identity_refresh, stop_identity_refresh
+from app.services.invalidation_service import start_change_consumer, stop_change_consumer
+from app.services.query_cache import close_query_cache
+from app.services.warmup_service import start_warmup, stop_warmup
+
+configure_logging()
+
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    configure_logging()
+    configure_tracing()
+    configure_recording()
+    loop_monitor = EventLoopMonitor() if LOOP_MONITOR_ENABLED else None
+    if loop_monitor is not None:
+        loop_monitor.start()
+    # Change events from INVALIDATION_QUEUE, if configured
+    start_change_consumer(InvalidationController.apply_changes)
+    # Customer identity reference data, loaded now and refreshed periodically
+    start_identity_refresh()
+    # Clients, models and hot customers are warmed in the background; /health/ready reports when done
+    start_warmup()
+    yield
+    # Readiness reports draining from here; waits SHUTDOWN_DRAIN_SECONDS
+    await stop_warmup()
+    await stop_identity_refresh()
+    await stop_change_consumer()
+    if loop_monitor is not None:
+        await loop_monitor.stop()
+    # Release pooled upstream connections on shutdown
+    await close_genesys_client()
+    close_query_cache()
+    shutdown_recording()
+    shutdown_tracing()
+    shutdown_logging()
+
 
 app = FastAPI(
     title="High-Fidelity Mock Genesys Service",
     description="A mock API service that realistically simulates Genesys and backend data lookups.",
-    version="1.3.0"
+    version="1.3.0",
+    lifespan=lifespan
 )
 
+
+@app.exception_handler(Overloaded)
+async def overloaded_handler(request: Request, exc: Overloaded):
+    # Shed load fast; clients come back after Retry-After (possibly to another worker)
+    return JSONResponse(
+        status_code=503,
+        content={"detail": "Service overloaded, retry later", "reason": exc.reason},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
+
+@app.exception_handler(RateLimited)
+async def rate_limited_handler(request: Request, exc: RateLimited):
+    return JSONResponse(
+        status_code=429,
+        content={"detail": f"Too many requests for this {exc.scope}"},
+        headers={"Retry-After": str(exc.retry_after)},
+    )
+
 # --- CORS Configuration ---
 # Allow requests from the frontend (Streamlit) and Genesys Cloud domains
 origins = [
@@ -24,9 +93,30 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["Server-Timing", "traceparent"],
 )
 
+# On-demand sampling profile of a single request (X-Profile-Token)
+app.add_middleware(ProfilingMiddleware)
+
+# Per-stage latency in Server-Timing headers and structured logs
+app.middleware("http")(server_timing_middleware)
+
+# Opt-in sanitised request trace for replay (TRACE_RECORD_FILE)
+app.add_middleware(TraceRecorderMiddleware)
+
+# Route latency, status and in-flight counts for /metrics
+app.add_middleware(MetricsMiddleware)
+
+# Trace context: continue the caller's traceparent and span every request
+app.add_middleware(TracingMiddleware)
+
+# Request ID correlation for log records (outermost, so every layer sees it)
+app.add_middleware(RequestIdMiddleware)
+
 # Include routers
 app.include_router(health_router)
 app.include_router(api_router)
+app.include_router(metrics_router)
+app.include_router(debug_router)
 
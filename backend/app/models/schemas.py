@@ -1,5 +1,5 @@
 from pydantic import BaseModel, Field
-from typing import List, Optional
+from typing import Any, Dict, List, Optional
 from datetime import date
 
 
@@ -20,6 +20,14 @@ class GenesysCustomerData(BaseModel):
     ani: Optional[str] = None
 
 
+class DashboardSession(BaseModel):
+    # What /process established, carried in the session token (session_service)
+    conversation_id: str
+    customer_id: str
+    agent_id: str
+    expires_at: float
+
+
 # --- Dashboard Component Models ---
 
 class NetworkRelationship(BaseModel):
@@ -84,10 +92,50 @@ class PrepPackData(BaseModel):
     monthly_revenue_distribution: Chart
     monthly_revenue_trend: Chart
     transaction_volume_summary: List[Transaction]
+    # Content hash of each section above, so clients can fetch only what changed
+    section_versions: Dict[str, str] = Field(default_factory=dict)
+
+
+PREP_PACK_SECTIONS = tuple(name for name in PrepPackData.model_fields if name != "section_versions")
 
 
 # --- API Response Model ---
 
 class ProcessedConversationResponse(BaseModel):
     prep_pack_data: PrepPackData
+    # Assembled from cached sections while the worker was overloaded; clients must not cache it
+    degraded: bool = False
+    # Sent back with /sync (and push) calls instead of the single-use auth code
+    session_token: str
+
+
+class SyncPayload(BaseModel):
+    sessionToken: str
+    # Section name -> version the client already has
+    versions: Dict[str, str] = Field(default_factory=dict)
+
+
+class PrepPackDelta(BaseModel):
+    section_versions: Dict[str, str]
+    # Only the sections whose version differs from the client's
+    changed: Dict[str, Any]
+
+
+
+# --- Cache Invalidation Models ---
+
+class ChangeEvent(BaseModel):
+    # Source table that changed (complaints, inhibits, journeys, ics_results)
+    table: str
+    customer_id: str
+
+
+class ChangeEventBatch(BaseModel):
+    events: List[ChangeEvent]
+
 
+class InvalidationResult(BaseModel):
+    evicted: int
+    ignored: int
+    # Watched customers whose pack is being rebuilt and pushed in the background
+    refreshing: int
@@ -1,5 +1,7 @@
 from .api import router as api_router
+from .debug import router as debug_router
 from .health import router as health_router
+from .metrics import router as metrics_router
 
-__all__ = ["api_router", "health_router"]
+__all__ = ["api_router", "debug_router", "health_router", "metrics_router"]
 
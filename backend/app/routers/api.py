@@ -1,6 +1,22 @@
-from fastapi import APIRouter
-from app.models.schemas import MockAuthPayload, ProcessedConversationResponse
+import asyncio
+import logging
+from typing import Optional
+
+from fastapi import APIRouter, Header, HTTPException, Request, Response, WebSocket, WebSocketDisconnect, status
+from pydantic import ValidationError
+from app.core.admission import Overloaded
+from app.core.metrics import PUSH_DISCONNECTS, PUSH_MESSAGES_SENT
+from app.core.timing import timed
+from app.models.schemas import (
+    ChangeEventBatch, InvalidationResult, MockAuthPayload, PrepPackDelta, ProcessedConversationResponse, SyncPayload
+)
 from app.controllers.conversation_controller import ConversationController
+from app.controllers.invalidation_controller import InvalidationController
+from app.services import invalidation_service
+from app.services.push_service import PUSH_SEND_TIMEOUT_SECONDS, HubFull, Subscription, get_update_hub
+from app.services.session_service import InvalidSession
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter(prefix="/api/v1", tags=["api"])
 
@@ -13,5 +29,135 @@ async def process_conversation(payload: MockAuthPayload):
     Accepts a conversation ID and authentication details, and returns
     a comprehensive prep pack data object for the customer dashboard.
     """
-    return await conversation_controller.process_conversation(payload)
+    response = await conversation_controller.process_conversation(payload)
+    # Serialise here rather than via response_model so the cost is timed
+    # (and the already-validated model is not validated a second time)
+    with timed("serialize"):
+        body = response.model_dump_json()
+    return Response(content=body, media_type="application/json")
+
+
+@router.post("/sync", response_model=PrepPackDelta)
+async def sync_conversation(payload: SyncPayload):
+    """
+    Delta refresh for an open dashboard: takes the session token from
+    /process and the client's section version vector, and returns the
+    current versions plus only the changed sections.
+    """
+    try:
+        delta = await conversation_controller.sync_conversation(payload)
+    except InvalidSession:
+        raise HTTPException(status_code=401, detail="Invalid or expired session")
+    with timed("serialize"):
+        body = delta.model_dump_json()
+    return Response(content=body, media_type="application/json")
+
+
+@router.post("/invalidations", response_model=InvalidationResult)
+async def receive_change_events(
+    request: Request,
+    x_signature: Optional[str] = Header(None),
+    x_signature_timestamp: Optional[str] = Header(None),
+):
+    """
+    Webhook for customer data changes: {"events": [{"table", "customer_id"}]}.
+    Requests are signed with INVALIDATION_WEBHOOK_SECRET; the endpoint does
+    not exist while the secret is unset.
+    """
+    if not invalidation_service.INVALIDATION_WEBHOOK_SECRET:
+        raise HTTPException(status_code=404, detail="Not Found")
+    body = await request.body()
+    if not invalidation_service.verify_signature(body, x_signature_timestamp, x_signature):
+        raise HTTPException(status_code=401, detail="Invalid signature")
+    try:
+        batch = ChangeEventBatch.model_validate_json(body)
+    except ValidationError as e:
+        raise HTTPException(status_code=422, detail=e.errors(include_url=False))
+    return await InvalidationController.apply_changes(batch.events, "webhook")
+
+
+@router.websocket("/updates")
+async def prep_pack_updates(websocket: WebSocket):
+    """
+    Push channel for an open dashboard. The client's first message is a sync
+    payload (session token, section versions); the server answers with
+    the delta that brings it up to date and then sends another delta, in the
+    same shape as /sync, whenever the customer's prep pack is rebuilt.
+    """
+    await websocket.accept()
+    try:
+        payload = SyncPayload.model_validate_json(await websocket.receive_text())
+    except (ValidationError, WebSocketDisconnect):
+        await _close(websocket, status.WS_1008_POLICY_VIOLATION, "invalid_payload")
+        return
+    try:
+        subscription, delta = await conversation_controller.subscribe(payload)
+    except InvalidSession:
+        await _close(websocket, status.WS_1008_POLICY_VIOLATION, "invalid_session")
+        return
+    except HubFull:
+        # 1013 "try again later": the client backs off and may land on another worker
+        await _close(websocket, status.WS_1013_TRY_AGAIN_LATER, "hub_full")
+        return
+    except Overloaded:
+        await _close(websocket, status.WS_1013_TRY_AGAIN_LATER, "overloaded")
+        return
+    try:
+        await websocket.send_text(delta.model_dump_json())
+        PUSH_MESSAGES_SENT.inc()
+        await _pump(websocket, subscription)
+    finally:
+        get_update_hub().unsubscribe(subscription)
+
+
+async def _pump(websocket: WebSocket, subscription: Subscription) -> None:
+    """Sends coalesced deltas until the client goes away or stops keeping up."""
+    # Reading is only for noticing the disconnect; clients send nothing after the first message
+    closed = asyncio.create_task(_wait_for_disconnect(websocket))
+    try:
+        while True:
+            update = asyncio.create_task(subscription.next_update())
+            done, _ = await asyncio.wait({update, closed}, return_when=asyncio.FIRST_COMPLETED)
+            if closed in done:
+                update.cancel()
+                return
+            # The send is waited on, never cancelled: cancelling it could cut a
+            # frame in half. A client that stops reading is dropped instead;
+            # returning without a close handshake makes the server close the
+            # connection, which also ends the stuck send.
+            send = asyncio.create_task(websocket.send_json(update.result()))
+            done, _ = await asyncio.wait({send, closed}, timeout=PUSH_SEND_TIMEOUT_SECONDS,
+                                         return_when=asyncio.FIRST_COMPLETED)
+            if send not in done:
+                send.add_done_callback(_discard_result)
+                if closed not in done:
+                    logger.info("Disconnecting slow push subscriber",
+                                extra={"conversation_id": subscription.conversation_id})
+                    PUSH_DISCONNECTS.labels("slow_consumer").inc()
+                return
+            if send.exception() is not None:
+                return
+            PUSH_MESSAGES_SENT.inc()
+    finally:
+        closed.cancel()
+
+
+def _discard_result(task: asyncio.Task) -> None:
+    # Retrieves the outcome of a send that was abandoned, so it is not logged as never retrieved
+    if not task.cancelled():
+        task.exception()
+
+
+async def _wait_for_disconnect(websocket: WebSocket) -> None:
+    while True:
+        message = await websocket.receive()
+        if message["type"] == "websocket.disconnect":
+            return
+
 
+async def _close(websocket: WebSocket, code: int, reason: str) -> None:
+    PUSH_DISCONNECTS.labels(reason).inc()
+    try:
+        await websocket.close(code=code, reason=reason)
+    except RuntimeError:
+        pass  # already closed by the client
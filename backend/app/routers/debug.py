@@ -0,0 +1,47 @@
+from typing import Optional
+from fastapi import APIRouter, Depends, Header, HTTPException, Query, Response
+from app.core import profiling
+
+router = APIRouter(prefix="/debug", tags=["debug"], include_in_schema=False)
+
+
+def require_profiling_token(x_profile_token: Optional[str] = Header(None)):
+    """
+    Debug endpoints exist only when PROFILING_TOKEN is set, and require it in
+    the X-Profile-Token header (never the URL, which ends up in access logs).
+    """
+    if not profiling.PROFILING_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not profiling.is_authorised(x_profile_token):
+        raise HTTPException(status_code=403, detail="Invalid profiling token")
+
+
+@router.get("/profiles/{profile_id}", dependencies=[Depends(require_profiling_token)])
+def get_profile(profile_id: str):
+    """Returns a stored request profile in folded-stack (flame graph) format."""
+    folded = profiling.load_profile(profile_id)
+    if folded is None:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    return Response(content=folded, media_type="text/plain")
+
+
+@router.post("/tracemalloc/start", dependencies=[Depends(require_profiling_token)])
+def start_tracemalloc(frames: int = Query(10, ge=1, le=100)):
+    """Starts allocation tracing (adds memory and CPU overhead until stopped)."""
+    profiling.start_tracemalloc(frames)
+    return {"tracing": True}
+
+
+@router.get("/tracemalloc/snapshot", dependencies=[Depends(require_profiling_token)])
+def tracemalloc_snapshot(limit: int = Query(25, ge=1, le=500)):
+    """Top allocation sites and growth since the previous snapshot."""
+    try:
+        return profiling.take_tracemalloc_snapshot(limit)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+
+@router.post("/tracemalloc/stop", dependencies=[Depends(require_profiling_token)])
+def stop_tracemalloc():
+    profiling.stop_tracemalloc()
+    return {"tracing": False}
@@ -1,10 +1,30 @@
 from fastapi import APIRouter
+from fastapi.responses import JSONResponse
+from app.services.warmup_service import get_warmup_state
 
 router = APIRouter()
 
 
 @router.get("/")
 def read_root():
-    """Health check endpoint."""
-    return {"message": "High-Fidelity Mock Genesys Service is running."}
+    """Health check endpoint. Probes should use /health/live and /health/ready."""
+    return {
+        "message": "High-Fidelity Mock Genesys Service is running.",
+        "ready": get_warmup_state().ready,
+    }
 
+
+@router.get("/health/live", tags=["health"])
+async def liveness():
+    """Liveness: the process is up and its event loop is answering. Never depends on warm-up."""
+    return {"status": "alive"}
+
+
+@router.get("/health/ready", tags=["health"])
+async def readiness():
+    """
+    Readiness: 200 once start-up warm-up has finished, 503 while warming up
+    or draining for shutdown, so no live request lands on a cold instance.
+    """
+    state = get_warmup_state()
+    return JSONResponse(status_code=200 if state.ready else 503, content=state.as_dict())
@@ -0,0 +1,10 @@
+from fastapi import APIRouter, Response
+from app.core.metrics import CONTENT_TYPE, render_latest
+
+router = APIRouter(tags=["monitoring"])
+
+
+@router.get("/metrics", include_in_schema=False)
+def metrics():
+    """Prometheus scrape endpoint."""
+    return Response(content=render_latest(), media_type=CONTENT_TYPE)
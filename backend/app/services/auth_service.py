@@ -1,10 +1,11 @@
+import base64
+import hashlib
+import json
+import logging
 import time
-import jwt
 import os
-import requests
-from dotenv import load_dotenv
 
-load_dotenv()
+logger = logging.getLogger(__name__)
 
 
 async def get_genesys_auth_token(auth_code: str, code_verifier: str) -> str:
@@ -17,15 +18,14 @@ async def get_genesys_auth_token(auth_code: str, code_verifier: str) -> str:
     client_secret = os.getenv("GENESYS_CLIENT_SECRET")
     auth_url = os.getenv("GENESYS_AUTH_URL")
 
-    print("--- Simulating Genesys PKCE Token Exchange ---")
-    print(f"Auth URL: {auth_url}")
-    print(f"Client ID: {client_id}")
-    print(f"Received Auth Code: {auth_code}")
-    print(f"Received Code Verifier: {code_verifier}")
-    print("--> In a real app, we would now send these to Genesys to get a real token.")
+    # The auth code and verifier are credentials, so only their presence is logged
+    logger.debug(
+        "Simulating Genesys PKCE token exchange",
+        extra={"auth_url": auth_url, "client_id": client_id,
+               "has_auth_code": bool(auth_code), "has_code_verifier": bool(code_verifier)}
+    )
     
     # For now, generate a realistic, but fake, JWT for authentication.
-    print("--> Generating a mock JWT for demonstration purposes.")
     payload = {
         "sub": "user123",
         "name": "Mock User",
@@ -33,11 +33,28 @@ async def get_genesys_auth_token(auth_code: str, code_verifier: str) -> str:
         "exp": int(time.time()) + 3600,
         "iss": "mock-genesys-auth-service"
     }
+    import jwt  # only the mock exchange signs tokens
     token = jwt.encode(payload, "secret", algorithm="HS256")
-    print("--- Mock Token Exchange Complete ---")
+    logger.debug("Mock token exchange complete")
     return token
 
 
+def agent_id_from_token(access_token: str) -> str:
+    """
+    The agent an access token was issued to: its JWT "sub" claim. The token
+    comes straight from the token endpoint, so the claims are read without
+    verifying the signature. Opaque tokens are identified by their hash.
+    """
+    try:
+        claims = access_token.split(".")[1]
+        subject = json.loads(base64.urlsafe_b64decode(claims + "=" * (-len(claims) % 4))).get("sub")
+        if subject:
+            return str(subject)
+    except (IndexError, ValueError, AttributeError):
+        pass
+    return hashlib.blake2b(access_token.encode(), digest_size=16).hexdigest()
+
+
 # --- Real Implementation (Commented Out) ---
 # async def get_real_genesys_auth_token(auth_code: str, code_verifier: str) -> str:
 #     """
@@ -65,17 +82,16 @@ async def get_genesys_auth_token(auth_code: str, code_verifier: str) -> str:
 #     }
 # 
 #     try:
-#         print(f"--- POSTing to Genesys Token Endpoint: {token_url} ---")
+#         logger.info("POSTing to Genesys token endpoint", extra={"token_url": token_url})
 #         response = requests.post(token_url, data=payload, headers=headers)
 #         response.raise_for_status()
 #         data = response.json()
 #         
 #         access_token = data.get("access_token")
-#         print("--- Successfully retrieved Access Token ---")
+#         logger.info("Retrieved Genesys access token")
 #         return access_token
 #         
 #     except requests.exceptions.RequestException as e:
-#         print(f"Error fetching Genesys token: {e}")
-#         if e.response:
-#             print(f"Response Body: {e.response.text}")
+#         logger.error("Error fetching Genesys token: %s", e,
+#                      extra={"response_body": e.response.text if e.response else None})
 #         raise
@@ -0,0 +1,48 @@
+from typing import Any, Dict, Iterator, Tuple
+
+
+class Row:
+    """
+    Read-only result row with the access patterns of google.cloud.bigquery.Row,
+    for rows that do not come from the BigQuery client: results served from the
+    persisted query cache, and the fake client's.
+    """
+
+    __slots__ = ("_values", "_index")
+
+    def __init__(self, values: Tuple[Any, ...], index: Dict[str, int]):
+        self._values = values
+        self._index = index
+
+    def __getattr__(self, name: str) -> Any:
+        try:
+            return self._values[self._index[name]]
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def __getitem__(self, key) -> Any:
+        if isinstance(key, str):
+            return self._values[self._index[key]]
+        return self._values[key]
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    def __iter__(self) -> Iterator[Any]:
+        return iter(self._values)
+
+    def keys(self):
+        return self._index.keys()
+
+    def values(self):
+        return self._values
+
+    def items(self):
+        return ((name, self._values[i]) for name, i in self._index.items())
+
+    def get(self, key: str, default: Any = None) -> Any:
+        i = self._index.get(key)
+        return default if i is None else self._values[i]
+
+    def __repr__(self) -> str:
+        return f"Row({dict(self.items())!r})"
@@ -1,41 +1,44 @@
-import random
+import hashlib
+import logging
 import os
-import requests
-from faker import Faker
 from app.models.schemas import GenesysCustomerData
-from dotenv import load_dotenv
+from app.services.genesys_client import get_genesys_client
+from app.services.identity_service import get_identity_resolver
+from app.services.rng import faker_for, request_rng
 
-load_dotenv()
-fake = Faker()
+logger = logging.getLogger(__name__)
+
+USE_REAL_GENESYS_API = os.getenv("GENESYS_USE_REAL_API", "false").lower() == "true"
 
 
 async def get_genesys_customer_data(conversation_id: str, access_token: str) -> GenesysCustomerData:
     """
     Simulates fetching customer data from the Genesys Cloud API.
-    In a real application, this function would use the access token to make an
-    authenticated API request to a Genesys endpoint.
+    When GENESYS_USE_REAL_API is enabled, the conversation is looked up through
+    the shared Genesys client instead.
     """
+    if USE_REAL_GENESYS_API:
+        customer_data = await get_genesys_client().get_customer_data(conversation_id, access_token)
+        # Genesys participant IDs are not our customer IDs; map via caller identifiers
+        resolved_id = get_identity_resolver().resolve(
+            ani=customer_data.ani, pcin=customer_data.pcin, bcin=customer_data.bcin
+        )
+        if resolved_id:
+            return customer_data.model_copy(update={"customer_id": resolved_id})
+        return customer_data
+
     genesys_api_url = os.getenv("GENESYS_API_URL")
     
-    print("--- Simulating Genesys Customer Data Fetch ---")
-    print(f"Genesys API URL: {genesys_api_url}")
-    print(f"Using Access Token: {access_token[:15]}...")
-    print(f"Fetching data for Conversation ID: {conversation_id}")
-    print("--> In a real app, we would make a GET request to a Genesys API endpoint.")
+    logger.debug(
+        "Simulating Genesys customer data fetch",
+        extra={"genesys_api_url": genesys_api_url, "conversation_id": conversation_id}
+    )
 
-    # Generate realistic, synthetic customer data
-    Faker.seed(conversation_id)
-    print("--> Generating synthetic data for demonstration.")
+    # Generate realistic, synthetic customer data from a conversation-seeded generator
+    rng = request_rng(conversation_id)
+    fake = faker_for(rng)
     
-    # Map to BigQuery customer ID format (CUST_000001 to CUST_000500)
-    # Use hash of conversation_id to get consistent customer mapping
-    import hashlib
-    hash_obj = hashlib.md5(conversation_id.encode())
-    hash_int = int(hash_obj.hexdigest()[:8], 16)
-    customer_num = (hash_int % 500) + 1  # 1 to 500
-    customer_id = f"CUST_{customer_num:06d}"
-    print(f"--> Mapped conversation to BigQuery customer: {customer_id}")
-    channel = random.choice(['voice', 'message', 'email'])
+    channel = rng.choice(['voice', 'message', 'email'])
     customer_name = fake.name()
     ani = fake.phone_number() if channel == 'voice' else None
     pcin = None
@@ -43,14 +46,26 @@ async def get_genesys_customer_data(conversation_id: str, access_token: str) ->
 
     # Simulate channel-specific attributes
     if channel == 'voice':
-        if random.random() > 0.5:  # Simulate authenticated caller
+        if rng.random() > 0.5:  # Simulate authenticated caller
             pcin = f"pcin_{fake.uuid4()}"
             bcin = f"bcin_{fake.uuid4()}"
         # else: Anonymous caller, no PCIN/BCIN
     elif channel == 'message':
         pcin = f"subclaim_{fake.uuid4()}"
 
-    print("--- Mock Customer Data Fetch Complete ---")
+    # Resolve the caller from their identifiers; unknown callers fall back to a
+    # hash of conversation_id mapped onto the BigQuery ID range (CUST_000001 to CUST_000500)
+    customer_id = get_identity_resolver().resolve(ani=ani, pcin=pcin, bcin=bcin)
+    if customer_id is None:
+        hash_obj = hashlib.md5(conversation_id.encode())
+        hash_int = int(hash_obj.hexdigest()[:8], 16)
+        customer_num = (hash_int % 500) + 1  # 1 to 500
+        customer_id = f"CUST_{customer_num:06d}"
+    logger.debug(
+        "Mapped conversation to BigQuery customer",
+        extra={"conversation_id": conversation_id, "customer_id": customer_id}
+    )
+
     return GenesysCustomerData(
         customer_id=customer_id,
         pcin=pcin,
@@ -61,62 +76,6 @@ async def get_genesys_customer_data(conversation_id: str, access_token: str) ->
     )
 
 
-# --- Real Implementation (Commented Out) ---
-# async def get_real_genesys_customer_data(conversation_id: str, access_token: str) -> GenesysCustomerData:
-#     """
-#     Fetches conversation details from Genesys Cloud API to identify the customer.
-#     """
-#     region = os.getenv("GENESYS_REGION", "mypurecloud.com")
-#     api_url = f"https://api.{region}/api/v2/conversations/{conversation_id}"
-#     
-#     headers = {
-#         "Authorization": f"Bearer {access_token}",
-#         "Content-Type": "application/json"
-#     }
-# 
-#     try:
-#         print(f"--- Fetching Conversation Details from: {api_url} ---")
-#         response = requests.get(api_url, headers=headers)
-#         response.raise_for_status()
-#         data = response.json()
-#         
-#         # Parse the conversation data to find the customer/external participant
-#         participants = data.get("participants", [])
-#         
-#         # Placeholder logic: Find the first participant with 'purpose' == 'customer' or 'external'
-#         # Adjust logic based on actual Genesys interaction data structure
-#         customer_participant = next(
-#             (p for p in participants if p.get("purpose") in ["customer", "external"]), 
-#             None
-#         )
-#         
-#         if not customer_participant:
-#             raise ValueError("No customer participant found in conversation.")
-# 
-#         # Extract attributes - keys depend on your specific IVR/Flow setup
-#         attributes = customer_participant.get("attributes", {})
-#         
-#         customer_id = customer_participant.get("id")
-#         pcin = attributes.get("pcin") or attributes.get("PCIN")
-#         bcin = attributes.get("bcin") or attributes.get("BCIN")
-#         customer_name = customer_participant.get("name", "Unknown Customer")
-#         ani = customer_participant.get("ani")
-#         
-#         # Determine channel (simplified)
-#         # In reality, might need to check media types present on the participant
-#         channel = "voice" # Default or derive from 'calls', 'chats', etc. keys
-#         
-#         print(f"--- Customer Identified: {customer_name} (ID: {customer_id}) ---")
-#         
-#         return GenesysCustomerData(
-#             customer_id=customer_id,
-#             pcin=pcin,
-#             bcin=bcin,
-#             customer_name=customer_name,
-#             channel=channel,
-#             ani=ani
-#         )
-#         
-#     except requests.exceptions.RequestException as e:
-#         print(f"Error fetching Genesys customer data: {e}")
-#         raise
+# --- Real Implementation ---
+# The live Genesys lookup lives in genesys_client.py (pooled async client with
+# retries and a conversation cache). Set GENESYS_USE_REAL_API=true to enable it.
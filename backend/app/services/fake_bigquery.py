@@ -0,0 +1,236 @@
+import csv
+import os
+import random
+import re
+import sqlite3
+import threading
+import time
+import uuid
+from concurrent.futures import TimeoutError as JobTimeoutError
+from datetime import date
+from types import SimpleNamespace
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from app.services.bigquery_rows import Row
+
+# Enabled with BQ_BACKEND=fake; every other setting is optional
+DEFAULT_DATA_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "..", "bq_mock_data")
+FAKE_BQ_DATA_DIR = os.getenv("FAKE_BQ_DATA_DIR", DEFAULT_DATA_DIR)
+# constant:<ms> | uniform:<min_ms>,<max_ms> | exponential:<mean_ms> | lognormal:<median_ms>,<sigma>
+FAKE_BQ_LATENCY = os.getenv("FAKE_BQ_LATENCY", "lognormal:50,0.5")
+FAKE_BQ_ERROR_RATE = float(os.getenv("FAKE_BQ_ERROR_RATE", "0"))
+FAKE_BQ_SLOW_JOB_RATE = float(os.getenv("FAKE_BQ_SLOW_JOB_RATE", "0"))
+FAKE_BQ_SLOW_JOB_MS = float(os.getenv("FAKE_BQ_SLOW_JOB_MS", "5000"))
+FAKE_BQ_SEED = os.getenv("FAKE_BQ_SEED")
+
+_TABLE_REF = re.compile(r"`([^`]+)`")
+_PARAMETER = re.compile(r"@(\w+)")
+
+
+def parse_latency(spec: str) -> Callable[[random.Random], float]:
+    """
+    Turns a latency spec such as "lognormal:50,0.5" into a sampler returning
+    seconds. Distributions: constant, uniform, exponential, lognormal.
+    """
+    kind, _, args = spec.partition(":")
+    values = [float(v) for v in args.split(",") if v.strip()]
+    if kind == "constant":
+        (ms,) = values or [0.0]
+        return lambda rng: ms / 1000
+    if kind == "uniform":
+        low, high = values
+        return lambda rng: rng.uniform(low, high) / 1000
+    if kind == "exponential":
+        (mean,) = values
+        return lambda rng: rng.expovariate(1 / mean) / 1000 if mean else 0.0
+    if kind == "lognormal":
+        median, sigma = values
+        return lambda rng: median * rng.lognormvariate(0, sigma) / 1000
+    raise ValueError(f"Unknown latency distribution: {spec!r}")
+
+
+# The fake client's rows are the same type the persisted query cache returns
+FakeRow = Row
+
+
+class FakeQueryJob:
+    """
+    A submitted query. As with the real client, query() returns at once and
+    result() blocks for the job's (injected) run time, honouring timeout.
+    """
+
+    def __init__(self, query: str, rows: List[FakeRow], delay: float, error: Optional[Exception],
+                 bytes_processed: int):
+        self.job_id = uuid.uuid4().hex
+        self.query = query
+        self.total_bytes_processed = bytes_processed
+        self.cache_hit = False
+        self.state = "RUNNING"
+        self._rows = rows
+        self._error = error
+        self._ready_at = time.monotonic() + delay
+
+    def done(self) -> bool:
+        return time.monotonic() >= self._ready_at
+
+    def result(self, timeout: Optional[float] = None, **kwargs) -> List[FakeRow]:
+        remaining = self._ready_at - time.monotonic()
+        if timeout is not None and remaining > timeout:
+            time.sleep(max(timeout, 0))
+            raise JobTimeoutError(f"Job {self.job_id} did not finish within {timeout}s")
+        if remaining > 0:
+            time.sleep(remaining)
+        self.state = "DONE"
+        if self._error is not None:
+            raise self._error
+        return self._rows
+
+
+def _coerce_column(name: str, values: List[str]) -> List[Any]:
+    """Infers a column's type from its CSV text (DATE for *_date columns, then INTEGER, FLOAT, STRING)."""
+    present = [v for v in values if v != ""]
+    if name.endswith("_date"):
+        kind = "date"
+    elif present and all(re.fullmatch(r"-?\d+", v) for v in present):
+        kind = "int"
+    else:
+        try:
+            [float(v) for v in present]
+            kind = "float" if present else "str"
+        except ValueError:
+            kind = "str"
+    convert = {"date": str, "int": int, "float": float, "str": str}[kind]
+    return [convert(v) if v != "" else None for v in values]
+
+
+def fake_job_config(**parameters: Any) -> SimpleNamespace:
+    """
+    A job config with the query_parameters shape FakeBigQueryClient.query reads,
+    so the fake backend runs without importing google.cloud.bigquery.
+    """
+    return SimpleNamespace(query_parameters=[SimpleNamespace(name=name, value=value)
+                                             for name, value in parameters.items()])
+
+
+class FakeBigQueryError(Exception):
+    """A failed fake job; the services treat it like any other BigQuery error."""
+    code = 500
+
+
+class ServiceUnavailable(FakeBigQueryError):
+    code = 503
+
+
+class BadRequest(FakeBigQueryError):
+    code = 400
+
+
+class FakeBigQueryClient:
+    """
+    Offline stand-in for google.cloud.bigquery.Client. Loads every table in
+    bq_mock_data into an in-memory SQLite database and runs the parameterised
+    SQL the services send (backtick table references and @named parameters),
+    with injectable latency, failures and occasional very slow jobs.
+
+    Dates come back as datetime.date, like real DATE columns. Per-table
+    latency overrides take the same spec strings as FAKE_BQ_LATENCY.
+    """
+
+    def __init__(self, data_dir: str = FAKE_BQ_DATA_DIR, latency: str = FAKE_BQ_LATENCY,
+                 error_rate: float = FAKE_BQ_ERROR_RATE, slow_job_rate: float = FAKE_BQ_SLOW_JOB_RATE,
+                 slow_job_ms: float = FAKE_BQ_SLOW_JOB_MS, seed: Optional[int] = None,
+                 table_latency: Optional[Dict[str, str]] = None, project: str = "fake-project"):
+        self.project = project
+        self.error_rate = error_rate
+        self.slow_job_rate = slow_job_rate
+        self.slow_job = slow_job_ms / 1000
+        self._latency = parse_latency(latency)
+        self._table_latency = {table: parse_latency(spec) for table, spec in (table_latency or {}).items()}
+        self._rng = random.Random(seed)
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(":memory:", check_same_thread=False)
+        self._date_columns: Dict[str, set] = {}
+        self._table_bytes: Dict[str, int] = {}
+        self.queries_by_table: Dict[str, int] = {}
+        self._load(data_dir)
+
+    def _load(self, data_dir: str) -> None:
+        for table in sorted(os.listdir(data_dir)):
+            path = os.path.join(data_dir, table)
+            if not os.path.isfile(path) or table.startswith("."):
+                continue
+            with open(path, newline="") as f:
+                reader = csv.reader(f)
+                header = next(reader, None)
+                rows = list(reader)
+            if not header:
+                continue
+            columns = [_coerce_column(name, [row[i] if i < len(row) else "" for row in rows])
+                       for i, name in enumerate(header)]
+            name = table.split(".")[0]
+            self._date_columns[name] = {c for c in header if c.endswith("_date")}
+            self._table_bytes[name] = os.path.getsize(path)
+            column_list = ", ".join(f'"{c}"' for c in header)
+            self._db.execute(f'CREATE TABLE "{name}" ({column_list})')
+            self._db.executemany(f'INSERT INTO "{name}" VALUES ({", ".join("?" * len(header))})',
+                                 list(zip(*columns)))
+        self._db.commit()
+
+    def _translate(self, query: str) -> Tuple[str, List[str]]:
+        """Rewrites BigQuery table references to local table names; returns the SQL and tables read."""
+        tables: List[str] = []
+
+        def local_name(match):
+            table = match.group(1).split(".")[-1]
+            tables.append(table)
+            return f'"{table}"'
+
+        sql = _TABLE_REF.sub(local_name, query)
+        return _PARAMETER.sub(r":\1", sql), tables
+
+    def query(self, query: str, job_config=None, **kwargs) -> FakeQueryJob:
+        sql, tables = self._translate(query)
+        parameters = {p.name: p.value for p in getattr(job_config, "query_parameters", None) or []}
+
+        with self._lock:
+            table = tables[0] if tables else None
+            sampler = self._table_latency.get(table, self._latency)
+            delay = sampler(self._rng)
+            if self._rng.random() < self.slow_job_rate:
+                delay += self.slow_job
+            fail = self._rng.random() < self.error_rate
+            for name in tables:
+                self.queries_by_table[name] = self.queries_by_table.get(name, 0) + 1
+
+            error: Optional[Exception] = None
+            rows: List[FakeRow] = []
+            if fail:
+                error = ServiceUnavailable("Injected BigQuery failure")
+            else:
+                try:
+                    cursor = self._db.execute(sql, parameters)
+                except sqlite3.Error as e:
+                    error = BadRequest(f"Fake BigQuery could not run query: {e}")
+                else:
+                    names = [d[0] for d in cursor.description or ()]
+                    index = {name: i for i, name in enumerate(names)}
+                    dates = set().union(*(self._date_columns.get(t, set()) for t in tables))
+                    date_positions = [i for i, name in enumerate(names) if name in dates]
+                    for values in cursor.fetchall():
+                        if date_positions:
+                            values = list(values)
+                            for i in date_positions:
+                                if values[i] is not None:
+                                    values[i] = date.fromisoformat(values[i])
+                            values = tuple(values)
+                        rows.append(FakeRow(values, index))
+
+        bytes_processed = sum(self._table_bytes.get(t, 0) for t in tables)
+        return FakeQueryJob(query, rows, delay, error, bytes_processed)
+
+    def close(self) -> None:
+        self._db.close()
+
+    @classmethod
+    def from_env(cls) -> "FakeBigQueryClient":
+        return cls(seed=int(FAKE_BQ_SEED) if FAKE_BQ_SEED else None)
@@ -0,0 +1,207 @@
+import asyncio
+import hashlib
+import logging
+import os
+import random
+from typing import Any, Dict, Optional, Tuple
+
+import httpx
+
+from app.core.cache import TTLCache
+from app.core.tracing import start_span
+from app.models.schemas import GenesysCustomerData
+
+try:
+    import h2  # noqa: F401  (HTTP/2 support is optional in httpx)
+    HTTP2_AVAILABLE = True
+except ImportError:
+    HTTP2_AVAILABLE = False
+
+RETRYABLE_STATUS_CODES = {429, 500, 502, 503, 504}
+
+logger = logging.getLogger(__name__)
+
+
+class GenesysAPIError(Exception):
+    """Raised when the Genesys API cannot be reached or returns an unusable response."""
+
+    def __init__(self, message: str, status_code: Optional[int] = None):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def parse_customer_data(conversation: Dict[str, Any]) -> GenesysCustomerData:
+    """
+    Maps a Genesys conversation document to the customer attached to it.
+    The first participant with purpose 'customer' or 'external' is used.
+    """
+    participants = conversation.get("participants", [])
+    customer_participant = next(
+        (p for p in participants if p.get("purpose") in ["customer", "external"]),
+        None
+    )
+    if not customer_participant:
+        raise GenesysAPIError("No customer participant found in conversation.")
+
+    # Attribute keys depend on the IVR/Flow setup
+    attributes = customer_participant.get("attributes", {}) or {}
+
+    if customer_participant.get("calls"):
+        channel = "voice"
+    elif customer_participant.get("messages") or customer_participant.get("chats"):
+        channel = "message"
+    elif customer_participant.get("emails"):
+        channel = "email"
+    else:
+        channel = "voice"
+
+    return GenesysCustomerData(
+        customer_id=customer_participant.get("id"),
+        pcin=attributes.get("pcin") or attributes.get("PCIN"),
+        bcin=attributes.get("bcin") or attributes.get("BCIN"),
+        customer_name=customer_participant.get("name", "Unknown Customer"),
+        channel=channel,
+        ani=customer_participant.get("ani")
+    )
+
+
+def _token_key(access_token: str) -> str:
+    # Cache keys hold a digest of the token, never the token itself
+    return hashlib.blake2b(access_token.encode(), digest_size=16).hexdigest()
+
+
+class GenesysClient:
+    """
+    Async Genesys Cloud API client.
+
+    All calls share one pooled httpx.AsyncClient (keep-alive, HTTP/2 when available).
+    Transient failures are retried with full-jitter exponential backoff, and
+    conversation lookups are cached so repeated widget loads for the same
+    conversation are served without another Genesys round trip.
+    """
+
+    def __init__(
+        self,
+        base_url: str,
+        timeout: float = 5.0,
+        max_retries: int = 3,
+        backoff_base: float = 0.2,
+        backoff_max: float = 2.0,
+        cache_ttl: float = 900.0,
+        cache_size: int = 10000,
+        transport: Optional[httpx.AsyncBaseTransport] = None,
+    ):
+        self.base_url = base_url.rstrip("/")
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.cache = TTLCache(ttl_seconds=cache_ttl, max_size=cache_size, name="genesys_conversations")
+        self._inflight: Dict[Tuple[str, str], asyncio.Task] = {}
+        self._http = httpx.AsyncClient(
+            base_url=self.base_url,
+            timeout=httpx.Timeout(timeout, connect=min(timeout, 2.0)),
+            limits=httpx.Limits(max_connections=100, max_keepalive_connections=20, keepalive_expiry=30.0),
+            http2=HTTP2_AVAILABLE and transport is None,
+            transport=transport,
+        )
+
+    def _backoff(self, attempt: int, retry_after: Optional[str] = None) -> float:
+        if retry_after:
+            try:
+                return min(float(retry_after), self.backoff_max)
+            except ValueError:
+                pass
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+    async def get_conversation(self, conversation_id: str, access_token: str) -> Dict[str, Any]:
+        """Fetches a conversation document, retrying transient failures."""
+        path = f"/api/v2/conversations/{conversation_id}"
+        headers = {"Authorization": f"Bearer {access_token}"}
+
+        for attempt in range(self.max_retries + 1):
+            retry_after = None
+            try:
+                with start_span("genesys.get_conversation", conversation_id=conversation_id, attempt=attempt) as span:
+                    headers["traceparent"] = span.traceparent
+                    response = await self._http.get(path, headers=headers)
+                    span.set_attribute("http.status_code", response.status_code)
+            except httpx.TransportError as e:
+                if attempt == self.max_retries:
+                    raise GenesysAPIError(f"Genesys API unreachable: {e}") from e
+            else:
+                if response.status_code < 400:
+                    return response.json()
+                if response.status_code not in RETRYABLE_STATUS_CODES or attempt == self.max_retries:
+                    raise GenesysAPIError(
+                        f"Genesys API returned {response.status_code} for conversation {conversation_id}",
+                        status_code=response.status_code
+                    )
+                retry_after = response.headers.get("Retry-After")
+            delay = self._backoff(attempt, retry_after)
+            logger.warning(
+                "Retrying Genesys conversation lookup",
+                extra={"conversation_id": conversation_id, "attempt": attempt + 1, "delay_seconds": round(delay, 3)}
+            )
+            await asyncio.sleep(delay)
+
+        raise GenesysAPIError(f"Genesys API retries exhausted for conversation {conversation_id}")
+
+    async def get_customer_data(self, conversation_id: str, access_token: str) -> GenesysCustomerData:
+        """
+        Returns the customer for a conversation. Lookups are cached and shared
+        per conversation and access token, so a caller only ever gets what
+        Genesys returned for its own token. Concurrent lookups share one
+        request, which runs as its own task: a caller that is cancelled does
+        not cancel it for the others.
+        """
+        key = (conversation_id, _token_key(access_token))
+        cached = self.cache.get(key)
+        if cached is not None:
+            return cached
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.create_task(self._fetch_customer_data(key, conversation_id, access_token))
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._forget(key, done))
+        return await asyncio.shield(task)
+
+    async def _fetch_customer_data(self, key: Tuple[str, str], conversation_id: str,
+                                   access_token: str) -> GenesysCustomerData:
+        conversation = await self.get_conversation(conversation_id, access_token)
+        customer_data = parse_customer_data(conversation)
+        self.cache.set(key, customer_data)
+        return customer_data
+
+    def _forget(self, key: Tuple[str, str], task: asyncio.Task) -> None:
+        del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception as retrieved when every caller has gone
+            task.exception()
+
+    async def aclose(self) -> None:
+        await self._http.aclose()
+
+
+_client: Optional[GenesysClient] = None
+
+
+def get_genesys_client() -> GenesysClient:
+    """Returns the process-wide Genesys client, creating it on first use."""
+    global _client
+    if _client is None:
+        region = os.getenv("GENESYS_REGION", "mypurecloud.com")
+        _client = GenesysClient(
+            base_url=os.getenv("GENESYS_API_URL") or f"https://api.{region}",
+            timeout=float(os.getenv("GENESYS_TIMEOUT_SECONDS", "5")),
+            max_retries=int(os.getenv("GENESYS_MAX_RETRIES", "3")),
+            cache_ttl=float(os.getenv("GENESYS_CACHE_TTL_SECONDS", "900")),
+        )
+    return _client
+
+
+async def close_genesys_client() -> None:
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
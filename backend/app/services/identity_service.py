@@ -0,0 +1,229 @@
+import asyncio
+import csv
+import logging
+import os
+import re
+import threading
+from typing import Dict, Iterable, List, Mapping, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+# Customer reference data: a CSV export or a BigQuery table with
+# customer_id, ani, pcin and bcin columns
+IDENTITY_FILE = os.getenv("CUSTOMER_IDENTITY_FILE")
+IDENTITY_TABLE = os.getenv("CUSTOMER_IDENTITY_TABLE")
+# The reference data is loaded at start-up and reloaded this often; 0 loads it once
+IDENTITY_REFRESH_SECONDS = float(os.getenv("CUSTOMER_IDENTITY_REFRESH_SECONDS", "3600"))
+DEFAULT_COUNTRY_CODE = os.getenv("DEFAULT_PHONE_COUNTRY_CODE", "44")
+
+logger = logging.getLogger(__name__)
+
+_NON_DIGITS = re.compile(r"[^\d+]")
+
+
+def normalise_phone(raw: Optional[str], default_country_code: str = DEFAULT_COUNTRY_CODE) -> Optional[str]:
+    """
+    Normalises a phone number / ANI to E.164 ("+447700900123").
+    Accepts tel: URIs, international (+44 / 0044) and national (07700...) formats.
+    """
+    if not raw:
+        return None
+    number = raw.strip().lower()
+    if number.startswith("tel:"):
+        number = number[4:]
+    number = _NON_DIGITS.sub("", number)
+    if number.startswith("+"):
+        digits = number[1:]
+    elif number.startswith("00"):
+        digits = number[2:]
+    elif number.startswith("0"):
+        digits = default_country_code + number[1:]
+    else:
+        digits = number
+    digits = digits.replace("+", "")
+    # E.164 allows at most 15 digits
+    if not digits or len(digits) > 15:
+        return None
+    return f"+{digits}"
+
+
+def _phone_key(raw: Optional[str]) -> Optional[int]:
+    # Phone numbers are stored as ints: far smaller than the equivalent str keys
+    e164 = normalise_phone(raw)
+    return int(e164[1:]) if e164 else None
+
+
+def _customer_number_key(raw: Optional[str]) -> Optional[str]:
+    if not raw:
+        return None
+    return raw.strip().upper() or None
+
+
+class IdentityIndex:
+    """
+    Immutable snapshot of identifier -> customer_id hash indexes.
+
+    Customer IDs are stored once in a list; each index maps a normalised
+    identifier to a position in that list, so millions of identifiers share
+    one copy of every customer_id string.
+    """
+
+    __slots__ = ("customer_ids", "by_ani", "by_pcin", "by_bcin")
+
+    def __init__(self, customer_ids: List[str], by_ani: Dict[int, int],
+                 by_pcin: Dict[str, int], by_bcin: Dict[str, int]):
+        self.customer_ids = customer_ids
+        self.by_ani = by_ani
+        self.by_pcin = by_pcin
+        self.by_bcin = by_bcin
+
+    @classmethod
+    def build(cls, records: Iterable[Mapping[str, Optional[str]]]) -> "IdentityIndex":
+        """Builds an index from rows with customer_id, ani, pcin and bcin keys."""
+        customer_ids: List[str] = []
+        positions: Dict[str, int] = {}
+        by_ani: Dict[int, int] = {}
+        by_pcin: Dict[str, int] = {}
+        by_bcin: Dict[str, int] = {}
+
+        for record in records:
+            customer_id = record.get("customer_id")
+            if not customer_id:
+                continue
+            position = positions.get(customer_id)
+            if position is None:
+                position = positions[customer_id] = len(customer_ids)
+                customer_ids.append(customer_id)
+
+            ani = _phone_key(record.get("ani"))
+            if ani is not None:
+                by_ani[ani] = position
+            pcin = _customer_number_key(record.get("pcin"))
+            if pcin is not None:
+                by_pcin[pcin] = position
+            bcin = _customer_number_key(record.get("bcin"))
+            if bcin is not None:
+                by_bcin[bcin] = position
+
+        return cls(customer_ids, by_ani, by_pcin, by_bcin)
+
+    def __len__(self) -> int:
+        return len(self.by_ani) + len(self.by_pcin) + len(self.by_bcin)
+
+
+class CustomerIdentityResolver:
+    """
+    Resolves Genesys caller identifiers to internal customer IDs.
+
+    Lookups read the current IdentityIndex snapshot without locking. A refresh
+    builds a complete new snapshot off to the side and swaps the reference in
+    one assignment, so readers never see a partially built index.
+    """
+
+    def __init__(self, index: Optional[IdentityIndex] = None):
+        self._index = index or IdentityIndex([], {}, {}, {})
+
+    @property
+    def index(self) -> IdentityIndex:
+        return self._index
+
+    def resolve(self, ani: Optional[str] = None, pcin: Optional[str] = None,
+                bcin: Optional[str] = None) -> Optional[str]:
+        """Returns the customer_id for the strongest identifier present (BCIN, PCIN, then ANI)."""
+        index = self._index
+        position = None
+        if bcin:
+            position = index.by_bcin.get(_customer_number_key(bcin))
+        if position is None and pcin:
+            position = index.by_pcin.get(_customer_number_key(pcin))
+        if position is None and ani:
+            key = _phone_key(ani)
+            if key is not None:
+                position = index.by_ani.get(key)
+        return index.customer_ids[position] if position is not None else None
+
+    def refresh(self, records: Iterable[Mapping[str, Optional[str]]]) -> IdentityIndex:
+        """Rebuilds the index from a full set of reference rows and swaps it in."""
+        index = IdentityIndex.build(records)
+        self._index = index
+        return index
+
+    def refresh_from_file(self, path: str) -> IdentityIndex:
+        with open(path, newline="") as f:
+            return self.refresh(csv.DictReader(f))
+
+    def refresh_from_bigquery(self, table_id: str) -> IdentityIndex:
+        from app.services.prep_pack_service import get_bigquery_client
+
+        client = get_bigquery_client()
+        query = f"SELECT customer_id, ani, pcin, bcin FROM `{table_id}`"
+        rows = client.query(query).result(page_size=50000)
+        return self.refresh(dict(row.items()) for row in rows)
+
+
+_resolver = CustomerIdentityResolver()
+_load_lock = threading.Lock()
+_loaded = False
+_refresh_task: Optional[asyncio.Task] = None
+
+
+def load_identity_index(force: bool = True) -> CustomerIdentityResolver:
+    """
+    Loads the configured reference data into the process-wide resolver
+    (blocking: run it off the event loop). Without force, it is only loaded
+    if it never has been. A failed load keeps the previous index.
+    """
+    global _loaded
+    with _load_lock:
+        if force or not _loaded:
+            try:
+                if IDENTITY_FILE:
+                    _resolver.refresh_from_file(IDENTITY_FILE)
+                elif IDENTITY_TABLE:
+                    _resolver.refresh_from_bigquery(IDENTITY_TABLE)
+                logger.info("Loaded customer identity index", extra={"identifiers": len(_resolver.index)})
+            except Exception as e:
+                logger.error("Error loading customer identity index: %s", e)
+            _loaded = True
+    return _resolver
+
+
+def get_identity_resolver() -> CustomerIdentityResolver:
+    """
+    Returns the process-wide resolver. In the app the index is loaded at
+    start-up and refreshed in the background (start_identity_refresh); only
+    a caller outside it (a script, a test) loads it here, on first use.
+    """
+    if not _loaded and _refresh_task is None:
+        load_identity_index(force=False)
+    return _resolver
+
+
+async def _refresh_loop() -> None:
+    await run_in_threadpool(load_identity_index, False)
+    while IDENTITY_REFRESH_SECONDS > 0:
+        await asyncio.sleep(IDENTITY_REFRESH_SECONDS)
+        await run_in_threadpool(load_identity_index)
+
+
+def start_identity_refresh() -> None:
+    """
+    Loads the reference data in the background at start-up, then reloads it
+    every IDENTITY_REFRESH_SECONDS (a new snapshot is swapped in, so lookups
+    never wait). Warm-up waits for the first load before the instance
+    reports ready.
+    """
+    global _refresh_task
+    if (IDENTITY_FILE or IDENTITY_TABLE) and _refresh_task is None:
+        _refresh_task = asyncio.create_task(_refresh_loop(), name="identity-refresh")
+
+
+async def stop_identity_refresh() -> None:
+    global _refresh_task
+    if _refresh_task is not None:
+        _refresh_task.cancel()
+        try:
+            await _refresh_task
+        except asyncio.CancelledError:
+            pass
+        _refresh_task = None
@@ -0,0 +1,283 @@
+import asyncio
+import hashlib
+import hmac
+import importlib
+import logging
+import os
+import time
+import uuid
+from typing import Awaitable, Callable, Iterable, List, Optional, Set, Tuple
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.metrics import INVALIDATION_EVENTS, INVALIDATION_SOURCE_ERRORS
+from app.core.shared_cache import SHARED_CACHE_BACKEND, build_broadcast_log
+from app.models.schemas import ChangeEvent
+from app.services.prep_pack_service import SECTION_CACHE_TTL_SECONDS, SECTION_TABLES, invalidate_sections
+from app.services.query_cache import get_query_cache
+
+logger = logging.getLogger(__name__)
+
+# Shared secret for POST /api/v1/invalidations; the webhook is disabled when unset
+INVALIDATION_WEBHOOK_SECRET = os.getenv("INVALIDATION_WEBHOOK_SECRET")
+# Signed requests older (or newer) than this are rejected, so a captured body cannot be replayed
+INVALIDATION_WEBHOOK_TOLERANCE_SECONDS = float(os.getenv("INVALIDATION_WEBHOOK_TOLERANCE_SECONDS", "300"))
+# Change-event queue consumer: none | memory | package.module:SourceClass
+INVALIDATION_QUEUE = os.getenv("INVALIDATION_QUEUE", "none")
+# How often other workers' and instances' invalidations are picked up from the
+# shared tier (SHARED_CACHE_BACKEND); without one they reach this process only
+INVALIDATION_BROADCAST_POLL_SECONDS = float(os.getenv("INVALIDATION_BROADCAST_POLL_SECONDS", "1"))
+
+# Tells this process's own broadcasts apart from everyone else's
+INSTANCE_ID = uuid.uuid4().hex
+BROADCAST_SOURCE = "broadcast"
+
+
+def sign_payload(secret: str, timestamp: str, body: bytes) -> str:
+    """The X-Signature value for a webhook body: HMAC-SHA256 over "<timestamp>.<body>"."""
+    digest = hmac.new(secret.encode(), timestamp.encode() + b"." + body, hashlib.sha256).hexdigest()
+    return f"sha256={digest}"
+
+
+def verify_signature(body: bytes, timestamp: Optional[str], signature: Optional[str],
+                     secret: Optional[str] = None, now: Optional[float] = None) -> bool:
+    secret = secret or INVALIDATION_WEBHOOK_SECRET
+    if not secret or not timestamp or not signature:
+        return False
+    try:
+        sent_at = float(timestamp)
+    except ValueError:
+        return False
+    if abs((now or time.time()) - sent_at) > INVALIDATION_WEBHOOK_TOLERANCE_SECONDS:
+        return False
+    return hmac.compare_digest(signature, sign_payload(secret, timestamp, body))
+
+
+def evict_changed_sections(events: Iterable[ChangeEvent], source: str) -> Tuple[Set[str], int, int]:
+    """
+    Evicts the cached sections named by change events. Returns the affected
+    customers, the number of evicted sections and the number of events for
+    tables no prep pack section is built from.
+
+    Events that arrived here (webhook or queue) are also published on the
+    shared tier, so every other worker and instance evicts its own copies;
+    events received that way are not published again. Does blocking I/O
+    with a shared tier or query cache.
+    """
+    keys = set()
+    ignored = 0
+    for event in events:
+        if event.table in SECTION_TABLES:
+            keys.add((event.table, event.customer_id))
+            INVALIDATION_EVENTS.labels(source, event.table).inc()
+        else:
+            ignored += 1
+            INVALIDATION_EVENTS.labels(source, "ignored").inc()
+    evicted = invalidate_sections(keys)
+    if keys and source != BROADCAST_SOURCE:
+        publish_changes(keys)
+    return {customer_id for _, customer_id in keys}, evicted, ignored
+
+
+# --- Fan-out to other workers and instances ---
+
+_broadcast_log = None
+_broadcast_log_created = False
+
+
+def get_broadcast_log():
+    """The shared tier's invalidation channel, opened on first use; None without a shared tier."""
+    global _broadcast_log, _broadcast_log_created
+    if not _broadcast_log_created:
+        _broadcast_log = build_broadcast_log("invalidations")
+        _broadcast_log_created = True
+    return _broadcast_log
+
+
+def publish_changes(keys: Iterable[Tuple[str, str]]) -> None:
+    log = get_broadcast_log()
+    if log is not None:
+        log.publish({"origin": INSTANCE_ID, "changes": sorted(keys)})
+
+
+# --- Queue consumers ---
+
+class ChangeEventSource:
+    """
+    A message queue of change events. Implementations wrap a broker
+    subscription (Pub/Sub, Kafka, SQS...) and are named in INVALIDATION_QUEUE
+    as package.module:ClassName; they are constructed without arguments.
+    """
+
+    name = "queue"
+
+    async def receive(self) -> List[ChangeEvent]:
+        """Waits for the next batch of events (at least one)."""
+        raise NotImplementedError
+
+    async def ack(self, events: List[ChangeEvent]) -> None:
+        """Confirms a batch once it has been applied. At-least-once brokers redeliver unacked batches."""
+
+    async def close(self) -> None:
+        pass
+
+
+class InMemoryChangeQueue(ChangeEventSource):
+    """In-process stand-in for a broker, for tests and local runs. Use from the event loop thread."""
+
+    name = "memory"
+
+    def __init__(self, max_batch: int = 500):
+        self.max_batch = max_batch
+        self._queue: "asyncio.Queue[ChangeEvent]" = asyncio.Queue()
+        self.acked = 0
+
+    def put(self, table: str, customer_id: str) -> None:
+        self._queue.put_nowait(ChangeEvent(table=table, customer_id=customer_id))
+
+    async def receive(self) -> List[ChangeEvent]:
+        batch = [await self._queue.get()]
+        while len(batch) < self.max_batch and not self._queue.empty():
+            batch.append(self._queue.get_nowait())
+        return batch
+
+    async def ack(self, events: List[ChangeEvent]) -> None:
+        self.acked += len(events)
+
+
+class BroadcastChangeSource(ChangeEventSource):
+    """
+    Change events other processes published on the shared tier (see
+    evict_changed_sections), polled every poll_interval seconds. Starts from
+    the end of the log: anything published before it started has expired
+    from this process's caches or was never cached here.
+    """
+
+    name = BROADCAST_SOURCE
+
+    def __init__(self, log, origin: str = INSTANCE_ID, poll_interval: float = 1.0):
+        self.log = log
+        self.origin = origin
+        self.poll_interval = poll_interval
+        self._cursor: Optional[str] = None
+
+    async def receive(self) -> List[ChangeEvent]:
+        if self._cursor is None:
+            self._cursor = await run_in_threadpool(self.log.latest)
+        while True:
+            messages = await run_in_threadpool(self.log.read, self._cursor)
+            events = []
+            for cursor, message in messages:
+                self._cursor = cursor
+                if message.get("origin") != self.origin:
+                    events.extend(ChangeEvent(table=table, customer_id=customer_id)
+                                  for table, customer_id in message.get("changes", []))
+            if events:
+                return events
+            if not messages:
+                await asyncio.sleep(self.poll_interval)
+
+
+def source_from_setting(setting: str) -> Optional[ChangeEventSource]:
+    if setting in ("", "none"):
+        return None
+    if setting == "memory":
+        return InMemoryChangeQueue()
+    module_name, _, class_name = setting.partition(":")
+    return getattr(importlib.import_module(module_name), class_name)()
+
+
+class ChangeConsumer:
+    """
+    Background task feeding batches from a ChangeEventSource to a handler.
+    A batch is acked only after the handler returns; failures back off and
+    leave redelivery to the broker.
+    """
+
+    def __init__(self, source: ChangeEventSource,
+                 handler: Callable[[List[ChangeEvent], str], Awaitable[object]]):
+        self.source = source
+        self.handler = handler
+        self._task: Optional[asyncio.Task] = None
+
+    def start(self) -> None:
+        self._task = asyncio.create_task(self._run(), name="change-consumer")
+
+    async def stop(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        await self.source.close()
+
+    async def _run(self) -> None:
+        backoff = 0.5
+        while True:
+            try:
+                events = await self.source.receive()
+                await self.handler(events, self.source.name)
+                await self.source.ack(events)
+                backoff = 0.5
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                INVALIDATION_SOURCE_ERRORS.inc()
+                logger.error("Change event consumer failed: %s", e, extra={"source": self.source.name})
+                await asyncio.sleep(backoff)
+                backoff = min(backoff * 2, 30.0)
+
+
+_consumer: Optional[ChangeConsumer] = None
+_broadcast_consumer: Optional[ChangeConsumer] = None
+
+
+def get_change_source() -> Optional[ChangeEventSource]:
+    """The running consumer's source (e.g. the InMemoryChangeQueue to put events on in tests)."""
+    return _consumer.source if _consumer is not None else None
+
+
+def start_change_consumer(handler: Callable[[List[ChangeEvent], str], Awaitable[object]],
+                          source: Optional[ChangeEventSource] = None) -> None:
+    """
+    Starts consuming INVALIDATION_QUEUE (or the given source) if one is
+    configured, and other processes' invalidations from the shared tier if
+    there is one, once.
+    """
+    global _consumer, _broadcast_consumer
+    if _consumer is None:
+        source = source or source_from_setting(INVALIDATION_QUEUE)
+        if source is not None:
+            _consumer = ChangeConsumer(source, handler)
+            _consumer.start()
+            logger.info("Consuming change events", extra={"source": source.name})
+    if _broadcast_consumer is None:
+        log = get_broadcast_log()
+        if log is not None:
+            _broadcast_consumer = ChangeConsumer(
+                BroadcastChangeSource(log, poll_interval=INVALIDATION_BROADCAST_POLL_SECONDS), handler
+            )
+            _broadcast_consumer.start()
+        elif INVALIDATION_WEBHOOK_SECRET or INVALIDATION_QUEUE not in ("", "none"):
+            # Persisted results outlive the section cache by default, so keep them
+            # no longer than a section on instances the events do not reach
+            query_cache = get_query_cache()
+            if query_cache is not None:
+                query_cache.limit_ttl(SECTION_CACHE_TTL_SECONDS)
+            logger.warning(
+                "Invalidations reach this process only: set SHARED_CACHE_BACKEND when running more than one "
+                "worker or instance, or other processes serve stale sections until their entries expire",
+                extra={"shared_cache_backend": SHARED_CACHE_BACKEND},
+            )
+
+
+async def stop_change_consumer() -> None:
+    global _consumer, _broadcast_consumer
+    if _consumer is not None:
+        await _consumer.stop()
+        _consumer = None
+    if _broadcast_consumer is not None:
+        await _broadcast_consumer.stop()
+        _broadcast_consumer = None
@@ -1,212 +1,347 @@
-from faker import Faker
 from datetime import date, timedelta
+import hashlib
+import json
+import logging
 import random
 import os
-from typing import List, Optional
-from google.cloud import bigquery
+import threading
+import time
+from typing import Any, Callable, Dict, Iterable, List, Optional, Tuple
 
 from app.models.schemas import (
-    PrepPackData, NetworkRelationship, Kpi, Inhibit, Journey, Complaint,
+    PREP_PACK_SECTIONS, PrepPackData, NetworkRelationship, Kpi, Inhibit, Journey, Complaint,
     ICSResult, Chart, ChartDataPoint, Transaction
 )
+from app.core.shared_cache import build_cache, register_models
+from app.core.metrics import BIGQUERY_ERRORS, BIGQUERY_FALLBACKS, BIGQUERY_QUERIES
+from app.core.timing import timed
+from app.core.tracing import start_span
+from app.services.query_cache import get_query_cache
+from app.services.rng import request_rng
 
-fake = Faker()
+logger = logging.getLogger(__name__)
 
 # BigQuery configuration
 PROJECT_ID = os.getenv("BQ_PROJECT_ID", "ai-ml-team-sandbox")
 DATASET_ID = os.getenv("BQ_DATASET_ID", "HSBC_mock_reuben")
+# "bigquery" for the real service, "fake" for the offline stand-in over bq_mock_data
+BQ_BACKEND = os.getenv("BQ_BACKEND", "bigquery")
 
-def fetch_complaints_from_bigquery(customer_id: str) -> List[Complaint]:
+# Per-customer BigQuery sections are cached between builds. Change events
+# (invalidation_service) evict entries when the source tables change, so the
+# TTL only bounds staleness for changes that arrive without an event.
+SECTION_CACHE_TTL_SECONDS = float(os.getenv("SECTION_CACHE_TTL_SECONDS", "300"))
+SECTION_CACHE_MAX_ENTRIES = int(os.getenv("SECTION_CACHE_MAX_ENTRIES", "20000"))
+# Source tables behind the cached sections (each feeds the prep pack field of the same name)
+SECTION_TABLES = ("complaints", "inhibits", "journeys", "ics_results")
+
+_bigquery_client = None
+
+def get_bigquery_client():
+    """Returns the shared BigQuery client, created on first use (the client is thread-safe)."""
+    global _bigquery_client
+    if _bigquery_client is None:
+        if BQ_BACKEND == "fake":
+            from app.services.fake_bigquery import FakeBigQueryClient
+            _bigquery_client = FakeBigQueryClient.from_env()
+        else:
+            # Imported here: google.cloud.bigquery (and the pandas it pulls in) is
+            # the slowest import in the app and the fake backend never needs it
+            from google.cloud import bigquery
+            _bigquery_client = bigquery.Client(project=PROJECT_ID)
+    return _bigquery_client
+
+def set_bigquery_client(client) -> None:
+    """Replaces the shared BigQuery client, e.g. with a FakeBigQueryClient in tests and benchmarks."""
+    global _bigquery_client
+    _bigquery_client = client
+
+def query_job_config(client, customer_id: str):
+    """The job config binding @customer_id, in the form the given client takes."""
+    from app.services.fake_bigquery import FakeBigQueryClient, fake_job_config
+    if isinstance(client, FakeBigQueryClient):
+        return fake_job_config(customer_id=customer_id)
+    from google.cloud import bigquery
+    return bigquery.QueryJobConfig(
+        query_parameters=[
+            bigquery.ScalarQueryParameter("customer_id", "STRING", customer_id)
+        ]
+    )
+
+def run_section_query(table: str, columns: str, order_by: str, customer_id: str) -> list:
+    """
+    Runs one of the per-customer section queries and returns its rows.
+    Each job gets a trace span recording job ID, bytes processed and cache hit.
+    With QUERY_CACHE_PATH set, results are served from and saved to the
+    persistent query cache.
+    """
+    query = f"""
+        SELECT {columns}
+        FROM `{PROJECT_ID}.{DATASET_ID}.{table}`
+        WHERE customer_id = @customer_id
+        ORDER BY {order_by} DESC
+        LIMIT 10
+    """
+    
+    params = {"customer_id": customer_id}
+    query_cache = get_query_cache()
+    if query_cache is not None:
+        cached = query_cache.get(query, params)
+        if cached is not None:
+            return cached
+    
+    client = get_bigquery_client()
+    job_config = query_job_config(client, customer_id)
+    
+    started = time.monotonic()
+    with start_span("bigquery.query", **{"db.system": "bigquery", "bigquery.table": table}) as span:
+        query_job = client.query(query, job_config=job_config)
+        results = list(query_job.result())
+        span.set_attributes(**{
+            "bigquery.job_id": query_job.job_id,
+            "bigquery.bytes_processed": query_job.total_bytes_processed,
+            "bigquery.cache_hit": query_job.cache_hit,
+            "bigquery.rows": len(results),
+        })
+    if query_cache is not None and not _invalidated_since((table, customer_id), started):
+        query_cache.put(query, params, table, customer_id, results)
+    return results
+
+# --- Row to model mapping ---
+
+def complaints_from_rows(rows) -> List[Complaint]:
+    return [
+        Complaint(
+            date=row.complaint_date,
+            description=row.description or "No description available",
+            status=row.status or "unknown"
+        )
+        for row in rows
+    ]
+
+def inhibits_from_rows(rows) -> List[Inhibit]:
+    return [
+        Inhibit(
+            title=row.inhibit_name or "Unknown Inhibit",
+            description=row.inhibit_desc or "No description available",
+            date=row.inhibit_date
+        )
+        for row in rows
+    ]
+
+def journeys_from_rows(rows) -> List[Journey]:
+    return [
+        Journey(
+            title=row.journey_name or "Unknown Journey",
+            subtitle=row.journey_desc or "No description available",
+            status=row.status or "unknown",
+            date=row.journey_date
+        )
+        for row in rows
+    ]
+
+def ics_results_from_rows(rows) -> List[ICSResult]:
+    return [
+        ICSResult(
+            date=row.score_date,
+            score=row.ics_score or "N/A",
+            quote=row.ics_summary or "No feedback available"
+        )
+        for row in rows
+    ]
+
+# --- Section cache ---
+
+# Shared across workers when SHARED_CACHE_BACKEND is set (whole packs for the rate limiter's recent results)
+register_models(Complaint, Inhibit, Journey, ICSResult, PrepPackData)
+_section_cache = build_cache("prep_pack_sections", SECTION_CACHE_TTL_SECONDS, SECTION_CACHE_MAX_ENTRIES)
+# When each (table, customer_id) was last invalidated, so a query that was
+# already running when the change arrived does not cache its stale result
+_invalidated_at: Dict[Tuple[str, str], float] = {}
+_invalidated_lock = threading.Lock()
+# Queries finish well within this, so older invalidation marks can be dropped
+_INVALIDATION_MARK_SECONDS = 120.0
+
+
+def cached_section(table: str, customer_id: str, fetch: Callable[[str], Optional[list]],
+                   cached_only: bool = False) -> Optional[list]:
+    """
+    Returns the customer's section from the cache, or fetches and caches it.
+    Failed queries (None) are not cached, so the next build retries them.
+    With cached_only, a miss returns None without querying.
+    """
+    key = (table, customer_id)
+    section = _section_cache.get(key)
+    if section is not None or cached_only:
+        return section
+    started = time.monotonic()
+    section = fetch(customer_id)
+    if section is not None and not _invalidated_since(key, started):
+        _section_cache.set(key, section)
+    return section
+
+
+def _invalidated_since(key: Tuple[str, str], started: float) -> bool:
+    return _invalidated_at.get(key, 0.0) >= started
+
+
+def invalidate_sections(keys: Iterable[Tuple[str, str]]) -> int:
+    """
+    Evicts cached (table, customer_id) sections, and their persisted query
+    results; returns how many keys were given.
+    """
+    keys = list(keys)
+    now = time.monotonic()
+    with _invalidated_lock:
+        for key in keys:
+            _invalidated_at[key] = now
+        if len(_invalidated_at) > SECTION_CACHE_MAX_ENTRIES:
+            cutoff = now - _INVALIDATION_MARK_SECONDS
+            for key in [k for k, at in _invalidated_at.items() if at < cutoff]:
+                del _invalidated_at[key]
+    query_cache = get_query_cache()
+    for table, customer_id in keys:
+        _section_cache.delete((table, customer_id))
+        if query_cache is not None:
+            query_cache.invalidate(table, customer_id)
+    return len(keys)
+
+
+def fetch_complaints_from_bigquery(customer_id: str) -> Optional[List[Complaint]]:
     """Fetch complaints data from BigQuery"""
+    BIGQUERY_QUERIES.labels("complaints").inc()
     try:
-        client = bigquery.Client(project=PROJECT_ID)
-        query = f"""
-            SELECT complaint_date, description, status
-            FROM `{PROJECT_ID}.{DATASET_ID}.complaints`
-            WHERE customer_id = @customer_id
-            ORDER BY complaint_date DESC
-            LIMIT 10
-        """
-        
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("customer_id", "STRING", customer_id)
-            ]
+        results = run_section_query(
+            "complaints", "complaint_date, description, status", "complaint_date", customer_id
         )
         
-        query_job = client.query(query, job_config=job_config)
-        results = list(query_job.result())
-        
-        complaints = []
-        for row in results:
-            complaints.append(Complaint(
-                date=row.complaint_date,
-                description=row.description or "No description available",
-                status=row.status or "unknown"
-            ))
-        
-        return complaints
+        return complaints_from_rows(results)
     except Exception as e:
-        print(f"Error fetching complaints from BigQuery: {e}")
-        return []
+        BIGQUERY_ERRORS.labels("complaints").inc()
+        logger.error("Error fetching complaints from BigQuery: %s", e, extra={"table": "complaints", "customer_id": customer_id})
+        return None
 
-def fetch_inhibits_from_bigquery(customer_id: str) -> List[Inhibit]:
+def fetch_inhibits_from_bigquery(customer_id: str) -> Optional[List[Inhibit]]:
     """Fetch inhibits data from BigQuery"""
+    BIGQUERY_QUERIES.labels("inhibits").inc()
     try:
-        client = bigquery.Client(project=PROJECT_ID)
-        query = f"""
-            SELECT inhibit_name, inhibit_date, inhibit_desc
-            FROM `{PROJECT_ID}.{DATASET_ID}.inhibits`
-            WHERE customer_id = @customer_id
-            ORDER BY inhibit_date DESC
-            LIMIT 10
-        """
-        
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("customer_id", "STRING", customer_id)
-            ]
+        results = run_section_query(
+            "inhibits", "inhibit_name, inhibit_date, inhibit_desc", "inhibit_date", customer_id
         )
         
-        query_job = client.query(query, job_config=job_config)
-        results = list(query_job.result())
-        
-        inhibits = []
-        for row in results:
-            inhibits.append(Inhibit(
-                title=row.inhibit_name or "Unknown Inhibit",
-                description=row.inhibit_desc or "No description available",
-                date=row.inhibit_date
-            ))
-        
-        return inhibits
+        return inhibits_from_rows(results)
     except Exception as e:
-        print(f"Error fetching inhibits from BigQuery: {e}")
-        return []
+        BIGQUERY_ERRORS.labels("inhibits").inc()
+        logger.error("Error fetching inhibits from BigQuery: %s", e, extra={"table": "inhibits", "customer_id": customer_id})
+        return None
 
-def fetch_journeys_from_bigquery(customer_id: str) -> List[Journey]:
+def fetch_journeys_from_bigquery(customer_id: str) -> Optional[List[Journey]]:
     """Fetch journeys data from BigQuery"""
+    BIGQUERY_QUERIES.labels("journeys").inc()
     try:
-        client = bigquery.Client(project=PROJECT_ID)
-        query = f"""
-            SELECT journey_name, journey_desc, journey_date, status
-            FROM `{PROJECT_ID}.{DATASET_ID}.journeys`
-            WHERE customer_id = @customer_id
-            ORDER BY journey_date DESC
-            LIMIT 10
-        """
-        
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("customer_id", "STRING", customer_id)
-            ]
+        results = run_section_query(
+            "journeys", "journey_name, journey_desc, journey_date, status", "journey_date", customer_id
         )
         
-        query_job = client.query(query, job_config=job_config)
-        results = list(query_job.result())
-        
-        journeys = []
-        for row in results:
-            journeys.append(Journey(
-                title=row.journey_name or "Unknown Journey",
-                subtitle=row.journey_desc or "No description available",
-                status=row.status or "unknown",
-                date=row.journey_date
-            ))
-        
-        return journeys
+        return journeys_from_rows(results)
     except Exception as e:
-        print(f"Error fetching journeys from BigQuery: {e}")
-        return []
+        BIGQUERY_ERRORS.labels("journeys").inc()
+        logger.error("Error fetching journeys from BigQuery: %s", e, extra={"table": "journeys", "customer_id": customer_id})
+        return None
 
-def fetch_ics_results_from_bigquery(customer_id: str) -> List[ICSResult]:
+def fetch_ics_results_from_bigquery(customer_id: str) -> Optional[List[ICSResult]]:
     """Fetch ICS results data from BigQuery"""
+    BIGQUERY_QUERIES.labels("ics_results").inc()
     try:
-        client = bigquery.Client(project=PROJECT_ID)
-        query = f"""
-            SELECT ics_score, ics_summary, score_date
-            FROM `{PROJECT_ID}.{DATASET_ID}.ics_results`
-            WHERE customer_id = @customer_id
-            ORDER BY score_date DESC
-            LIMIT 10
-        """
-        
-        job_config = bigquery.QueryJobConfig(
-            query_parameters=[
-                bigquery.ScalarQueryParameter("customer_id", "STRING", customer_id)
-            ]
+        results = run_section_query(
+            "ics_results", "ics_score, ics_summary, score_date", "score_date", customer_id
         )
         
-        query_job = client.query(query, job_config=job_config)
-        results = list(query_job.result())
-        
-        ics_results = []
-        for row in results:
-            ics_results.append(ICSResult(
-                date=row.score_date,
-                score=row.ics_score or "N/A",
-                quote=row.ics_summary or "No feedback available"
-            ))
-        
-        return ics_results
+        return ics_results_from_rows(results)
     except Exception as e:
-        print(f"Error fetching ICS results from BigQuery: {e}")
-        return []
+        BIGQUERY_ERRORS.labels("ics_results").inc()
+        logger.error("Error fetching ICS results from BigQuery: %s", e, extra={"table": "ics_results", "customer_id": customer_id})
+        return None
 
-def generate_prep_pack_data(customer_id: str) -> PrepPackData:
+def generate_prep_pack_data(customer_id: str, rng: Optional[random.Random] = None,
+                            cached_only: bool = False) -> PrepPackData:
     """
     Fetches prep pack data from BigQuery where available, falls back to mock data for others.
+    Mock values are drawn from rng (seeded from customer_id when not given), so
+    the same customer always gets the same pack, whichever thread builds it.
+    With cached_only, only cached sections are used (no queries run), which is
+    how an overloaded worker still answers.
     """
-    Faker.seed(customer_id)
+    if rng is None:
+        rng = request_rng(customer_id)
     
-    print(f"🔍 Fetching prep pack data for customer: {customer_id}")
-    print(f"   Customer ID format matches BigQuery tables (CUST_XXXXXX)")
+    logger.debug("Fetching prep pack data", extra={"customer_id": customer_id})
     
     # Fetch real data from BigQuery tables
-    print("Fetching complaints from BigQuery...")
-    complaints = fetch_complaints_from_bigquery(customer_id)
+    with timed("bq_complaints"):
+        complaints = cached_section("complaints", customer_id, fetch_complaints_from_bigquery, cached_only)
     if not complaints:
-        print("No complaints found in BigQuery, using fallback mock data")
+        BIGQUERY_FALLBACKS.labels("complaints").inc()
+        logger.info("No complaints found in BigQuery, using fallback mock data", extra={"table": "complaints", "customer_id": customer_id})
         complaints = [
             Complaint(date=date(2024, 3, 22), description="Dispute regarding foreign exchange fees on large international transaction", status="pending"),
             Complaint(date=date(2023, 9, 8), description="Issues with online banking platform accessibility during system upgrade", status="resolved"),
         ]
     else:
-        print(f"Found {len(complaints)} complaints in BigQuery")
+        logger.debug("Found complaints in BigQuery", extra={"table": "complaints", "rows": len(complaints)})
     
-    print("Fetching inhibits from BigQuery...")
-    inhibits = fetch_inhibits_from_bigquery(customer_id)
+    with timed("bq_inhibits"):
+        inhibits = cached_section("inhibits", customer_id, fetch_inhibits_from_bigquery, cached_only)
     if not inhibits:
-        print("No inhibits found in BigQuery, using fallback mock data")
+        BIGQUERY_FALLBACKS.labels("inhibits").inc()
+        logger.info("No inhibits found in BigQuery, using fallback mock data", extra={"table": "inhibits", "customer_id": customer_id})
         inhibits = [
             Inhibit(title="ACH Debit Block", description="All incoming ACH debits", date=date(2024, 1, 15)),
             Inhibit(title="ACH Debit Filter", description="ACH debits from unapproved companies", date=date(2024, 2, 22)),
         ]
     else:
-        print(f"Found {len(inhibits)} inhibits in BigQuery")
+        logger.debug("Found inhibits in BigQuery", extra={"table": "inhibits", "rows": len(inhibits)})
     
-    print("Fetching journeys from BigQuery...")
-    journeys = fetch_journeys_from_bigquery(customer_id)
+    with timed("bq_journeys"):
+        journeys = cached_section("journeys", customer_id, fetch_journeys_from_bigquery, cached_only)
     if not journeys:
-        print("No journeys found in BigQuery, using fallback mock data")
+        BIGQUERY_FALLBACKS.labels("journeys").inc()
+        logger.info("No journeys found in BigQuery, using fallback mock data", extra={"table": "journeys", "customer_id": customer_id})
         journeys = [
             Journey(title="BIB Registration Request", subtitle="Request for business internet banking registration", status="Completed", date=date(2024, 4, 21)),
             Journey(title="Change of Bank Mandate", subtitle="Request to change mandate", status="Open", date=date(2023, 12, 15)),
         ]
     else:
-        print(f"Found {len(journeys)} journeys in BigQuery")
+        logger.debug("Found journeys in BigQuery", extra={"table": "journeys", "rows": len(journeys)})
     
-    print("Fetching ICS results from BigQuery...")
-    ics_results = fetch_ics_results_from_bigquery(customer_id)
+    with timed("bq_ics_results"):
+        ics_results = cached_section("ics_results", customer_id, fetch_ics_results_from_bigquery, cached_only)
     if not ics_results:
-        print("No ICS results found in BigQuery, using fallback mock data")
+        BIGQUERY_FALLBACKS.labels("ics_results").inc()
+        logger.info("No ICS results found in BigQuery, using fallback mock data", extra={"table": "ics_results", "customer_id": customer_id})
         ics_results = [
             ICSResult(date=date(2024, 3, 5), score="7/10", quote="Overall satisfied with services but would appreciate more tailored solutions for our industry-specific challenges."),
             ICSResult(date=date(2024, 1, 12), score="9/10", quote="Excellent service, very responsive team."),
         ]
     else:
-        print(f"Found {len(ics_results)} ICS results in BigQuery")
-    
+        logger.debug("Found ICS results in BigQuery", extra={"table": "ics_results", "rows": len(ics_results)})
+
+    with timed("assemble"):
+        return assemble_prep_pack(customer_id, complaints, inhibits, journeys, ics_results, rng)
+
+
+def assemble_prep_pack(
+    customer_id: str,
+    complaints: List[Complaint],
+    inhibits: List[Inhibit],
+    journeys: List[Journey],
+    ics_results: List[ICSResult],
+    rng: random.Random
+) -> PrepPackData:
+    """
+    Builds the full prep pack around the BigQuery sections, using mock data for
+    metrics that have no BigQuery table yet.
+    """
     # Use mock data for metrics not in BigQuery tables
     summary_text = (
         f"Customer {customer_id} is a valued HSBC client with comprehensive banking relationships. "
@@ -248,12 +383,12 @@ def generate_prep_pack_data(customer_id: str) -> PrepPackData:
     months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
     monthly_revenue_distribution = Chart(
         title="Monthly Revenue Distribution",
-        data=[ChartDataPoint(label=month, value=random.uniform(2000, 5000)) for month in months]
+        data=[ChartDataPoint(label=month, value=rng.uniform(2000, 5000)) for month in months]
     )
 
     monthly_revenue_trend = Chart(
         title="Monthly Revenue Trend",
-        data=[ChartDataPoint(label=month, value=random.uniform(80, 120)) for month in months]
+        data=[ChartDataPoint(label=month, value=rng.uniform(80, 120)) for month in months]
     )
     
     transaction_volume_summary = [
@@ -263,9 +398,7 @@ def generate_prep_pack_data(customer_id: str) -> PrepPackData:
         Transaction(date=date(2023, 10, 22), product="Trade Finance", amount="£27,600", status="completed"),
     ]
     
-    print("Prep pack data compilation complete!")
-    
-    return PrepPackData(
+    pack = PrepPackData(
         summary_text=summary_text,
         network_relationship=network_relationship,
         ai_insights=ai_insights,
@@ -278,6 +411,26 @@ def generate_prep_pack_data(customer_id: str) -> PrepPackData:
         monthly_revenue_trend=monthly_revenue_trend,  # Mock data
         transaction_volume_summary=transaction_volume_summary  # Mock data
     )
+    pack.section_versions = section_versions(pack.model_dump(mode="json"))
+    return pack
+
+
+def section_versions(sections: Dict[str, Any]) -> Dict[str, str]:
+    """Version stamp per section: a short hash of its JSON form, identical on every worker."""
+    return {
+        name: hashlib.blake2b(
+            json.dumps(sections[name], sort_keys=True, separators=(",", ":")).encode(), digest_size=8
+        ).hexdigest()
+        for name in PREP_PACK_SECTIONS
+    }
+
+
+def changed_sections(pack: PrepPackData, client_versions: Dict[str, str]) -> Dict[str, Any]:
+    """The sections (in JSON form) whose version differs from the one the client holds."""
+    stale = [name for name in PREP_PACK_SECTIONS if client_versions.get(name) != pack.section_versions.get(name)]
+    if not stale:
+        return {}
+    return pack.model_dump(mode="json", include=set(stale))
 
 
 # --- Real Implementation (Commented Out) ---
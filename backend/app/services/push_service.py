@@ -0,0 +1,131 @@
+import asyncio
+import os
+from typing import Any, Dict, Optional, Set
+
+from app.core.metrics import PUSH_SECTIONS_COALESCED, PUSH_SUBSCRIBERS, PUSH_UPDATES_PUBLISHED
+from app.models.schemas import PrepPackData
+
+# Open WebSocket subscriptions one worker accepts before refusing new ones
+PUSH_MAX_SUBSCRIBERS = int(os.getenv("PUSH_MAX_SUBSCRIBERS", "10000"))
+# Updates arriving within this window after the first are sent as one message
+PUSH_COALESCE_SECONDS = float(os.getenv("PUSH_COALESCE_SECONDS", "0.25"))
+# A client that has not taken a message within this long is disconnected; it
+# reconnects with its version vector and resumes from there
+PUSH_SEND_TIMEOUT_SECONDS = float(os.getenv("PUSH_SEND_TIMEOUT_SECONDS", "10"))
+
+
+class HubFull(Exception):
+    """Raised when a worker already holds PUSH_MAX_SUBSCRIBERS subscriptions."""
+
+
+class Subscription:
+    """
+    One open dashboard's mailbox. Pending changes are kept as the latest
+    payload per section rather than a queue of messages, so a burst of
+    updates collapses into one and a slow reader holds at most one copy of
+    each section, however far behind it falls.
+    """
+
+    __slots__ = ("customer_id", "conversation_id", "versions", "_pending", "_ready")
+
+    def __init__(self, customer_id: str, conversation_id: str, versions: Dict[str, str]):
+        self.customer_id = customer_id
+        self.conversation_id = conversation_id
+        # The versions the client will have once everything pending is sent
+        self.versions = dict(versions)
+        self._pending: Dict[str, Any] = {}
+        self._ready = asyncio.Event()
+
+    def offer(self, versions: Dict[str, str], sections: Dict[str, Any]) -> None:
+        """Queues the sections whose version differs from what the client will hold."""
+        for name, version in versions.items():
+            if self.versions.get(name) == version:
+                continue
+            if name in self._pending:
+                PUSH_SECTIONS_COALESCED.inc()
+            self._pending[name] = sections[name]
+            self.versions[name] = version
+        if self._pending:
+            self._ready.set()
+
+    async def next_update(self) -> Dict[str, Any]:
+        """Waits for pending changes, lets a burst settle, and takes them as one delta."""
+        await self._ready.wait()
+        if PUSH_COALESCE_SECONDS > 0:
+            await asyncio.sleep(PUSH_COALESCE_SECONDS)
+        return self.take_pending()
+
+    def take_pending(self) -> Dict[str, Any]:
+        """Empties the mailbox into a delta shaped like PrepPackDelta."""
+        self._ready.clear()
+        changed, self._pending = self._pending, {}
+        return {"section_versions": dict(self.versions), "changed": changed}
+
+
+class UpdateHub:
+    """
+    Fans prep pack updates out to the subscriptions open on this worker,
+    indexed by customer so a publish only touches that customer's widgets.
+    Everything runs on the event loop; publish_threadsafe is the entry point
+    for other threads.
+    """
+
+    def __init__(self, max_subscribers: int = PUSH_MAX_SUBSCRIBERS):
+        self.max_subscribers = max_subscribers
+        self._by_customer: Dict[str, Set[Subscription]] = {}
+        self._count = 0
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+
+    def __len__(self) -> int:
+        return self._count
+
+    def is_watched(self, customer_id: str) -> bool:
+        """Whether any dashboard on this worker is subscribed to the customer."""
+        return customer_id in self._by_customer
+
+    def subscribe(self, customer_id: str, conversation_id: str, versions: Dict[str, str]) -> Subscription:
+        if self._count >= self.max_subscribers:
+            raise HubFull(f"{self._count} subscriptions open")
+        self._loop = asyncio.get_running_loop()
+        subscription = Subscription(customer_id, conversation_id, versions)
+        self._by_customer.setdefault(customer_id, set()).add(subscription)
+        self._count += 1
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        subscriptions = self._by_customer.get(subscription.customer_id)
+        if subscriptions is None or subscription not in subscriptions:
+            return
+        subscriptions.discard(subscription)
+        if not subscriptions:
+            del self._by_customer[subscription.customer_id]
+        self._count -= 1
+
+    def publish(self, customer_id: str, pack: PrepPackData) -> int:
+        """
+        Offers a freshly built pack to every subscription for the customer and
+        returns how many there were. The pack is serialised once, not per
+        subscriber, and only when someone is listening.
+        """
+        subscriptions = self._by_customer.get(customer_id)
+        if not subscriptions:
+            return 0
+        sections = pack.model_dump(mode="json", exclude={"section_versions"})
+        for subscription in subscriptions:
+            subscription.offer(pack.section_versions, sections)
+        PUSH_UPDATES_PUBLISHED.inc()
+        return len(subscriptions)
+
+    def publish_threadsafe(self, customer_id: str, pack: PrepPackData) -> None:
+        """publish() for callers off the event loop thread, such as thread pool work."""
+        loop = self._loop
+        if loop is not None and not loop.is_closed():
+            loop.call_soon_threadsafe(self.publish, customer_id, pack)
+
+
+_hub = UpdateHub()
+PUSH_SUBSCRIBERS.set_function(lambda: len(_hub))
+
+
+def get_update_hub() -> UpdateHub:
+    return _hub
@@ -0,0 +1,199 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import sqlite3
+import threading
+import time
+from typing import Any, Dict, List, Optional
+
+from app.core.metrics import register_cache
+from app.core.shared_cache import dumps, loads
+from app.services.bigquery_rows import Row
+
+logger = logging.getLogger(__name__)
+
+# SQLite file for cached section query results; unset disables the cache. It
+# must be on a local disk (or tmpfs): SQLite's WAL mode needs memory shared by
+# every process using the file, which network mounts (Cloud Storage FUSE, NFS
+# and other Cloud Run volume types) cannot provide. So it outlives worker and
+# container restarts on one host only; a new instance starts with it empty.
+QUERY_CACHE_PATH = os.getenv("QUERY_CACHE_PATH")
+QUERY_CACHE_DEFAULT_TTL_SECONDS = float(os.getenv("QUERY_CACHE_DEFAULT_TTL_SECONDS", "3600"))
+# Per-table overrides, e.g. "complaints=900,ics_results=86400"
+QUERY_CACHE_TABLE_TTLS = os.getenv("QUERY_CACHE_TABLE_TTLS", "")
+QUERY_CACHE_MAX_ENTRIES = int(os.getenv("QUERY_CACHE_MAX_ENTRIES", "200000"))
+QUERY_CACHE_COMPACT_INTERVAL_SECONDS = float(os.getenv("QUERY_CACHE_COMPACT_INTERVAL_SECONDS", "300"))
+
+_WHITESPACE = re.compile(r"\s+")
+
+
+def parse_table_ttls(setting: str) -> Dict[str, float]:
+    ttls = {}
+    for item in setting.split(","):
+        if item.strip():
+            table, _, seconds = item.partition("=")
+            ttls[table.strip()] = float(seconds)
+    return ttls
+
+
+def normalise_sql(sql: str) -> str:
+    """Collapses whitespace, so reformatting a query does not orphan its cached results."""
+    return _WHITESPACE.sub(" ", sql).strip()
+
+
+def query_key(sql: str, params: Dict[str, Any]) -> str:
+    text = normalise_sql(sql) + "\n" + json.dumps(params, sort_keys=True, default=str)
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+class QueryResultCache:
+    """
+    Section query results in an SQLite file, keyed by normalised SQL plus
+    parameters, so restarted workers on the same host answer hot customers
+    without going to BigQuery. Each entry records its table and
+    customer for targeted invalidation. A background thread drops expired
+    entries, trims to max_entries (oldest first) and checkpoints the WAL.
+    """
+
+    def __init__(self, path: str, default_ttl: float = 3600.0, table_ttls: Optional[Dict[str, float]] = None,
+                 max_entries: int = 200000, compact_interval: float = 300.0, name: str = "bigquery_results"):
+        self.path = path
+        self.default_ttl = default_ttl
+        self.table_ttls = table_ttls or {}
+        self.max_entries = max_entries
+        self.max_ttl: Optional[float] = None
+        self.name = name
+        self.hits = 0
+        self.misses = 0
+        directory = os.path.dirname(path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        self._local = threading.local()
+        self._connection().executescript("""
+            CREATE TABLE IF NOT EXISTS results (
+                key TEXT PRIMARY KEY, tbl TEXT NOT NULL, customer_id TEXT, rows BLOB NOT NULL,
+                stored_at REAL NOT NULL, expires_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS results_customer ON results (tbl, customer_id);
+            CREATE INDEX IF NOT EXISTS results_expiry ON results (expires_at);
+        """)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._compact_loop, args=(compact_interval,),
+                                        name="query-cache-compactor", daemon=True)
+        self._thread.start()
+        register_cache(self)
+
+    def _connection(self) -> sqlite3.Connection:
+        db = getattr(self._local, "db", None)
+        if db is None:
+            db = self._local.db = sqlite3.connect(self.path, timeout=1.0, isolation_level=None)
+            db.execute("PRAGMA journal_mode=WAL")
+            db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def ttl_for(self, table: str) -> float:
+        ttl = self.table_ttls.get(table, self.default_ttl)
+        return ttl if self.max_ttl is None else min(ttl, self.max_ttl)
+
+    def limit_ttl(self, max_ttl: float) -> None:
+        """Caps every table's TTL (for results that change events cannot reach everywhere)."""
+        self.max_ttl = max_ttl
+
+    def get(self, sql: str, params: Dict[str, Any]) -> Optional[List[Row]]:
+        """The cached rows for a query, or None on a miss (or any cache error)."""
+        try:
+            row = self._connection().execute(
+                "SELECT rows FROM results WHERE key = ? AND expires_at > ?", (query_key(sql, params), time.time())
+            ).fetchone()
+            if row is None:
+                self.misses += 1
+                return None
+            columns, values = loads(row[0])
+        except Exception as e:
+            logger.debug("Query cache read failed: %s", e)
+            self.misses += 1
+            return None
+        self.hits += 1
+        index = {name: i for i, name in enumerate(columns)}
+        return [Row(tuple(v), index) for v in values]
+
+    def put(self, sql: str, params: Dict[str, Any], table: str, customer_id: Optional[str], rows: list) -> None:
+        columns = list(rows[0].keys()) if rows else []
+        now = time.time()
+        try:
+            # A value the encoding does not cover (TypeError) just goes uncached
+            blob = dumps((columns, [tuple(row.values()) for row in rows]))
+            self._connection().execute(
+                "INSERT OR REPLACE INTO results (key, tbl, customer_id, rows, stored_at, expires_at) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                (query_key(sql, params), table, customer_id, blob, now, now + self.ttl_for(table))
+            )
+        except (sqlite3.Error, TypeError, ValueError) as e:
+            logger.debug("Query cache write failed: %s", e)
+
+    def invalidate(self, table: str, customer_id: str) -> int:
+        try:
+            return self._connection().execute(
+                "DELETE FROM results WHERE tbl = ? AND customer_id = ?", (table, customer_id)
+            ).rowcount
+        except sqlite3.Error as e:
+            logger.warning("Query cache invalidation failed: %s", e, extra={"table": table})
+            return 0
+
+    def compact(self) -> Dict[str, int]:
+        """Drops expired entries, trims to max_entries and truncates the WAL."""
+        db = self._connection()
+        expired = db.execute("DELETE FROM results WHERE expires_at <= ?", (time.time(),)).rowcount
+        excess = len(self) - self.max_entries
+        trimmed = 0
+        if excess > 0:
+            trimmed = db.execute(
+                "DELETE FROM results WHERE key IN (SELECT key FROM results ORDER BY stored_at LIMIT ?)", (excess,)
+            ).rowcount
+        db.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+        return {"expired": expired, "trimmed": trimmed}
+
+    def _compact_loop(self, interval: float) -> None:
+        while not self._stop.wait(interval):
+            try:
+                removed = self.compact()
+                if removed["expired"] or removed["trimmed"]:
+                    logger.info("Compacted query cache", extra=removed)
+            except sqlite3.Error as e:
+                logger.warning("Query cache compaction failed: %s", e)
+
+    def __len__(self) -> int:
+        try:
+            return self._connection().execute("SELECT COUNT(*) FROM results").fetchone()[0]
+        except sqlite3.Error:
+            return 0
+
+    def close(self) -> None:
+        self._stop.set()
+        self._thread.join(timeout=5)
+
+
+_query_cache: Optional[QueryResultCache] = None
+_query_cache_lock = threading.Lock()
+
+
+def get_query_cache() -> Optional[QueryResultCache]:
+    """The persistent query cache, opened on first use; None when QUERY_CACHE_PATH is unset."""
+    global _query_cache
+    if _query_cache is None and QUERY_CACHE_PATH:
+        with _query_cache_lock:
+            if _query_cache is None:
+                _query_cache = QueryResultCache(
+                    QUERY_CACHE_PATH, QUERY_CACHE_DEFAULT_TTL_SECONDS, parse_table_ttls(QUERY_CACHE_TABLE_TTLS),
+                    QUERY_CACHE_MAX_ENTRIES, QUERY_CACHE_COMPACT_INTERVAL_SECONDS,
+                )
+    return _query_cache
+
+
+def close_query_cache() -> None:
+    global _query_cache
+    if _query_cache is not None:
+        _query_cache.close()
+        _query_cache = None
@@ -0,0 +1,43 @@
+import random
+import threading
+from typing import TYPE_CHECKING
+
+if TYPE_CHECKING:
+    from faker import Faker
+
+_local = threading.local()
+
+
+def request_rng(seed: str) -> random.Random:
+    """
+    Returns a private random generator for one request.
+    String seeds are hashed with SHA-512 by random.Random, so the sequence is
+    stable across processes and independent of PYTHONHASHSEED.
+    """
+    return random.Random(seed)
+
+
+def faker_for(rng: random.Random) -> "Faker":
+    """
+    Returns this thread's Faker instance drawing from the given generator.
+
+    Faker is expensive to construct, so one instance is kept per thread and
+    re-pointed at the caller's generator instead of reseeding global state.
+    Callers must finish using it before yielding to the event loop.
+    Faker is only imported here, as only the mock customer lookup needs it.
+    """
+    fake = getattr(_local, "fake", None)
+    if fake is None:
+        fake = _local.fake = new_faker()
+    fake.random = rng
+    return fake
+
+
+def new_faker() -> "Faker":
+    from faker import Faker
+    return Faker()
+
+
+def adopt_faker(fake: "Faker") -> None:
+    """Makes a Faker built on another thread this thread's instance (so the event loop need not build one)."""
+    _local.fake = fake
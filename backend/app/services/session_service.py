@@ -0,0 +1,63 @@
+import base64
+import hashlib
+import hmac
+import json
+import os
+import secrets
+import time
+from typing import Optional
+
+from app.models.schemas import DashboardSession
+
+# Signs the session tokens /process hands out. Every worker and instance that
+# may serve a dashboard's /sync or push calls needs the same secret; when it is
+# unset, each process signs with its own random key, so tokens only work on the
+# process that issued them.
+SESSION_SECRET = os.getenv("SESSION_SECRET")
+# How long a dashboard may keep polling on one authentication
+SESSION_TTL_SECONDS = float(os.getenv("SESSION_TTL_SECONDS", "28800"))
+
+_key = SESSION_SECRET.encode() if SESSION_SECRET else secrets.token_bytes(32)
+
+
+class InvalidSession(Exception):
+    """Raised for a session token that is malformed, forged or expired."""
+
+
+def _b64encode(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+
+def _b64decode(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+
+def _sign(body: str, key: bytes) -> str:
+    return _b64encode(hmac.new(key, body.encode(), hashlib.sha256).digest())
+
+
+def issue_session(conversation_id: str, customer_id: str, agent_id: str,
+                  ttl: float = SESSION_TTL_SECONDS, key: Optional[bytes] = None) -> str:
+    """
+    A token binding the conversation to the customer it was resolved to and
+    the agent who authenticated: "<payload>.<HMAC-SHA256>", both base64url.
+    Nothing is stored server-side, so any process holding the key verifies it.
+    """
+    session = DashboardSession(conversation_id=conversation_id, customer_id=customer_id, agent_id=agent_id,
+                               expires_at=time.time() + ttl)
+    body = _b64encode(session.model_dump_json().encode())
+    return f"{body}.{_sign(body, key or _key)}"
+
+
+def verify_session(token: str, key: Optional[bytes] = None, now: Optional[float] = None) -> DashboardSession:
+    """The session a token was issued for; raises InvalidSession unless it is genuine and unexpired."""
+    body, _, signature = token.partition(".")
+    if not signature or not hmac.compare_digest(signature, _sign(body, key or _key)):
+        raise InvalidSession("Bad signature")
+    try:
+        session = DashboardSession.model_validate(json.loads(_b64decode(body)))
+    except ValueError as e:
+        raise InvalidSession("Malformed session") from e
+    if session.expires_at < (now or time.time()):
+        raise InvalidSession("Session expired")
+    return session
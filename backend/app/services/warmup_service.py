@@ -0,0 +1,188 @@
+import asyncio
+import logging
+import os
+import time
+from datetime import date
+from typing import Any, Callable, Dict, List, Optional
+
+from starlette.concurrency import run_in_threadpool
+
+from app.core.metrics import Gauge
+from app.models.schemas import (
+    Complaint, ICSResult, Inhibit, Journey, PrepPackDelta, ProcessedConversationResponse, SyncPayload,
+)
+from app.services.customer_service import USE_REAL_GENESYS_API
+from app.services.genesys_client import get_genesys_client
+from app.services.identity_service import load_identity_index
+from app.services.prep_pack_service import (
+    assemble_prep_pack, changed_sections, generate_prep_pack_data, get_bigquery_client,
+)
+from app.services.rng import adopt_faker, new_faker, request_rng
+
+logger = logging.getLogger(__name__)
+
+WARMUP_ENABLED = os.getenv("WARMUP_ENABLED", "true").lower() == "true"
+# Customers whose prep packs are built (and cached) before the instance reports ready
+WARMUP_CUSTOMERS = [c.strip() for c in os.getenv("WARMUP_CUSTOMERS", "").split(",") if c.strip()]
+WARMUP_CONCURRENCY = int(os.getenv("WARMUP_CONCURRENCY", "4"))
+# Past this the instance reports ready anyway: a slow BigQuery must not keep it out of service
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("WARMUP_TIMEOUT_SECONDS", "60"))
+# At the start of lifespan shutdown /health/ready reports draining, and shutdown
+# then waits this long before stopping background work and closing clients
+SHUTDOWN_DRAIN_SECONDS = float(os.getenv("SHUTDOWN_DRAIN_SECONDS", "0"))
+
+READY = Gauge("bcs_ready", "1 once start-up warm-up has finished and the instance accepts traffic.")
+WARMUP_DURATION = Gauge("bcs_warmup_duration_seconds", "How long start-up warm-up took.")
+
+
+class WarmupState:
+    """Progress of the start-up warm-up, as reported by /health/ready."""
+
+    def __init__(self):
+        self.status = "pending"  # pending | running | done | timed_out
+        self.started_at: Optional[float] = None
+        self.duration_s: Optional[float] = None
+        self.steps_ms: Dict[str, float] = {}
+        self.errors: Dict[str, str] = {}
+        self.draining = False
+
+    @property
+    def ready(self) -> bool:
+        return self.status in ("done", "timed_out") and not self.draining
+
+    def as_dict(self) -> Dict[str, Any]:
+        return {
+            "status": "draining" if self.draining else self.status,
+            "duration_s": self.duration_s,
+            "steps_ms": self.steps_ms,
+            "errors": self.errors,
+        }
+
+
+_state = WarmupState()
+READY.set_function(lambda: 1.0 if _state.ready else 0.0)
+WARMUP_DURATION.set_function(lambda: _state.duration_s or 0.0)
+
+
+def get_warmup_state() -> WarmupState:
+    return _state
+
+
+def _init_clients() -> None:
+    # Heavy dependencies are imported on first use (see benchmarks/import_profile.py); load them here instead
+    import jwt  # noqa: F401  (the mock token exchange)
+    get_bigquery_client()
+    if USE_REAL_GENESYS_API:
+        get_genesys_client()
+    # Both customer lookups resolve identifiers; waits for the start-up load if it is still running
+    load_identity_index(force=False)
+
+
+def _build_faker():
+    # Faker instances are per thread and slow to build. The mock customer lookup
+    # runs on the loop thread, so one is built here and handed to that thread.
+    fake = new_faker()
+    fake.random = request_rng("warmup")
+    fake.company()
+    return fake
+
+
+def _build_models() -> None:
+    """Runs each model's validation and serialisation once, so their first real use is not the slow one."""
+    pack = assemble_prep_pack(
+        "WARMUP",
+        [Complaint(date=date(2024, 1, 1), description="warm-up", status="resolved")],
+        [Inhibit(title="warm-up", description="warm-up", date=date(2024, 1, 1))],
+        [Journey(title="warm-up", subtitle="warm-up", status="Completed", date=date(2024, 1, 1))],
+        [ICSResult(date=date(2024, 1, 1), score="9/10", quote="warm-up")],
+        request_rng("warmup"),
+    )
+    body = ProcessedConversationResponse(prep_pack_data=pack, session_token="warmup").model_dump_json()
+    ProcessedConversationResponse.model_validate_json(body)
+    payload = SyncPayload.model_validate_json('{"sessionToken": "warmup", "versions": {}}')
+    PrepPackDelta(section_versions=pack.section_versions,
+                  changed=changed_sections(pack, payload.versions)).model_dump_json()
+
+
+async def _step(name: str, func: Callable[..., Any], *args: Any) -> Any:
+    """Runs one step in the thread pool and returns its result (None if it failed)."""
+    start = time.perf_counter()
+    try:
+        # Blocking imports and I/O; the loop keeps answering liveness probes meanwhile
+        return await run_in_threadpool(func, *args)
+    except Exception as e:
+        _state.errors[name] = str(e)
+        logger.warning("Warm-up step %s failed: %s", name, e)
+        return None
+    finally:
+        _state.steps_ms[name] = round((time.perf_counter() - start) * 1000, 2)
+
+
+async def _warm_customers(customers: List[str]) -> None:
+    semaphore = asyncio.Semaphore(WARMUP_CONCURRENCY)
+
+    async def warm(customer_id: str) -> None:
+        async with semaphore:
+            await _step(f"customer:{customer_id}", generate_prep_pack_data, customer_id)
+
+    await asyncio.gather(*(warm(customer_id) for customer_id in customers))
+
+
+async def warm_up() -> None:
+    """
+    Pre-initialises clients, Faker and the models, then builds the prep packs
+    of WARMUP_CUSTOMERS. Failures are recorded but do not keep the instance
+    from becoming ready: every step has a fallback at request time.
+    """
+    _state.status = "running"
+    _state.started_at = time.perf_counter()
+
+    async def steps() -> None:
+        await _step("clients", _init_clients)
+        fake = await _step("faker", _build_faker)
+        if fake is not None:
+            adopt_faker(fake)
+        await _step("models", _build_models)
+        if WARMUP_CUSTOMERS:
+            await _warm_customers(WARMUP_CUSTOMERS)
+
+    try:
+        await asyncio.wait_for(steps(), WARMUP_TIMEOUT_SECONDS)
+        _state.status = "done"
+    except asyncio.TimeoutError:
+        _state.status = "timed_out"
+        logger.warning("Warm-up timed out; reporting ready", extra={"timeout_s": WARMUP_TIMEOUT_SECONDS})
+    _state.duration_s = round(time.perf_counter() - _state.started_at, 3)
+    logger.info("Warm-up finished", extra=_state.as_dict())
+
+
+_task: Optional[asyncio.Task] = None
+
+
+def start_warmup() -> None:
+    """Runs warm-up in the background, or marks the instance ready at once when disabled."""
+    global _task
+    if not WARMUP_ENABLED:
+        _state.status = "done"
+        return
+    _task = asyncio.create_task(warm_up(), name="warmup")
+
+
+async def stop_warmup() -> None:
+    """
+    The first step of lifespan shutdown: stops reporting ready, cancels any
+    unfinished warm-up and waits SHUTDOWN_DRAIN_SECONDS before the rest of
+    shutdown runs.
+    """
+    global _task
+    _state.draining = True
+    logger.info("Draining before shutdown", extra={"drain_s": SHUTDOWN_DRAIN_SECONDS})
+    if _task is not None and not _task.done():
+        _task.cancel()
+        try:
+            await _task
+        except asyncio.CancelledError:
+            pass
+    _task = None
+    if SHUTDOWN_DRAIN_SECONDS > 0:
+        await asyncio.sleep(SHUTDOWN_DRAIN_SECONDS)
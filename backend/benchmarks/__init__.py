@@ -0,0 +1 @@
+# Performance benchmarks for the backend (run from the backend directory with python -m)
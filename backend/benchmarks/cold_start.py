@@ -0,0 +1,230 @@
+"""
+Cold-start benchmark: process start to first byte
+
+Starts the backend from nothing, repeatedly, and times what a new Cloud Run
+instance goes through: the first byte served (GET /health/live), readiness
+(GET /health/ready turning 200 once warm-up is done) and the first
+POST /api/v1/process. Runs either a local uvicorn process or, with --image,
+the Docker image itself, whose ID and size are recorded in the report so
+the numbers are tracked alongside the image they were measured on. The
+report also carries the median `import app.main` time from import_profile.
+
+Locally the fake BigQuery client serves bq_mock_data; the image has no mock
+data, so pass the settings it should start with through --env (or
+--docker-args, e.g. to mount bq_mock_data and point FAKE_BQ_DATA_DIR at it).
+
+Usage (from the backend directory):
+    python -m benchmarks.cold_start --repeats 5 --output cold.json
+    python -m benchmarks.cold_start --compare cold.json --max-regression 0.15
+    docker build -t bcs-assist-backend . && python -m benchmarks.cold_start --image bcs-assist-backend
+    python -m benchmarks.cold_start --image bcs-assist-backend --env BQ_BACKEND=fake \\
+        --docker-args "-v $PWD/../bq_mock_data:/bq_mock_data" --env FAKE_BQ_DATA_DIR=/bq_mock_data
+"""
+
+import argparse
+import json
+import os
+import shlex
+import socket
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+import httpx
+
+from benchmarks.import_profile import parse_importtime, profile_imports
+from benchmarks.load_process import git_commit, summarise
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), "..")
+CONTAINER_PORT = 8080
+DEFAULT_ENV = {"BQ_BACKEND": "fake", "FAKE_BQ_LATENCY": "constant:50", "FAKE_BQ_SEED": "42", "LOG_LEVEL": "WARNING"}
+PROCESS_BODY = {"conversationId": "cold-start", "authorizationCode": "cold-start", "codeVerifier": "cold-start"}
+METRICS = ("first_byte_ms", "ready_ms", "first_process_ms", "first_process_latency_ms")
+
+
+def free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class LocalServer:
+    def __init__(self, env: Dict[str, str]):
+        self.port = free_port()
+        self.process = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "app.main:app", "--host", "127.0.0.1", "--port", str(self.port)],
+            cwd=BACKEND_DIR, env={**os.environ, **env}, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE, text=True,
+        )
+
+    def exited(self) -> Optional[str]:
+        if self.process.poll() is None:
+            return None
+        return self.process.stderr.read()[-2000:]
+
+    def stop(self) -> None:
+        self.process.terminate()
+        try:
+            self.process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+
+
+class ContainerServer:
+    def __init__(self, image: str, env: Dict[str, str], docker_args: List[str]):
+        self.port = free_port()
+        env_args = [arg for key, value in env.items() for arg in ("-e", f"{key}={value}")]
+        self.container = subprocess.check_output(
+            ["docker", "run", "-d", "-p", f"127.0.0.1:{self.port}:{CONTAINER_PORT}", *env_args, *docker_args, image],
+            text=True,
+        ).strip()
+
+    def exited(self) -> Optional[str]:
+        state = subprocess.run(["docker", "inspect", "-f", "{{.State.Running}}", self.container],
+                               capture_output=True, text=True).stdout.strip()
+        if state == "true":
+            return None
+        return subprocess.run(["docker", "logs", "--tail", "40", self.container],
+                              capture_output=True, text=True).stderr
+
+    def stop(self) -> None:
+        subprocess.run(["docker", "rm", "-f", self.container], capture_output=True)
+
+
+def poll(client: httpx.Client, server, request: Callable[[], httpx.Response],
+         accept: Callable[[httpx.Response], bool], deadline: float, interval: float) -> httpx.Response:
+    """Repeats the request until a response is accepted; connection errors mean the server is not up yet."""
+    while True:
+        try:
+            response = request()
+            if accept(response):
+                return response
+        except httpx.TransportError:
+            output = server.exited()
+            if output is not None:
+                raise RuntimeError(f"Server exited during start-up:\n{output}")
+        if time.perf_counter() > deadline:
+            raise TimeoutError("Server did not start in time")
+        time.sleep(interval)
+
+
+def cold_start(launch: Callable[[], object], timeout: float, interval: float) -> Dict[str, float]:
+    """One cold start: milliseconds from launch to the first byte, to ready and to the first processed request."""
+    start = time.perf_counter()
+    server = launch()
+    deadline = start + timeout
+    base = f"http://127.0.0.1:{server.port}"
+    elapsed = lambda: round((time.perf_counter() - start) * 1000, 2)  # noqa: E731
+    try:
+        with httpx.Client(timeout=timeout) as client:
+            poll(client, server, lambda: client.get(f"{base}/health/live"), lambda r: True, deadline, interval)
+            first_byte = elapsed()
+            poll(client, server, lambda: client.get(f"{base}/health/ready"), lambda r: r.status_code == 200,
+                 deadline, interval)
+            ready = elapsed()
+            response = client.post(f"{base}/api/v1/process", json=PROCESS_BODY)
+            response.raise_for_status()
+            first_process = elapsed()
+    finally:
+        server.stop()
+    return {"first_byte_ms": first_byte, "ready_ms": ready, "first_process_ms": first_process,
+            "first_process_latency_ms": round(first_process - ready, 2)}
+
+
+def image_info(image: str) -> Dict:
+    image_id, size = subprocess.check_output(
+        ["docker", "image", "inspect", "-f", "{{.Id}} {{.Size}}", image], text=True
+    ).split()
+    return {"image": image, "id": image_id, "size_mb": round(int(size) / 1e6, 1)}
+
+
+def image_import_ms(image: str, env: Dict[str, str]) -> Optional[float]:
+    """`import app.main` time inside the image (one run: each container starts cold)."""
+    env_args = [arg for key, value in env.items() for arg in ("-e", f"{key}={value}")]
+    completed = subprocess.run(["docker", "run", "--rm", *env_args, image,
+                                "python", "-X", "importtime", "-c", "import app.main"],
+                               capture_output=True, text=True)
+    stats = parse_importtime(completed.stderr).get("app.main")
+    return round(stats["cumulative_us"] / 1000, 3) if stats else None
+
+
+def compare(summaries: Dict[str, Dict], baseline: Dict, max_regression: float) -> List[str]:
+    regressions = []
+    for metric, stats in summaries.items():
+        new, old = stats.get("p50"), baseline.get("results", {}).get(metric, {}).get("p50")
+        if new is not None and old and new > old * (1 + max_regression):
+            regressions.append(f"{metric} p50: {old} -> {new} ms")
+    return regressions
+
+
+def parse_env(pairs: List[str]) -> Dict[str, str]:
+    env = {}
+    for pair in pairs:
+        key, _, value = pair.partition("=")
+        env[key] = value
+    return env
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Cold-start benchmark: process start to first byte")
+    parser.add_argument("--image", help="Start this Docker image instead of a local uvicorn process")
+    parser.add_argument("--docker-args", default="", help="Extra `docker run` arguments (with --image)")
+    parser.add_argument("--env", action="append", default=[], metavar="KEY=VALUE",
+                        help="Environment for the server; locally defaults to the fake BigQuery client")
+    parser.add_argument("--repeats", type=int, default=5, help="Cold starts to take percentiles over")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds a start may take before failing")
+    parser.add_argument("--interval", type=float, default=0.005, help="Seconds between start-up probes")
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.15,
+                        help="Allowed fractional slowdown of a median before --compare fails")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    env = parse_env(args.env)
+    if args.image:
+        docker_args = shlex.split(args.docker_args)
+        launch = lambda: ContainerServer(args.image, env, docker_args)  # noqa: E731
+        target = image_info(args.image)
+        import_ms = image_import_ms(args.image, env)
+    else:
+        env = {**DEFAULT_ENV, **env}
+        launch = lambda: LocalServer(env)  # noqa: E731
+        target = {"image": None}
+        import_ms = profile_imports("app.main", 3, env)["module_ms"]
+
+    runs = [cold_start(launch, args.timeout, args.interval) for _ in range(args.repeats)]
+    results = {metric: summarise([run[metric] for run in runs]) for metric in METRICS}
+    report = {
+        "benchmark": "cold_start",
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {"repeats": args.repeats, "env": env, "python": sys.version.split()[0]},
+        "target": target,
+        "import_ms": import_ms,
+        "results": results,
+        "runs": runs,
+    }
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.max_regression)
+        report["comparison"] = {"baseline_commit": baseline.get("commit"),
+                                "baseline_image": baseline.get("target", {}).get("id"),
+                                "baseline_import_ms": baseline.get("import_ms"), "regressions": regressions}
+        exit_code = 1 if regressions else 0
+
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
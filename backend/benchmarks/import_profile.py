@@ -0,0 +1,161 @@
+"""
+Start-up import profile of the backend
+
+Imports the app in fresh interpreters under `python -X importtime` and
+reports what start-up spends its time on: the total, the slowest modules by
+self and cumulative time, and self time rolled up by top-level package
+(fastapi, pydantic, app, ...). Timings are medians over --repeats runs.
+
+Heavy dependencies that only some modes need (the BigQuery client library,
+Faker, PyJWT, ...) are imported on first use; --forbid names modules that
+must not be imported at start-up and fails the run if one is, so an eager
+import creeping back in shows up like any other regression.
+
+Usage (from the backend directory):
+    python -m benchmarks.import_profile
+    python -m benchmarks.import_profile --top 30 --output imports.json
+    python -m benchmarks.import_profile --compare imports.json --max-regression 0.20
+    python -m benchmarks.import_profile --module app.services.prep_pack_service
+"""
+
+import argparse
+import json
+import os
+import re
+import statistics
+import subprocess
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from benchmarks.load_process import git_commit
+
+BACKEND_DIR = os.path.join(os.path.dirname(__file__), "..")
+
+# Imported lazily by the app; importing any of them at start-up is a regression
+DEFAULT_FORBIDDEN = "google.cloud.bigquery,google.api_core.exceptions,faker,jwt"
+
+_LINE = re.compile(r"^import time:\s+(\d+) \|\s+(\d+) \|( *)(\S+)$")
+
+
+def parse_importtime(output: str) -> Dict[str, Dict]:
+    """Per module self and cumulative microseconds, plus nesting depth, from -X importtime stderr."""
+    modules = {}
+    for line in output.splitlines():
+        match = _LINE.match(line)
+        if match:
+            self_us, cumulative_us, indent, name = match.groups()
+            modules[name] = {"self_us": int(self_us), "cumulative_us": int(cumulative_us),
+                             "depth": len(indent) // 2}
+    return modules
+
+
+def import_once(module: str, env: Dict[str, str]) -> Dict[str, Dict]:
+    completed = subprocess.run([sys.executable, "-X", "importtime", "-c", f"import {module}"],
+                               cwd=BACKEND_DIR, env=env, capture_output=True, text=True)
+    if completed.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{completed.stderr[-2000:]}")
+    return parse_importtime(completed.stderr)
+
+
+def profile_imports(module: str = "app.main", repeats: int = 5, env: Optional[Dict[str, str]] = None) -> Dict:
+    """
+    Median -X importtime figures over fresh interpreters. One unrecorded run
+    first writes any missing bytecode, so compilation is not counted.
+    """
+    env = {**os.environ, "LOG_LEVEL": "CRITICAL", **(env or {})}
+    import_once(module, env)
+    runs = [import_once(module, env) for _ in range(repeats)]
+
+    modules = {}
+    for name in runs[0]:
+        samples = [run[name] for run in runs if name in run]
+        modules[name] = {
+            "self_ms": round(statistics.median(s["self_us"] for s in samples) / 1000, 3),
+            "cumulative_ms": round(statistics.median(s["cumulative_us"] for s in samples) / 1000, 3),
+            "depth": samples[0]["depth"],
+        }
+    # Top-level entries partition the run, so their cumulative times add up to the total
+    total_ms = sum(m["cumulative_ms"] for m in modules.values() if m["depth"] == 0)
+    by_package: Dict[str, float] = {}
+    for name, stats in modules.items():
+        package = name.split(".")[0]
+        by_package[package] = by_package.get(package, 0.0) + stats["self_ms"]
+    return {"total_ms": round(total_ms, 3), "module_ms": modules[module]["cumulative_ms"] if module in modules else None,
+            "modules": modules, "by_package": by_package}
+
+
+def top(mapping: Dict[str, float], n: int) -> Dict[str, float]:
+    return {name: round(value, 3) for name, value in sorted(mapping.items(), key=lambda kv: -kv[1])[:n]}
+
+
+def print_table(report: Dict) -> None:
+    print(f"{report['config']['module']}: {report['module_ms']:.1f} ms "
+          f"(all imports {report['total_ms']:.1f} ms)", file=sys.stderr)
+    print(f"{'package':32} {'self ms':>10}", file=sys.stderr)
+    for name, ms in report["by_package"].items():
+        print(f"{name:32} {ms:10.1f}", file=sys.stderr)
+    print(f"{'module':52} {'cumulative ms':>14}", file=sys.stderr)
+    for name, ms in report["slowest_cumulative"].items():
+        print(f"{name:52} {ms:14.1f}", file=sys.stderr)
+    for name in report["forbidden_imported"]:
+        print(f"! {name} is imported at start-up", file=sys.stderr)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Start-up import profile (python -X importtime)")
+    parser.add_argument("--module", default="app.main", help="Module to import")
+    parser.add_argument("--repeats", type=int, default=5, help="Fresh interpreters to take the median over")
+    parser.add_argument("--top", type=int, default=20, help="Slowest modules and packages to report")
+    parser.add_argument("--forbid", default=DEFAULT_FORBIDDEN,
+                        help="Comma-separated modules that must not be imported at start-up ('' to skip)")
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.20,
+                        help="Allowed fractional growth of the import time before --compare fails")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    profile = profile_imports(args.module, args.repeats)
+    modules = profile["modules"]
+    forbidden = [name for name in args.forbid.split(",") if name and name in modules]
+
+    report = {
+        "benchmark": "import_profile",
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {"module": args.module, "repeats": args.repeats, "python": sys.version.split()[0]},
+        "module_ms": profile["module_ms"],
+        "total_ms": profile["total_ms"],
+        "modules_imported": len(modules),
+        "by_package": top(profile["by_package"], args.top),
+        "slowest_self": top({name: m["self_ms"] for name, m in modules.items()}, args.top),
+        "slowest_cumulative": top({name: m["cumulative_ms"] for name, m in modules.items()}, args.top),
+        "forbidden_imported": forbidden,
+    }
+    exit_code = 1 if forbidden else 0
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        old, new = baseline.get("module_ms"), report["module_ms"]
+        regressed = bool(old and new and new > old * (1 + args.max_regression))
+        report["comparison"] = {"baseline_commit": baseline.get("commit"), "baseline_module_ms": old,
+                                "ratio": round(new / old, 3) if old and new else None, "regressed": regressed,
+                                # Modules that joined the slowest list since the baseline
+                                "new_in_slowest": sorted(set(report["slowest_cumulative"])
+                                                         - set(baseline.get("slowest_cumulative", {})))}
+        exit_code = 1 if regressed or forbidden else 0
+
+    print_table(report)
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,313 @@
+"""
+End-to-end load benchmark for POST /api/v1/process
+
+Drives the endpoint either in-process (the FastAPI app behind an ASGI
+transport, with FakeBigQueryClient serving bq_mock_data under injectable
+latency, error rate and slow jobs) or against a running backend via --url. Reports latency
+percentiles, throughput, error rate and per-stage Server-Timing percentiles
+as JSON, tagged with the git commit so runs can be compared across commits.
+
+Usage (from the backend directory):
+    python -m benchmarks.load_process --concurrency 32 --duration 30
+    python -m benchmarks.load_process --rate 200 --distribution zipf --output run.json
+    python -m benchmarks.load_process --compare baseline.json --max-regression 0.10
+    python -m benchmarks.load_process --url http://localhost:8000 --concurrency 16
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from contextlib import asynccontextmanager
+from itertools import accumulate
+from typing import AsyncIterator, Dict, List, Optional
+
+# Keep the in-process app quiet: its logs share stdout with the JSON report
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+os.environ.setdefault("LOOP_MONITOR_ENABLED", "false")
+
+import httpx  # noqa: E402
+
+
+def percentile(sorted_values: List[float], pct: float) -> Optional[float]:
+    """
+    Nearest-rank percentile of an already sorted list: the smallest value
+    with at least pct% of the sample at or below it (no interpolation).
+    """
+    if not sorted_values:
+        return None
+    rank = max(1, math.ceil(pct * len(sorted_values) / 100))
+    return round(sorted_values[rank - 1], 3)
+
+
+def summarise(values: List[float]) -> Dict[str, Optional[float]]:
+    values = sorted(values)
+    return {
+        "p50": percentile(values, 50),
+        "p95": percentile(values, 95),
+        "p99": percentile(values, 99),
+        "max": round(values[-1], 3) if values else None,
+        "mean": round(sum(values) / len(values), 3) if values else None,
+    }
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+class ConversationPicker:
+    """
+    Chooses the conversation (and so the customer) for each request: uniform
+    over the pool, or Zipf-skewed so a few hot customers dominate.
+    """
+
+    def __init__(self, customers: int, distribution: str, zipf_s: float, seed: int):
+        self.conversation_ids = [f"bench-conv-{i:06d}" for i in range(customers)]
+        self.rng = random.Random(seed)
+        self.cum_weights = None
+        if distribution == "zipf":
+            self.cum_weights = list(accumulate(1 / (rank ** zipf_s) for rank in range(1, customers + 1)))
+
+    def pick(self) -> str:
+        if self.cum_weights is None:
+            return self.rng.choice(self.conversation_ids)
+        return self.rng.choices(self.conversation_ids, cum_weights=self.cum_weights)[0]
+
+
+def parse_server_timing(header: Optional[str]) -> Dict[str, float]:
+    stages = {}
+    for entry in (header or "").split(","):
+        name, _, params = entry.strip().partition(";")
+        if params.startswith("dur="):
+            try:
+                stages[name] = float(params[4:])
+            except ValueError:
+                pass
+    return stages
+
+
+class Recorder:
+    def __init__(self):
+        self.latencies_ms: List[float] = []
+        self.errors = 0
+        self.status_counts: Dict[str, int] = {}
+        self.stages: Dict[str, List[float]] = {}
+
+    def record(self, latency_ms: float, status: Optional[int], server_timing: Optional[str]) -> None:
+        self.latencies_ms.append(latency_ms)
+        key = str(status) if status is not None else "error"
+        self.status_counts[key] = self.status_counts.get(key, 0) + 1
+        if status is None or status >= 400:
+            self.errors += 1
+        for name, duration in parse_server_timing(server_timing).items():
+            self.stages.setdefault(name, []).append(duration)
+
+
+async def send_one(client: httpx.AsyncClient, conversation_id: str, recorder: Recorder) -> None:
+    payload = {
+        "conversationId": conversation_id,
+        "authorizationCode": "bench-auth-code",
+        "codeVerifier": "bench-code-verifier",
+    }
+    start = time.perf_counter()
+    try:
+        response = await client.post("/api/v1/process", json=payload)
+        status, server_timing = response.status_code, response.headers.get("server-timing")
+    except httpx.HTTPError:
+        status, server_timing = None, None
+    recorder.record((time.perf_counter() - start) * 1000, status, server_timing)
+
+
+async def closed_loop(client, picker, recorder, concurrency: int, deadline: float, max_requests: Optional[int]):
+    issued = 0
+
+    async def worker():
+        nonlocal issued
+        while time.perf_counter() < deadline and (max_requests is None or issued < max_requests):
+            issued += 1
+            await send_one(client, picker.pick(), recorder)
+
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+
+
+async def open_loop(client, picker, recorder, rate: float, deadline: float, max_requests: Optional[int], seed: int):
+    # Poisson arrivals: requests are issued on schedule whether or not earlier ones finished
+    rng = random.Random(seed + 1)
+    tasks = []
+    next_arrival = time.perf_counter()
+    while next_arrival < deadline and (max_requests is None or len(tasks) < max_requests):
+        delay = next_arrival - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        tasks.append(asyncio.create_task(send_one(client, picker.pick(), recorder)))
+        next_arrival += rng.expovariate(rate)
+    await asyncio.gather(*tasks)
+
+
+@asynccontextmanager
+async def open_target(args, connections: int = 100) -> AsyncIterator[httpx.AsyncClient]:
+    """
+    Yields a client for the backend under test: a running server when --url
+    is given, otherwise the app in-process (lifespan included) backed by
+    FakeBigQueryClient with the --bq-* settings.
+    """
+    if args.url:
+        limits = httpx.Limits(max_connections=connections, max_keepalive_connections=connections)
+        async with httpx.AsyncClient(base_url=args.url, limits=limits, timeout=args.timeout) as client:
+            yield client
+        return
+
+    from app.main import app
+    from app.services.fake_bigquery import FakeBigQueryClient
+    from app.services.prep_pack_service import set_bigquery_client
+
+    set_bigquery_client(FakeBigQueryClient(
+        latency=args.bq_latency, error_rate=args.bq_error_rate, slow_job_rate=args.bq_slow_job_rate,
+        slow_job_ms=args.bq_slow_job_ms, seed=args.seed
+    ))
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=args.timeout) as client:
+        async with app.router.lifespan_context(app):
+            yield client
+
+
+def target_config(args) -> Dict:
+    return {
+        "target": args.url or "in-process",
+        "bq_latency": None if args.url else args.bq_latency,
+        "bq_error_rate": None if args.url else args.bq_error_rate,
+        "bq_slow_job_rate": None if args.url else args.bq_slow_job_rate,
+        "bq_slow_job_ms": None if args.url else args.bq_slow_job_ms,
+        "seed": args.seed,
+        "python": sys.version.split()[0],
+    }
+
+
+async def run(args) -> Dict:
+    picker = ConversationPicker(args.customers, args.distribution, args.zipf_s, args.seed)
+    recorder = Recorder()
+
+    async with open_target(args, connections=max(args.concurrency, 100)) as client:
+        # Warm-up requests are not recorded
+        warmup = Recorder()
+        for _ in range(args.warmup):
+            await send_one(client, picker.pick(), warmup)
+
+        start = time.perf_counter()
+        deadline = start + args.duration
+        if args.rate:
+            await open_loop(client, picker, recorder, args.rate, deadline, args.requests, args.seed)
+        else:
+            await closed_loop(client, picker, recorder, args.concurrency, deadline, args.requests)
+        elapsed = time.perf_counter() - start
+
+    total = len(recorder.latencies_ms)
+    return {
+        "benchmark": "load_process",
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            **target_config(args),
+            "mode": "open" if args.rate else "closed",
+            "concurrency": None if args.rate else args.concurrency,
+            "rate": args.rate,
+            "duration_s": args.duration,
+            "customers": args.customers,
+            "distribution": args.distribution,
+            "zipf_s": args.zipf_s if args.distribution == "zipf" else None,
+        },
+        "requests": total,
+        "errors": recorder.errors,
+        "error_rate": round(recorder.errors / total, 4) if total else None,
+        "throughput_rps": round(total / elapsed, 2) if elapsed else None,
+        "elapsed_s": round(elapsed, 3),
+        "status_counts": recorder.status_counts,
+        "latency_ms": summarise(recorder.latencies_ms),
+        "stages_ms": {name: summarise(values) for name, values in sorted(recorder.stages.items())},
+    }
+
+
+def compare(result: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    """Returns a description of every tracked number that regressed past the allowed ratio."""
+    regressions = []
+    for key in ("p50", "p95", "p99"):
+        new, old = result["latency_ms"].get(key), baseline.get("latency_ms", {}).get(key)
+        if new is not None and old and new > old * (1 + max_regression):
+            regressions.append(f"latency {key}: {old} -> {new} ms")
+    new_tp, old_tp = result.get("throughput_rps"), baseline.get("throughput_rps")
+    if new_tp is not None and old_tp and new_tp < old_tp * (1 - max_regression):
+        regressions.append(f"throughput: {old_tp} -> {new_tp} rps")
+    new_err, old_err = result.get("error_rate") or 0, baseline.get("error_rate") or 0
+    if new_err > old_err + max_regression / 10:
+        regressions.append(f"error rate: {old_err} -> {new_err}")
+    return regressions
+
+
+def add_target_arguments(parser: argparse.ArgumentParser) -> None:
+    parser.add_argument("--url", help="Target a running backend instead of the in-process app")
+    parser.add_argument("--bq-latency", default="lognormal:50,0.5",
+                        help="Fake BigQuery job latency spec (see app.services.fake_bigquery.parse_latency)")
+    parser.add_argument("--bq-error-rate", type=float, default=0.0, help="Fraction of fake BigQuery jobs that fail")
+    parser.add_argument("--bq-slow-job-rate", type=float, default=0.0, help="Fraction of jobs made very slow")
+    parser.add_argument("--bq-slow-job-ms", type=float, default=5000.0, help="Extra latency of a slow job")
+    parser.add_argument("--timeout", type=float, default=30.0, help="Per-request timeout in seconds")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.10,
+                        help="Allowed fractional regression before --compare fails")
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Load benchmark for POST /api/v1/process")
+    parser.add_argument("--concurrency", type=int, default=16, help="Closed-loop workers (ignored with --rate)")
+    parser.add_argument("--rate", type=float, help="Open-loop Poisson arrival rate in requests/second")
+    parser.add_argument("--duration", type=float, default=10.0, help="Seconds to run")
+    parser.add_argument("--requests", type=int, help="Stop after this many requests")
+    parser.add_argument("--warmup", type=int, default=5, help="Unrecorded requests before measuring")
+    parser.add_argument("--customers", type=int, default=500, help="Distinct conversations in the pool")
+    parser.add_argument("--distribution", choices=["uniform", "zipf"], default="uniform")
+    parser.add_argument("--zipf-s", type=float, default=1.1, help="Zipf exponent for hot-key skew")
+    add_target_arguments(parser)
+    return parser
+
+
+def write_report(result: Dict, args) -> int:
+    """Prints the report (with a --compare verdict) and returns the process exit code."""
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.max_regression)
+        # Numbers are only comparable when the load shape matches
+        differing = sorted(key for key, value in result["config"].items()
+                           if key != "python" and baseline.get("config", {}).get(key) != value)
+        result["comparison"] = {"baseline_commit": baseline.get("commit"), "config_differs": differing,
+                                "regressions": regressions}
+        exit_code = 1 if regressions else 0
+
+    report = json.dumps(result, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    return exit_code
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return write_report(asyncio.run(run(args)), args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
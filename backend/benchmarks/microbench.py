@@ -0,0 +1,283 @@
+"""
+Microbenchmarks for the prep pack hot paths
+
+Times the pieces the end-to-end benchmarks cannot isolate: mapping BigQuery
+rows to models, assembling and building PrepPackData, serialising the
+response, adapt_data_to_schema in the mock data generator, and the data
+preparation inside the Streamlit render_* functions (run in Streamlit's bare
+mode, with no browser or server). Fixtures come from bq_mock_data through
+FakeBigQueryClient with zero latency, so every run sees the same inputs.
+
+Each case is calibrated to a loop count that runs for at least --min-time,
+then timed --repeats times with the garbage collector off; the report gives
+per-call median, mean, spread and IQR in microseconds.
+
+Usage (from the backend directory):
+    python -m benchmarks.microbench --output micro.json
+    python -m benchmarks.microbench --compare micro.json --max-regression 0.15
+    python -m benchmarks.microbench --suite backend --filter serialise
+"""
+
+import argparse
+import contextlib
+import gc
+import io
+import json
+import logging
+import os
+import statistics
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional, Tuple
+
+os.environ.setdefault("LOG_LEVEL", "CRITICAL")
+
+from benchmarks.load_process import git_commit  # noqa: E402
+
+FRONTEND_DIR = os.path.join(os.path.dirname(__file__), "..", "..", "frontend")
+
+Case = Tuple[str, Callable[[], object], int]  # (name, call, items processed per call)
+
+
+def measure(func: Callable[[], object], repeats: int, min_time: float) -> Dict[str, float]:
+    """Runs func in calibrated batches and returns per-call timing statistics in microseconds."""
+    number = 1
+    while True:
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        if time.perf_counter() - start >= min_time or number >= 1 << 20:
+            break
+        number *= 2
+
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        samples = []
+        for _ in range(repeats):
+            start = time.perf_counter()
+            for _ in range(number):
+                func()
+            samples.append((time.perf_counter() - start) / number * 1e6)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+    quartiles = statistics.quantiles(samples, n=4) if len(samples) > 1 else [samples[0]] * 3
+    return {
+        "median_us": round(statistics.median(samples), 3),
+        "mean_us": round(statistics.fmean(samples), 3),
+        "min_us": round(min(samples), 3),
+        "stdev_us": round(statistics.stdev(samples), 3) if len(samples) > 1 else 0.0,
+        "iqr_us": round(quartiles[2] - quartiles[0], 3),
+        "loops": number,
+        "repeats": repeats,
+    }
+
+
+def _scaled(rows: list, count: int) -> list:
+    """Repeats fixture rows until there are count of them."""
+    return [rows[i % len(rows)] for i in range(count)] if rows else []
+
+
+def backend_cases(rows_per_section: int) -> List[Case]:
+    from app.models.schemas import ProcessedConversationResponse
+    from app.services import prep_pack_service as pps
+    from app.services.fake_bigquery import FakeBigQueryClient
+    from app.services.rng import request_rng
+
+    client = FakeBigQueryClient(latency="constant:0")
+    pps.set_bigquery_client(client)
+
+    def table(name: str) -> list:
+        return _scaled(list(client.query(f"SELECT * FROM `fixtures.{name}`").result()), rows_per_section)
+
+    rows = {name: table(name) for name in ("complaints", "inhibits", "journeys", "ics_results")}
+    complaints = pps.complaints_from_rows(rows["complaints"])
+    inhibits = pps.inhibits_from_rows(rows["inhibits"])
+    journeys = pps.journeys_from_rows(rows["journeys"])
+    ics_results = pps.ics_results_from_rows(rows["ics_results"])
+    pack = pps.assemble_prep_pack("CUST_000001", complaints, inhibits, journeys, ics_results, request_rng("bench"))
+    response = ProcessedConversationResponse(prep_pack_data=pack, session_token="bench")
+
+    # A customer present in every section table, so no section falls back to mock data
+    customer_id = "CUST_000481"
+
+    return [
+        ("map_rows.complaints", lambda: pps.complaints_from_rows(rows["complaints"]), rows_per_section),
+        ("map_rows.inhibits", lambda: pps.inhibits_from_rows(rows["inhibits"]), rows_per_section),
+        ("map_rows.journeys", lambda: pps.journeys_from_rows(rows["journeys"]), rows_per_section),
+        ("map_rows.ics_results", lambda: pps.ics_results_from_rows(rows["ics_results"]), rows_per_section),
+        ("prep_pack.assemble", lambda: pps.assemble_prep_pack(
+            "CUST_000001", complaints, inhibits, journeys, ics_results, request_rng("bench")), 1),
+        ("prep_pack.generate", lambda: pps.generate_prep_pack_data(customer_id), 1),
+        ("serialise.model_dump_json", response.model_dump_json, 1),
+        ("serialise.model_dump", lambda: response.model_dump(mode="json"), 1),
+        ("serialise.model_validate_json", lambda: ProcessedConversationResponse.model_validate_json(
+            response.model_dump_json()), 1),
+    ] + adapt_cases()
+
+
+def adapt_cases() -> List[Case]:
+    from app.services.fake_bigquery import FakeBigQueryClient
+
+    try:
+        from generate_mock_bigquery_data import TABLE_CONFIGS, MockDataGenerator
+    except ImportError as e:
+        print(f"Skipping adapt_data_to_schema cases: {e}", file=sys.stderr)
+        return []
+
+    client = FakeBigQueryClient(latency="constant:0")
+    sink = io.StringIO()
+    cases = []
+    for name in ("complaints", "digitally_active"):
+        data = [dict(row.items()) for row in client.query(f"SELECT * FROM `fixtures.{name}`").result()]
+        schema_info = {
+            field.name.lower(): {"name": field.name, "type": field.field_type, "mode": field.mode or "NULLABLE"}
+            for field in TABLE_CONFIGS[name]["schema"]
+        }
+
+        def adapt(data=data, schema_info=schema_info, name=name):
+            # adapt_data_to_schema does not touch the generator's BigQuery client,
+            # so it is called unbound; its progress prints are discarded
+            sink.seek(0)
+            sink.truncate()
+            with contextlib.redirect_stdout(sink):
+                return MockDataGenerator.adapt_data_to_schema(None, data, schema_info, name)
+
+        cases.append((f"adapt_data_to_schema.{name}", adapt, len(data)))
+    return cases
+
+
+def frontend_cases(rows_per_section: int) -> List[Case]:
+    try:
+        import streamlit  # noqa: F401
+    except ImportError as e:
+        print(f"Skipping frontend cases: {e}", file=sys.stderr)
+        return []
+
+    from app.models.schemas import ProcessedConversationResponse
+    from app.services import prep_pack_service as pps
+    from app.services.fake_bigquery import FakeBigQueryClient
+    from app.services.rng import request_rng
+
+    # Appended, not prepended: the frontend's app.py must not shadow the backend's app package
+    sys.path.append(os.path.abspath(FRONTEND_DIR))
+    import components
+
+    # Streamlit logs a warning per call in bare mode (missing script run context,
+    # deprecated arguments); drop them so the timings do not include log I/O
+    for name in ("streamlit.runtime.scriptrunner_utils.script_run_context", "streamlit.deprecation_util"):
+        logging.getLogger(name).addFilter(lambda record: False)
+
+    client = FakeBigQueryClient(latency="constant:0")
+
+    def table(name: str) -> list:
+        return _scaled(list(client.query(f"SELECT * FROM `fixtures.{name}`").result()), rows_per_section)
+
+    pack = pps.assemble_prep_pack(
+        "CUST_000001", pps.complaints_from_rows(table("complaints")), pps.inhibits_from_rows(table("inhibits")),
+        pps.journeys_from_rows(table("journeys")), pps.ics_results_from_rows(table("ics_results")),
+        request_rng("bench")
+    )
+    # The frontend sees the JSON payload, so render from its decoded form
+    response = ProcessedConversationResponse(prep_pack_data=pack, session_token="bench")
+    data = json.loads(response.model_dump_json())["prep_pack_data"]
+
+    return [
+        ("render.kpi_row", lambda: components.render_kpi_row(data["kpis"][:5], 5), 5),
+        ("render.inhibits", lambda: components.render_inhibits(data["inhibits"]), rows_per_section),
+        ("render.journeys", lambda: components.render_journeys(data["journeys"]), rows_per_section),
+        ("render.complaints", lambda: components.render_complaints(data["complaints"]), rows_per_section),
+        ("render.ics_results", lambda: components.render_ics_results(data["ics_results"]), rows_per_section),
+        ("render.chart", lambda: components.render_chart(data["monthly_revenue_distribution"], "bar"), 12),
+        ("render.transaction_summary",
+         lambda: components.render_transaction_summary(data["transaction_volume_summary"]), 4),
+    ]
+
+
+def compare(results: Dict, baseline: Dict, max_regression: float) -> Dict[str, Dict]:
+    """Median ratio per case against the baseline; a case regresses past 1 + max_regression."""
+    comparison = {}
+    for name, stats in results.items():
+        old = baseline.get("results", {}).get(name)
+        if not old or not old.get("median_us"):
+            continue
+        ratio = stats["median_us"] / old["median_us"]
+        comparison[name] = {
+            "baseline_median_us": old["median_us"],
+            "ratio": round(ratio, 3),
+            "regressed": ratio > 1 + max_regression,
+        }
+    return comparison
+
+
+def print_table(results: Dict, comparison: Dict) -> None:
+    print(f"{'case':40} {'median us':>12} {'iqr us':>10} {'per item us':>12} {'vs base':>8}", file=sys.stderr)
+    for name, stats in results.items():
+        ratio = comparison.get(name, {}).get("ratio")
+        flag = " !" if comparison.get(name, {}).get("regressed") else ""
+        print(f"{name:40} {stats['median_us']:12.2f} {stats['iqr_us']:10.2f} {stats['per_item_us']:12.3f} "
+              f"{(f'{ratio:.2f}x' if ratio else '-'):>8}{flag}", file=sys.stderr)
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Microbenchmarks for prep pack assembly and rendering")
+    parser.add_argument("--suite", choices=["backend", "frontend", "all"], default="all")
+    parser.add_argument("--filter", help="Only run cases whose name contains this text")
+    parser.add_argument("--rows", type=int, default=10, help="Rows per BigQuery section (the queries use LIMIT 10)")
+    parser.add_argument("--repeats", type=int, default=15, help="Timed repetitions per case")
+    parser.add_argument("--min-time", type=float, default=0.05, help="Minimum seconds per repetition")
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.15,
+                        help="Allowed fractional slowdown of a case's median before --compare fails")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    cases: List[Case] = []
+    if args.suite in ("backend", "all"):
+        cases += backend_cases(args.rows)
+    if args.suite in ("frontend", "all"):
+        cases += frontend_cases(args.rows)
+    if args.filter:
+        cases = [case for case in cases if args.filter in case[0]]
+
+    results = {}
+    for name, func, items in cases:
+        stats = measure(func, args.repeats, args.min_time)
+        stats["items"] = items
+        stats["per_item_us"] = round(stats["median_us"] / items, 3) if items else None
+        results[name] = stats
+
+    report = {
+        "benchmark": "microbench",
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {"suite": args.suite, "rows": args.rows, "repeats": args.repeats, "min_time_s": args.min_time,
+                   "python": sys.version.split()[0]},
+        "results": results,
+    }
+    exit_code = 0
+    comparison: Dict[str, Dict] = {}
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        comparison = compare(results, baseline, args.max_regression)
+        report["comparison"] = {"baseline_commit": baseline.get("commit"), "cases": comparison}
+        exit_code = 1 if any(c["regressed"] for c in comparison.values()) else 0
+
+    print_table(results, comparison)
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(output + "\n")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
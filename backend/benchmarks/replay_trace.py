@@ -0,0 +1,183 @@
+"""
+Replays recorded /api/v1/process traffic (TRACE_RECORD_FILE) against a backend
+
+Requests are issued on the recorded schedule, optionally sped up or slowed
+down, so bursts, reloads and hot customers hit the build under test the way
+they hit production. The report has the same shape as load_process (latency
+percentiles, throughput, error rate, Server-Timing stages) plus the recorded
+latencies for reference and the cache hit rates observed on /metrics.
+
+Usage (from the backend directory):
+    python -m benchmarks.replay_trace traces/requests-*.jsonl.gz
+    python -m benchmarks.replay_trace trace.jsonl --speed 4 --output replay.json
+    python -m benchmarks.replay_trace trace.jsonl --compare replay.json
+    python -m benchmarks.replay_trace trace.jsonl --url http://localhost:8000
+"""
+
+import argparse
+import asyncio
+import hashlib
+import re
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Optional
+
+from benchmarks.load_process import (
+    Recorder, add_target_arguments, git_commit, open_target, send_one, summarise, target_config, write_report,
+)
+
+from app.core.recording import read_trace
+
+_CACHE_SAMPLE = re.compile(r'^bcs_cache_(hits|misses)_total\{cache="([^"]+)"\} (\S+)$', re.MULTILINE)
+
+# The mock customer lookup maps conversation IDs onto CUST_000001..CUST_000500 by hash
+MOCK_CUSTOMER_RANGE = 500
+
+
+def load_requests(paths: List[str], path_filter: str) -> List[Dict]:
+    entries = [entry for path in paths for entry in read_trace(path) if entry.get("p") == path_filter]
+    entries.sort(key=lambda entry: entry["at"])
+    return entries
+
+
+def conversation_for_customer(conversation_token: str, customer_number: int) -> str:
+    """
+    Finds a replay conversation ID that the mock customer lookup maps to the
+    given customer number, so distinct recorded conversations of one customer
+    still land on one customer (and its caches) during replay.
+    """
+    suffix = 0
+    while True:
+        candidate = f"replay-{conversation_token}-{suffix}"
+        if int(hashlib.md5(candidate.encode()).hexdigest()[:8], 16) % MOCK_CUSTOMER_RANGE + 1 == customer_number:
+            return candidate
+        suffix += 1
+
+
+def plan_conversations(entries: List[Dict], preserve_customers: bool) -> List[str]:
+    """Maps every recorded request onto the conversation ID it is replayed with."""
+    by_conversation: Dict[str, str] = {}
+    customer_numbers: Dict[str, int] = {}
+    planned = []
+    for i, entry in enumerate(entries):
+        conversation, customer = entry.get("c"), entry.get("u")
+        if conversation is None:
+            planned.append(f"replay-anonymous-{i}")
+            continue
+        if conversation not in by_conversation:
+            if preserve_customers and customer is not None:
+                number = customer_numbers.setdefault(customer, len(customer_numbers) % MOCK_CUSTOMER_RANGE + 1)
+                by_conversation[conversation] = conversation_for_customer(conversation, number)
+            else:
+                by_conversation[conversation] = f"replay-{conversation}"
+        planned.append(by_conversation[conversation])
+    return planned
+
+
+async def cache_counters(client) -> Dict[str, Dict[str, float]]:
+    try:
+        response = await client.get("/metrics")
+    except Exception:
+        return {}
+    counters: Dict[str, Dict[str, float]] = {}
+    for kind, cache, value in _CACHE_SAMPLE.findall(response.text):
+        counters.setdefault(cache, {"hits": 0.0, "misses": 0.0})[kind] = float(value)
+    return counters
+
+
+def cache_hit_rates(before: Dict, after: Dict) -> Dict[str, Dict[str, Optional[float]]]:
+    rates = {}
+    for cache, totals in sorted(after.items()):
+        start = before.get(cache, {})
+        hits = totals["hits"] - start.get("hits", 0.0)
+        misses = totals["misses"] - start.get("misses", 0.0)
+        lookups = hits + misses
+        rates[cache] = {"hits": hits, "misses": misses,
+                        "hit_rate": round(hits / lookups, 4) if lookups else None}
+    return rates
+
+
+async def replay(client, entries: List[Dict], conversations: List[str], speed: float,
+                 recorder: Recorder) -> List[float]:
+    """Issues each request at its recorded offset divided by speed; returns how late each send was (ms)."""
+    lateness_ms: List[float] = []
+    first = entries[0]["at"]
+    start = time.perf_counter()
+    tasks = []
+    for entry, conversation_id in zip(entries, conversations):
+        due = start + (entry["at"] - first) / speed
+        delay = due - time.perf_counter()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        lateness_ms.append(max(0.0, time.perf_counter() - due) * 1000)
+        tasks.append(asyncio.create_task(send_one(client, conversation_id, recorder)))
+    await asyncio.gather(*tasks)
+    return lateness_ms
+
+
+async def run(args) -> Dict:
+    entries = load_requests(args.traces, args.path)
+    if args.limit:
+        entries = entries[:args.limit]
+    if not entries:
+        raise SystemExit("No recorded requests found in the trace files")
+    conversations = plan_conversations(entries, not args.no_preserve_customers)
+    recorder = Recorder()
+
+    async with open_target(args) as client:
+        before = await cache_counters(client)
+        start = time.perf_counter()
+        lateness_ms = await replay(client, entries, conversations, args.speed, recorder)
+        elapsed = time.perf_counter() - start
+        after = await cache_counters(client)
+
+    total = len(recorder.latencies_ms)
+    return {
+        "benchmark": "replay_trace",
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {
+            **target_config(args),
+            "traces": sorted(args.traces),
+            "speed": args.speed,
+            "recorded_requests": len(entries),
+            "recorded_span_s": round(entries[-1]["at"] - entries[0]["at"], 3),
+            "preserve_customers": not args.no_preserve_customers,
+        },
+        "requests": total,
+        "errors": recorder.errors,
+        "error_rate": round(recorder.errors / total, 4) if total else None,
+        "throughput_rps": round(total / elapsed, 2) if elapsed else None,
+        "elapsed_s": round(elapsed, 3),
+        "status_counts": recorder.status_counts,
+        "latency_ms": summarise(recorder.latencies_ms),
+        "recorded_latency_ms": summarise([entry["d"] for entry in entries]),
+        # If this grows, the replayer could not keep to the schedule and the load was lighter than recorded
+        "send_lateness_ms": summarise(lateness_ms),
+        "distinct_conversations": len({entry.get("c") for entry in entries}),
+        "distinct_customers": len({entry.get("u") for entry in entries if entry.get("u")}),
+        "cache": cache_hit_rates(before, after),
+        "stages_ms": {name: summarise(values) for name, values in sorted(recorder.stages.items())},
+    }
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Replay recorded /api/v1/process traffic")
+    parser.add_argument("traces", nargs="+", help="Trace files written by TRACE_RECORD_FILE (merged by time)")
+    parser.add_argument("--speed", type=float, default=1.0, help="Time scale: 2 replays twice as fast")
+    parser.add_argument("--limit", type=int, help="Replay only the first N requests")
+    parser.add_argument("--path", default="/api/v1/process", help="Recorded path to replay")
+    parser.add_argument("--no-preserve-customers", action="store_true",
+                        help="Replay conversations as-is instead of steering them onto shared customers")
+    add_target_arguments(parser)
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    return write_report(asyncio.run(run(args)), args)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -123,6 +123,16 @@ TABLE_CONFIGS = {
             bigquery.SchemaField("notes", "STRING", mode="NULLABLE"),
         ],
         "generate_count": 15
+    },
+
+    "customer_identifiers": {
+        "schema": [
+            bigquery.SchemaField("customer_id", "STRING", mode="REQUIRED"),
+            bigquery.SchemaField("ani", "STRING", mode="NULLABLE"),
+            bigquery.SchemaField("pcin", "STRING", mode="NULLABLE"),
+            bigquery.SchemaField("bcin", "STRING", mode="NULLABLE"),
+        ],
+        "generate_count": 500
     }
 }
 
@@ -292,6 +302,19 @@ class MockDataGenerator:
             })
         return data
     
+    def generate_customer_identifiers_data(self, count: int) -> List[Dict[str, Any]]:
+        """Generate the identifier reference table (one row per mock customer)"""
+        data = []
+        for customer_id in self.customer_ids[:count]:
+            customer_num = int(customer_id.split("_")[1])
+            data.append({
+                "customer_id": customer_id,
+                "ani": f"020 {customer_num:08d}",
+                "pcin": f"pcin_{customer_num:06d}",
+                "bcin": f"bcin_{customer_num:06d}"
+            })
+        return data
+    
     def get_existing_tables(self):
         """Get list of existing table names in the dataset"""
         try:
@@ -503,7 +526,8 @@ class MockDataGenerator:
             "ics_results": self.generate_ics_results_data,
             "current_account_tariffs": self.generate_tariffs_data,
             "digitally_active": self.generate_digitally_active_data,
-            "vulnerability": self.generate_vulnerability_data
+            "vulnerability": self.generate_vulnerability_data,
+            "customer_identifiers": self.generate_customer_identifiers_data
         }
         
         # First, check which tables actually exist
@@ -0,0 +1,68 @@
+"""
+Local stand-in for the Genesys Cloud conversations API
+
+Serves GET /api/v2/conversations/{conversation_id} with a deterministic customer
+participant so the async Genesys client can be exercised without a Genesys org.
+Latency and transient failures can be injected to check retries and caching.
+
+Usage:
+    uvicorn mock_genesys_server:app --port 9000
+    GENESYS_USE_REAL_API=true GENESYS_API_URL=http://localhost:9000 uvicorn main:app
+
+Environment:
+    MOCK_GENESYS_LATENCY_MS   - added delay per request (default 0)
+    MOCK_GENESYS_FAILURE_RATE - fraction of requests answered with 503 (default 0)
+"""
+
+import asyncio
+import hashlib
+import os
+import random
+
+from fastapi import FastAPI, Header, HTTPException
+
+LATENCY_MS = float(os.getenv("MOCK_GENESYS_LATENCY_MS", "0"))
+FAILURE_RATE = float(os.getenv("MOCK_GENESYS_FAILURE_RATE", "0"))
+
+app = FastAPI(title="Mock Genesys Cloud API")
+
+# Number of requests served per conversation, handy for checking cache behaviour
+request_counts = {}
+
+
+@app.get("/api/v2/conversations/{conversation_id}")
+async def get_conversation(conversation_id: str, authorization: str = Header(None)):
+    if not authorization or not authorization.startswith("Bearer "):
+        raise HTTPException(status_code=401, detail="Missing bearer token")
+
+    request_counts[conversation_id] = request_counts.get(conversation_id, 0) + 1
+
+    if LATENCY_MS:
+        await asyncio.sleep(LATENCY_MS / 1000)
+    if FAILURE_RATE and random.random() < FAILURE_RATE:
+        raise HTTPException(status_code=503, detail="Injected failure", headers={"Retry-After": "0"})
+
+    customer_num = int(hashlib.md5(conversation_id.encode()).hexdigest()[:8], 16) % 500 + 1
+    return {
+        "id": conversation_id,
+        "participants": [
+            {"id": "agent-0001", "purpose": "agent", "name": "Mock Agent"},
+            {
+                "id": f"CUST_{customer_num:06d}",
+                "purpose": "customer",
+                "name": f"Customer {customer_num}",
+                "ani": f"tel:+4420{customer_num:08d}",
+                "calls": [{"state": "connected"}],
+                "attributes": {
+                    "PCIN": f"pcin_{customer_num:06d}",
+                    "BCIN": f"bcin_{customer_num:06d}",
+                },
+            },
+        ],
+    }
+
+
+@app.get("/stats")
+def stats():
+    """Requests served per conversation."""
+    return request_counts
@@ -0,0 +1,44 @@
+import os
+
+# Settings are read at import time, so they are fixed here, before any test
+# imports app: the fake BigQuery client with no injected latency, and every
+# shared tier, queue and limiter off unless a test builds its own.
+os.environ.update({
+    "BQ_BACKEND": "fake",
+    "FAKE_BQ_LATENCY": "constant:0",
+    "LOG_LEVEL": "WARNING",
+    "SHARED_CACHE_BACKEND": "none",
+    "RATE_LIMIT_BACKEND": "none",
+    "INVALIDATION_QUEUE": "none",
+    "LOOP_MONITOR_ENABLED": "false",
+})
+os.environ.pop("QUERY_CACHE_PATH", None)
+
+import pytest  # noqa: E402
+
+from app.services import prep_pack_service  # noqa: E402
+from app.services.fake_bigquery import DEFAULT_DATA_DIR, FakeBigQueryClient  # noqa: E402
+
+
+@pytest.fixture
+def fake_bigquery():
+    """A FakeBigQueryClient over bq_mock_data, installed as the shared client with empty section caches."""
+    client = FakeBigQueryClient(DEFAULT_DATA_DIR, latency="constant:0", seed=1)
+    previous = prep_pack_service._bigquery_client
+    prep_pack_service.set_bigquery_client(client)
+    prep_pack_service._section_cache.clear()
+    prep_pack_service._invalidated_at.clear()
+    yield client
+    prep_pack_service.set_bigquery_client(previous)
+    prep_pack_service._section_cache.clear()
+    prep_pack_service._invalidated_at.clear()
+    client.close()
+
+
+@pytest.fixture
+def client(fake_bigquery):
+    """A TestClient for the app. The lifespan (warm-up, consumers, refresh loops) is not run."""
+    from fastapi.testclient import TestClient
+
+    from app.main import app
+    return TestClient(app)
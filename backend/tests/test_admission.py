@@ -0,0 +1,106 @@
+import asyncio
+
+import pytest
+
+from app.controllers import conversation_controller
+from app.core import admission
+from app.core.admission import AdmissionLimiter, Overloaded
+
+PROCESS = {"conversationId": "conv-1", "authorizationCode": "code", "codeVerifier": "verifier"}
+
+
+def test_slots_are_granted_up_to_the_limit():
+    async def run():
+        limiter = AdmissionLimiter(max_concurrency=2, max_queue=0, queue_timeout=1)
+        await limiter.acquire()
+        await limiter.acquire()
+        with pytest.raises(Overloaded) as info:
+            await limiter.acquire()
+        assert info.value.reason == "queue_full"
+        limiter.release()
+        await limiter.acquire()
+        assert limiter.active == 2
+
+    asyncio.run(run())
+
+
+def test_released_slots_are_handed_to_waiters_in_order():
+    async def run():
+        limiter = AdmissionLimiter(max_concurrency=1, max_queue=3, queue_timeout=1)
+        await limiter.acquire()
+        order = []
+
+        async def hold(name):
+            await limiter.acquire()
+            order.append(name)
+            await asyncio.sleep(0)
+            limiter.release()
+
+        tasks = [asyncio.create_task(hold("first")), asyncio.create_task(hold("second"))]
+        await asyncio.sleep(0)
+        assert limiter.queued == 2
+
+        limiter.release()
+        # The slot passes straight to the first waiter, so a newcomer queues behind both
+        assert (limiter.active, limiter.queued) == (1, 1)
+        tasks.append(asyncio.create_task(hold("newcomer")))
+        await asyncio.gather(*tasks)
+        assert order == ["first", "second", "newcomer"]
+        assert (limiter.active, limiter.queued) == (0, 0)
+
+    asyncio.run(run())
+
+
+def test_waiters_time_out():
+    async def run():
+        limiter = AdmissionLimiter(max_concurrency=1, max_queue=1, queue_timeout=0.01, retry_after=5)
+        await limiter.acquire()
+        with pytest.raises(Overloaded) as info:
+            await limiter.acquire()
+        assert (info.value.reason, info.value.retry_after) == ("queue_timeout", 5)
+        assert limiter.queued == 0
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(run())
+
+
+def test_cancelled_waiters_leave_the_queue():
+    async def run():
+        limiter = AdmissionLimiter(max_concurrency=1, max_queue=1, queue_timeout=1)
+        await limiter.acquire()
+        waiter = asyncio.create_task(limiter.acquire())
+        await asyncio.sleep(0)
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert limiter.queued == 0
+        limiter.release()
+        assert limiter.active == 0
+
+    asyncio.run(run())
+
+
+@pytest.fixture
+def full_limiter(monkeypatch):
+    """A limiter whose one slot is taken and which queues nothing, so every build is turned away."""
+    limiter = AdmissionLimiter(max_concurrency=1, max_queue=0, queue_timeout=1, retry_after=7)
+    limiter.active = 1
+    monkeypatch.setattr(admission, "_limiter", limiter)
+    return limiter
+
+
+def test_process_is_rejected_with_retry_after(client, full_limiter, monkeypatch):
+    monkeypatch.setattr(conversation_controller, "ADMISSION_OVERLOAD_MODE", "reject")
+    response = client.post("/api/v1/process", json=PROCESS)
+    assert response.status_code == 503
+    assert response.headers["Retry-After"] == "7"
+    assert response.json()["reason"] == "queue_full"
+
+
+def test_process_falls_back_to_a_degraded_pack(client, full_limiter, monkeypatch):
+    monkeypatch.setattr(conversation_controller, "ADMISSION_OVERLOAD_MODE", "fallback")
+    response = client.post("/api/v1/process", json=PROCESS)
+    assert response.status_code == 200
+    assert response.json()["degraded"] is True
+    assert response.headers["Server-Timing"].count("overload_fallback") == 1
@@ -0,0 +1,183 @@
+import asyncio
+import time
+
+import httpx
+import pytest
+
+from app.core.cache import TTLCache
+from app.services.genesys_client import GenesysAPIError, GenesysClient, parse_customer_data
+
+CONVERSATION = {
+    "id": "conv-1",
+    "participants": [
+        {"purpose": "agent", "id": "agent-1"},
+        {"purpose": "customer", "id": "cust-1", "name": "Acme Ltd", "ani": "tel:+447700900123",
+         "attributes": {"PCIN": "pcin_000001"}, "calls": [{"state": "connected"}]},
+    ],
+}
+
+
+def test_ttl_cache_expires_entries():
+    cache = TTLCache(ttl_seconds=60, name="test_expiry")
+    cache.set("short", 1, ttl_seconds=0.01)
+    cache.set("long", 2)
+    time.sleep(0.02)
+    assert cache.get("short") is None
+    assert cache.get("long") == 2
+    assert (cache.hits, cache.misses) == (1, 1)
+    assert len(cache) == 1
+
+
+def test_ttl_cache_evicts_least_recently_used():
+    cache = TTLCache(ttl_seconds=60, max_size=2, name="test_lru")
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.get("a")
+    cache.set("c", 3)
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+
+
+def test_ttl_cache_delete_and_clear():
+    cache = TTLCache(ttl_seconds=60, name="test_delete")
+    cache.set("a", 1)
+    cache.set("b", 2)
+    cache.delete("a")
+    cache.delete("missing")
+    assert cache.get("a", "default") == "default"
+    cache.clear()
+    assert len(cache) == 0
+
+
+class MockGenesys:
+    """A local Genesys conversations endpoint: fails the first `failures` calls with `status`."""
+
+    def __init__(self, failures: int = 0, status: int = 503, delay: float = 0.0):
+        self.failures = failures
+        self.status = status
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls += 1
+        if request.headers["Authorization"] != "Bearer token":
+            return httpx.Response(401)
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        if self.calls <= self.failures:
+            return httpx.Response(self.status)
+        return httpx.Response(200, json=CONVERSATION)
+
+
+def client_for(server: MockGenesys, **kwargs) -> GenesysClient:
+    return GenesysClient("https://genesys.test", backoff_base=0.0, transport=httpx.MockTransport(server), **kwargs)
+
+
+def test_parse_customer_data():
+    customer = parse_customer_data(CONVERSATION)
+    assert customer.customer_id == "cust-1"
+    assert customer.pcin == "pcin_000001"
+    assert customer.channel == "voice"
+    assert customer.ani == "tel:+447700900123"
+    with pytest.raises(GenesysAPIError):
+        parse_customer_data({"participants": [{"purpose": "agent"}]})
+
+
+def test_conversation_lookups_are_cached():
+    server = MockGenesys()
+
+    async def run():
+        client = client_for(server)
+        try:
+            first = await client.get_customer_data("conv-1", "token")
+            second = await client.get_customer_data("conv-1", "token")
+        finally:
+            await client.aclose()
+        return first, second
+
+    first, second = asyncio.run(run())
+    assert first == second
+    assert server.calls == 1
+
+
+def test_concurrent_lookups_share_one_request():
+    server = MockGenesys(delay=0.05)
+
+    async def run():
+        client = client_for(server)
+        try:
+            return await asyncio.gather(*(client.get_customer_data("conv-1", "token") for _ in range(5)))
+        finally:
+            await client.aclose()
+
+    results = asyncio.run(run())
+    assert len({r.customer_id for r in results}) == 1
+    assert server.calls == 1
+
+
+def test_transient_failures_are_retried():
+    server = MockGenesys(failures=2, status=503)
+
+    async def run():
+        client = client_for(server, max_retries=3)
+        try:
+            return await client.get_customer_data("conv-1", "token")
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()).customer_id == "cust-1"
+    assert server.calls == 3
+
+
+def test_client_errors_are_not_retried():
+    server = MockGenesys(failures=1, status=404)
+
+    async def run():
+        client = client_for(server, max_retries=3)
+        try:
+            await client.get_customer_data("conv-1", "token")
+        finally:
+            await client.aclose()
+
+    with pytest.raises(GenesysAPIError) as info:
+        asyncio.run(run())
+    assert info.value.status_code == 404
+    assert server.calls == 1
+
+
+def test_cached_lookups_are_bound_to_the_token():
+    server = MockGenesys()
+
+    async def run():
+        client = client_for(server)
+        try:
+            await client.get_customer_data("conv-1", "token")
+            await client.get_customer_data("conv-1", "stolen")
+        finally:
+            await client.aclose()
+
+    # Another token gets its own Genesys call (and its own answer), not the cached customer
+    with pytest.raises(GenesysAPIError) as info:
+        asyncio.run(run())
+    assert info.value.status_code == 401
+    assert server.calls == 2
+
+
+def test_cancelled_caller_does_not_cancel_the_shared_lookup():
+    server = MockGenesys(delay=0.05)
+
+    async def run():
+        client = client_for(server)
+        try:
+            first = asyncio.create_task(client.get_customer_data("conv-1", "token"))
+            await asyncio.sleep(0.01)
+            second = asyncio.create_task(client.get_customer_data("conv-1", "token"))
+            await asyncio.sleep(0.01)
+            first.cancel()
+            return await second
+        finally:
+            await client.aclose()
+
+    assert asyncio.run(run()).customer_id == "cust-1"
+    assert server.calls == 1
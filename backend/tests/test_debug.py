@@ -0,0 +1,35 @@
+import pytest
+
+from app.core import profiling
+
+TOKEN = "profile-secret"
+
+
+@pytest.fixture
+def token(monkeypatch, tmp_path):
+    monkeypatch.setattr(profiling, "PROFILING_TOKEN", TOKEN)
+    monkeypatch.setattr(profiling, "PROFILE_DIR", str(tmp_path))
+    return TOKEN
+
+
+def test_debug_endpoints_do_not_exist_without_a_token(client):
+    assert client.get("/debug/tracemalloc/snapshot", headers={"X-Profile-Token": "x"}).status_code == 404
+
+
+def test_token_is_only_accepted_in_the_header(client, token):
+    assert client.post(f"/debug/tracemalloc/start?token={token}").status_code == 403
+    assert client.post("/debug/tracemalloc/start", headers={"X-Profile-Token": "wrong"}).status_code == 403
+    headers = {"X-Profile-Token": token}
+    try:
+        assert client.post("/debug/tracemalloc/start", headers=headers).json() == {"tracing": True}
+        assert client.get("/debug/tracemalloc/snapshot?limit=5", headers=headers).status_code == 200
+    finally:
+        assert client.post("/debug/tracemalloc/stop", headers=headers).json() == {"tracing": False}
+
+
+def test_profiled_request_can_be_fetched(client, token):
+    response = client.get("/health/live", headers={"X-Profile-Token": token})
+    profile_id = response.headers["X-Profile-Id"]
+    assert client.get(f"/debug/profiles/{profile_id}").status_code == 403
+    assert client.get(f"/debug/profiles/{profile_id}", headers={"X-Profile-Token": token}).status_code == 200
+    assert client.get("/debug/profiles/missing", headers={"X-Profile-Token": token}).status_code == 404
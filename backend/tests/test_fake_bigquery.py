@@ -0,0 +1,67 @@
+import random
+from datetime import date
+
+import pytest
+
+from app.services.fake_bigquery import (BadRequest, FakeBigQueryClient, JobTimeoutError, ServiceUnavailable,
+                                        fake_job_config, parse_latency)
+
+QUERY = """
+    SELECT complaint_date, description, status
+    FROM `project.dataset.complaints`
+    WHERE customer_id = @customer_id
+    ORDER BY complaint_date DESC
+"""
+
+
+@pytest.fixture
+def data_dir(tmp_path):
+    (tmp_path / "complaints").write_text(
+        "complaint_id,complaint_date,customer_id,description,status,amount\n"
+        "C1,2024-04-12,CUST_1,Fees,Closed,10\n"
+        "C2,2025-01-02,CUST_1,Outage,Open,\n"
+        "C3,2024-06-30,CUST_2,Other,Closed,5\n"
+    )
+    return tmp_path
+
+
+def test_query_binds_parameters_and_returns_dates(data_dir):
+    client = FakeBigQueryClient(str(data_dir), latency="constant:0")
+    rows = list(client.query(QUERY, job_config=fake_job_config(customer_id="CUST_1")).result())
+    assert [row.description for row in rows] == ["Outage", "Fees"]
+    assert rows[0].complaint_date == date(2025, 1, 2)
+    assert dict(rows[1].items())["status"] == "Closed"
+    assert client.queries_by_table == {"complaints": 1}
+
+
+def test_numeric_columns_are_typed(data_dir):
+    client = FakeBigQueryClient(str(data_dir), latency="constant:0")
+    rows = client.query("SELECT amount FROM `d.complaints` ORDER BY complaint_id").result()
+    assert [row.amount for row in rows] == [10, None, 5]
+
+
+def test_injected_failures_raise_api_errors(data_dir):
+    client = FakeBigQueryClient(str(data_dir), latency="constant:0", error_rate=1.0)
+    with pytest.raises(ServiceUnavailable):
+        client.query(QUERY, job_config=fake_job_config(customer_id="CUST_1")).result()
+
+    client = FakeBigQueryClient(str(data_dir), latency="constant:0")
+    with pytest.raises(BadRequest):
+        client.query("SELECT nope FROM `d.complaints`").result()
+
+
+def test_slow_jobs_honour_the_result_timeout(data_dir):
+    client = FakeBigQueryClient(str(data_dir), latency="constant:0", slow_job_rate=1.0, slow_job_ms=10000)
+    job = client.query(QUERY, job_config=fake_job_config(customer_id="CUST_1"))
+    assert not job.done()
+    with pytest.raises(JobTimeoutError):
+        job.result(timeout=0.01)
+
+
+def test_parse_latency():
+    rng = random.Random(1)
+    assert parse_latency("constant:50")(rng) == 0.05
+    assert 0.01 <= parse_latency("uniform:10,20")(rng) <= 0.02
+    assert parse_latency("lognormal:50,0.5")(rng) > 0
+    with pytest.raises(ValueError):
+        parse_latency("gamma:1")
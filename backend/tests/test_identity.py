@@ -0,0 +1,50 @@
+from app.services.identity_service import CustomerIdentityResolver, IdentityIndex, normalise_phone
+
+RECORDS = [
+    {"customer_id": "CUST_1", "ani": "020 0000 0001", "pcin": "pcin_1", "bcin": "bcin_1"},
+    {"customer_id": "CUST_2", "ani": "+44 20 0000 0002", "pcin": "pcin_2", "bcin": None},
+    {"customer_id": "", "ani": "020 0000 0003", "pcin": "pcin_3", "bcin": "bcin_3"},
+]
+
+
+def test_normalise_phone_formats():
+    assert normalise_phone("07700 900123") == "+447700900123"
+    assert normalise_phone("tel:+44 7700 900123") == "+447700900123"
+    assert normalise_phone("0044 7700 900123") == "+447700900123"
+    assert normalise_phone("") is None
+    assert normalise_phone("+1234567890123456") is None
+
+
+def test_index_skips_rows_without_a_customer():
+    index = IdentityIndex.build(RECORDS)
+    assert index.customer_ids == ["CUST_1", "CUST_2"]
+    assert len(index) == 5
+
+
+def test_resolve_prefers_the_strongest_identifier():
+    resolver = CustomerIdentityResolver(IdentityIndex.build(RECORDS))
+    assert resolver.resolve(ani="tel:+442000000001") == "CUST_1"
+    assert resolver.resolve(pcin=" PCIN_2 ") == "CUST_2"
+    assert resolver.resolve(ani="02000000002", bcin="bcin_1") == "CUST_1"
+    # An unknown BCIN falls through to the weaker identifiers
+    assert resolver.resolve(bcin="bcin_9", pcin="pcin_2") == "CUST_2"
+    assert resolver.resolve(ani="02000000003") is None
+
+
+def test_refresh_swaps_in_a_new_index():
+    resolver = CustomerIdentityResolver(IdentityIndex.build(RECORDS))
+    old = resolver.index
+    resolver.refresh([{"customer_id": "CUST_9", "ani": None, "pcin": "pcin_1", "bcin": None}])
+    assert resolver.index is not old
+    assert resolver.resolve(pcin="pcin_1") == "CUST_9"
+    assert resolver.resolve(bcin="bcin_1") is None
+    # The replaced snapshot is untouched, so a lookup already holding it still completes
+    assert old.customer_ids == ["CUST_1", "CUST_2"]
+
+
+def test_refresh_from_file(tmp_path):
+    path = tmp_path / "customer_identifiers.csv"
+    path.write_text("customer_id,ani,pcin,bcin\nCUST_7,020 00000007,pcin_7,bcin_7\n")
+    resolver = CustomerIdentityResolver()
+    resolver.refresh_from_file(str(path))
+    assert resolver.resolve(ani="+442000000007") == "CUST_7"
@@ -0,0 +1,152 @@
+import asyncio
+import time
+
+from app.controllers.invalidation_controller import InvalidationController
+from app.core.shared_cache import InMemoryRedis, RedisBroadcastLog, SQLiteBroadcastLog
+from app.models.schemas import ChangeEvent
+from app.services import invalidation_service
+from app.services.invalidation_service import (
+    BroadcastChangeSource, ChangeConsumer, InMemoryChangeQueue, evict_changed_sections, sign_payload,
+    verify_signature,
+)
+from app.services.prep_pack_service import generate_prep_pack_data
+from app.services.push_service import get_update_hub
+
+SECRET = "webhook-secret"
+BODY = b'{"events": [{"table": "complaints", "customer_id": "CUST_000481"}]}'
+CUSTOMER = "CUST_000481"
+
+
+def test_signature_round_trip():
+    now = time.time()
+    timestamp = str(int(now))
+    signature = sign_payload(SECRET, timestamp, BODY)
+    assert signature.startswith("sha256=")
+    assert verify_signature(BODY, timestamp, signature, secret=SECRET, now=now)
+
+
+def test_signature_rejections():
+    now = time.time()
+    timestamp = str(int(now))
+    signature = sign_payload(SECRET, timestamp, BODY)
+    assert not verify_signature(BODY + b" ", timestamp, signature, secret=SECRET, now=now)
+    assert not verify_signature(BODY, timestamp, sign_payload("other", timestamp, BODY), secret=SECRET, now=now)
+    assert not verify_signature(BODY, timestamp, None, secret=SECRET, now=now)
+    assert not verify_signature(BODY, "yesterday", signature, secret=SECRET, now=now)
+    # Replays outside the tolerance window fail even with a valid signature
+    assert not verify_signature(BODY, timestamp, signature, secret=SECRET, now=now + 301)
+
+
+def test_evict_changed_sections_ignores_unknown_tables(fake_bigquery):
+    events = [ChangeEvent(table="complaints", customer_id=CUSTOMER),
+              ChangeEvent(table="current_account_tariffs", customer_id=CUSTOMER),
+              ChangeEvent(table="complaints", customer_id=CUSTOMER)]
+    customers, evicted, ignored = evict_changed_sections(events, "webhook")
+    assert customers == {CUSTOMER}
+    assert (evicted, ignored) == (1, 1)
+
+
+def test_queued_changes_refresh_watched_packs(fake_bigquery):
+    generate_prep_pack_data(CUSTOMER)
+
+    async def run():
+        queue = InMemoryChangeQueue()
+        consumer = ChangeConsumer(queue, InvalidationController.apply_changes)
+        hub = get_update_hub()
+        subscription = hub.subscribe(CUSTOMER, "conv-1", {})
+        consumer.start()
+        try:
+            queue.put("complaints", CUSTOMER)
+            queue.put("complaints", "CUST_UNWATCHED")
+            for _ in range(100):
+                if queue.acked:
+                    break
+                await asyncio.sleep(0.01)
+            # The batch is acked once evicted; the watched pack is rebuilt after that
+            return queue.acked, await asyncio.wait_for(subscription.next_update(), 1)
+        finally:
+            hub.unsubscribe(subscription)
+            await consumer.stop()
+
+    acked, delta = asyncio.run(run())
+    assert acked == 2
+    assert "complaints" in delta["changed"]
+    # Only the evicted section was queried again
+    assert fake_bigquery.queries_by_table["complaints"] == 2
+    assert fake_bigquery.queries_by_table["inhibits"] == 1
+
+
+def test_failed_batches_are_not_acked():
+    async def run():
+        queue = InMemoryChangeQueue()
+        calls = []
+
+        async def handler(events, source):
+            calls.append(source)
+            raise RuntimeError("store unavailable")
+
+        consumer = ChangeConsumer(queue, handler)
+        consumer.start()
+        queue.put("complaints", CUSTOMER)
+        await asyncio.sleep(0.05)
+        await consumer.stop()
+        return calls, queue.acked
+
+    calls, acked = asyncio.run(run())
+    assert calls == ["memory"]
+    assert acked == 0
+
+
+def _broadcast_round_trip(log):
+    async def run():
+        mine = BroadcastChangeSource(log, origin="instance-a", poll_interval=0.01)
+        theirs = BroadcastChangeSource(log, origin="instance-b", poll_interval=0.01)
+        # Sources start from the end of the log, so this one is never received
+        log.publish({"origin": "instance-b", "changes": [["complaints", "CUST_OLD"]]})
+        received = asyncio.create_task(mine.receive())
+        own = asyncio.create_task(theirs.receive())
+        await asyncio.sleep(0.05)
+        log.publish({"origin": "instance-a", "changes": [["inhibits", CUSTOMER]]})
+        log.publish({"origin": "instance-b", "changes": [["complaints", CUSTOMER]]})
+        return await asyncio.wait_for(received, 1), await asyncio.wait_for(own, 1)
+
+    received, own = asyncio.run(run())
+    # Each instance skips the messages it published itself
+    assert [(e.table, e.customer_id) for e in received] == [("complaints", CUSTOMER)]
+    assert [(e.table, e.customer_id) for e in own] == [("inhibits", CUSTOMER)]
+
+
+def test_sqlite_broadcast(tmp_path):
+    _broadcast_round_trip(SQLiteBroadcastLog(str(tmp_path / "shared.sqlite3"), "invalidations"))
+
+
+def test_redis_broadcast():
+    _broadcast_round_trip(RedisBroadcastLog(InMemoryRedis(), "invalidations"))
+
+
+def _signed(body: bytes, secret: str = SECRET):
+    timestamp = str(int(time.time()))
+    return {"X-Signature-Timestamp": timestamp, "X-Signature": sign_payload(secret, timestamp, body),
+            "Content-Type": "application/json"}
+
+
+def test_webhook_evicts_and_answers_without_waiting_for_rebuilds(client, fake_bigquery, monkeypatch):
+    monkeypatch.setattr(invalidation_service, "INVALIDATION_WEBHOOK_SECRET", SECRET)
+    generate_prep_pack_data(CUSTOMER)
+    response = client.post("/api/v1/invalidations", content=BODY, headers=_signed(BODY))
+    assert response.status_code == 200
+    assert response.json() == {"evicted": 1, "ignored": 0, "refreshing": 0}
+    generate_prep_pack_data(CUSTOMER)
+    assert fake_bigquery.queries_by_table["complaints"] == 2
+
+
+def test_webhook_rejects_bad_signatures(client, monkeypatch):
+    monkeypatch.setattr(invalidation_service, "INVALIDATION_WEBHOOK_SECRET", SECRET)
+    assert client.post("/api/v1/invalidations", content=BODY).status_code == 401
+    headers = _signed(BODY, secret="other")
+    assert client.post("/api/v1/invalidations", content=BODY, headers=headers).status_code == 401
+
+
+def test_webhook_does_not_exist_without_a_secret(client, monkeypatch):
+    monkeypatch.setattr(invalidation_service, "INVALIDATION_WEBHOOK_SECRET", None)
+    assert client.post("/api/v1/invalidations", content=BODY, headers=_signed(BODY)).status_code == 404
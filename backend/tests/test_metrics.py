@@ -0,0 +1,85 @@
+import threading
+
+import pytest
+
+from app.core.cache import TTLCache
+from app.core.metrics import REGISTRY, Counter, Gauge, Histogram, render_latest
+
+
+@pytest.fixture
+def registered():
+    """Collects metrics made by a test and takes them out of the registry afterwards."""
+    metrics = []
+    yield metrics.append
+    for metric in metrics:
+        REGISTRY.remove(metric)
+
+
+def lines_for(name: str):
+    return [line for line in render_latest().splitlines() if line.startswith(name)]
+
+
+def test_counter_sums_across_threads(registered):
+    counter = Counter("test_events_total", "Events.", ["kind"])
+    registered(counter)
+    child = counter.labels("a")
+    threads = [threading.Thread(target=lambda: [child.inc() for _ in range(1000)]) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    counter.labels('quote"d').inc(2)
+
+    output = render_latest()
+    assert "# TYPE test_events_total counter" in output
+    assert 'test_events_total{kind="a"} 4000.0' in output
+    assert 'test_events_total{kind="quote\\"d"} 2.0' in output
+
+
+def test_gauge_inc_dec_and_function(registered):
+    moved = Gauge("test_moved", "Moved.")
+    computed = Gauge("test_computed", "Computed.")
+    registered(moved)
+    registered(computed)
+    moved.inc(3)
+    moved.dec()
+    computed.set_function(lambda: 7)
+    assert lines_for("test_moved ") == ["test_moved 2.0"]
+    assert lines_for("test_computed ") == ["test_computed 7.0"]
+
+
+def test_histogram_buckets_are_cumulative(registered):
+    histogram = Histogram("test_latency_seconds", "Latency.", buckets=(0.1, 1.0))
+    registered(histogram)
+    for value in (0.05, 0.5, 0.5, 5.0):
+        histogram.observe(value)
+    assert lines_for("test_latency_seconds") == [
+        'test_latency_seconds_bucket{le="0.1"} 1.0',
+        'test_latency_seconds_bucket{le="1.0"} 3.0',
+        'test_latency_seconds_bucket{le="+Inf"} 4.0',
+        "test_latency_seconds_sum 6.05",
+        "test_latency_seconds_count 4.0",
+    ]
+
+
+def test_caches_are_exported():
+    cache = TTLCache(ttl_seconds=60, name="test_exported")
+    cache.set("a", 1)
+    cache.get("a")
+    cache.get("b")
+    output = render_latest()
+    assert 'bcs_cache_hits_total{cache="test_exported"} 1.0' in output
+    assert 'bcs_cache_misses_total{cache="test_exported"} 1.0' in output
+    assert 'bcs_cache_entries{cache="test_exported"} 1.0' in output
+    assert 'bcs_cache_hit_ratio{cache="test_exported"} 0.5' in output
+
+
+def test_metrics_endpoint_labels_routes_by_template(client):
+    client.get("/health/live")
+    client.get("/no-such-route")
+    response = client.get("/metrics")
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/plain; version=0.0.4")
+    assert 'bcs_http_requests_total{route="/health/live",status="2xx"}' in response.text
+    assert 'bcs_http_requests_total{route="unmatched",status="4xx"}' in response.text
+    assert 'bcs_http_request_duration_seconds_count{route="/health/live"}' in response.text
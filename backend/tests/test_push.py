@@ -0,0 +1,102 @@
+import asyncio
+
+import pytest
+from starlette.websockets import WebSocketDisconnect
+
+from app.core.metrics import PUSH_SECTIONS_COALESCED
+from app.services import push_service
+from app.services.prep_pack_service import generate_prep_pack_data, section_versions
+from app.services.push_service import HubFull, Subscription, UpdateHub, get_update_hub
+from app.services.session_service import verify_session
+
+CUSTOMER = "CUST_000481"
+
+
+def test_unchanged_sections_are_not_queued():
+    subscription = Subscription(CUSTOMER, "conv-1", {"complaints": "v1", "kpis": "v1"})
+    subscription.offer({"complaints": "v1", "kpis": "v2"}, {"complaints": ["c1"], "kpis": ["k2"]})
+    assert subscription.take_pending() == {
+        "section_versions": {"complaints": "v1", "kpis": "v2"},
+        "changed": {"kpis": ["k2"]},
+    }
+    assert subscription.take_pending()["changed"] == {}
+
+
+def test_bursts_coalesce_into_the_latest_payload():
+    subscription = Subscription(CUSTOMER, "conv-1", {})
+    coalesced = PUSH_SECTIONS_COALESCED.labels().get()
+    subscription.offer({"complaints": "v1"}, {"complaints": ["first"]})
+    subscription.offer({"complaints": "v2"}, {"complaints": ["second"]})
+    subscription.offer({"complaints": "v3", "kpis": "v1"}, {"complaints": ["third"], "kpis": ["k1"]})
+    delta = subscription.take_pending()
+    assert delta["changed"] == {"complaints": ["third"], "kpis": ["k1"]}
+    assert delta["section_versions"] == {"complaints": "v3", "kpis": "v1"}
+    assert PUSH_SECTIONS_COALESCED.labels().get() - coalesced == 2
+
+
+def test_publish_reaches_only_the_customers_subscriptions(fake_bigquery, monkeypatch):
+    monkeypatch.setattr(push_service, "PUSH_COALESCE_SECONDS", 0)
+    pack = generate_prep_pack_data(CUSTOMER)
+
+    async def run():
+        hub = UpdateHub()
+        current = hub.subscribe(CUSTOMER, "conv-1", pack.section_versions)
+        behind = hub.subscribe(CUSTOMER, "conv-2", dict(pack.section_versions, complaints="old"))
+        other = hub.subscribe("CUST_000002", "conv-3", {})
+        assert hub.publish(CUSTOMER, pack) == 2
+        assert hub.publish("CUST_UNWATCHED", pack) == 0
+
+        update = await asyncio.wait_for(behind.next_update(), 1)
+        assert list(update["changed"]) == ["complaints"]
+        assert current.take_pending()["changed"] == {}
+        assert other.take_pending()["changed"] == {}
+
+        hub.unsubscribe(behind)
+        hub.unsubscribe(behind)
+        assert len(hub) == 2
+        assert hub.is_watched(CUSTOMER)
+        hub.unsubscribe(current)
+        assert not hub.is_watched(CUSTOMER)
+
+    asyncio.run(run())
+
+
+def test_hub_is_bounded():
+    async def run():
+        hub = UpdateHub(max_subscribers=1)
+        hub.subscribe(CUSTOMER, "conv-1", {})
+        with pytest.raises(HubFull):
+            hub.subscribe(CUSTOMER, "conv-2", {})
+
+    asyncio.run(run())
+
+
+def test_updates_channel_sends_the_catch_up_delta_then_pushes(client, monkeypatch):
+    monkeypatch.setattr(push_service, "PUSH_COALESCE_SECONDS", 0)
+    processed = client.post("/api/v1/process", json={
+        "conversationId": "conv-1", "authorizationCode": "code", "codeVerifier": "verifier",
+    }).json()
+    versions = processed["prep_pack_data"]["section_versions"]
+    customer_id = verify_session(processed["session_token"]).customer_id
+
+    with client.websocket_connect("/api/v1/updates") as websocket:
+        websocket.send_json({"sessionToken": processed["session_token"], "versions": dict(versions, complaints="old")})
+        delta = websocket.receive_json()
+        assert list(delta["changed"]) == ["complaints"]
+        assert delta["section_versions"] == versions
+
+        # A rebuild with different complaints reaches the open channel
+        pack = generate_prep_pack_data(customer_id)
+        pack.complaints = []
+        pack.section_versions = section_versions(pack.model_dump(mode="json"))
+        get_update_hub().publish_threadsafe(customer_id, pack)
+        assert websocket.receive_json()["changed"] == {"complaints": []}
+    assert not get_update_hub().is_watched(customer_id)
+
+
+def test_updates_channel_rejects_a_bad_session_token(client):
+    with client.websocket_connect("/api/v1/updates") as websocket:
+        websocket.send_json({"sessionToken": "garbage", "versions": {}})
+        with pytest.raises(WebSocketDisconnect) as info:
+            websocket.receive_json()
+    assert info.value.code == 1008
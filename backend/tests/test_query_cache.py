@@ -0,0 +1,46 @@
+import time
+from datetime import date
+
+from app.services.bigquery_rows import Row
+from app.services.query_cache import QueryResultCache
+
+
+def rows(*values):
+    index = {"complaint_date": 0, "description": 1}
+    return [Row(v, index) for v in values]
+
+
+QUERY = "SELECT complaint_date, description FROM `d.complaints` WHERE customer_id = @customer_id"
+
+
+def test_query_cache_round_trip(tmp_path):
+    cache = QueryResultCache(str(tmp_path / "queries.sqlite3"), table_ttls={"complaints": 60}, compact_interval=3600)
+    try:
+        assert cache.get(QUERY, {"customer_id": "CUST_1"}) is None
+        cache.put(QUERY, {"customer_id": "CUST_1"}, "complaints", "CUST_1", rows((date(2024, 1, 2), "Fees")))
+        # Whitespace differences share an entry
+        cached = cache.get("  " + QUERY.replace(" ", "\n  "), {"customer_id": "CUST_1"})
+        assert [(r.complaint_date, r.description) for r in cached] == [(date(2024, 1, 2), "Fees")]
+        assert cache.get(QUERY, {"customer_id": "CUST_2"}) is None
+
+        assert cache.invalidate("complaints", "CUST_1") == 1
+        assert cache.get(QUERY, {"customer_id": "CUST_1"}) is None
+    finally:
+        cache.close()
+
+
+def test_query_cache_expiry_and_compaction(tmp_path):
+    cache = QueryResultCache(str(tmp_path / "queries.sqlite3"), max_entries=2, compact_interval=3600)
+    try:
+        cache.limit_ttl(0.01)
+        cache.put(QUERY, {"customer_id": "CUST_0"}, "complaints", "CUST_0", rows())
+        time.sleep(0.02)
+        assert cache.get(QUERY, {"customer_id": "CUST_0"}) is None
+        cache.limit_ttl(60)
+        for i in range(1, 4):
+            cache.put(QUERY, {"customer_id": f"CUST_{i}"}, "complaints", f"CUST_{i}", rows())
+        assert cache.compact() == {"expired": 1, "trimmed": 1}
+        assert cache.get(QUERY, {"customer_id": "CUST_1"}) is None
+        assert cache.get(QUERY, {"customer_id": "CUST_3"}) == []
+    finally:
+        cache.close()
@@ -0,0 +1,181 @@
+import asyncio
+
+import pytest
+
+from app.controllers import conversation_controller
+from app.core.cache import TTLCache
+from app.core.rate_limit import (
+    CoalescingLimiter, InMemoryTokenBuckets, RateLimited, SQLiteTokenBuckets, rate_limit_key,
+)
+from app.core.shared_cache import InMemoryRedis, RedisCache, TieredCache
+
+
+@pytest.fixture(params=["memory", "sqlite"])
+def buckets(request, tmp_path):
+    if request.param == "memory":
+        return InMemoryTokenBuckets(rate=0.5, burst=2)
+    return SQLiteTokenBuckets(str(tmp_path / "buckets.sqlite3"), rate=0.5, burst=2)
+
+
+def test_token_buckets(buckets):
+    assert buckets.take("a") == 0.0
+    assert buckets.take("a") == 0.0
+    assert 0 < buckets.take("a") <= 2.0
+    assert buckets.take("b") == 0.0
+
+
+def test_rate_limit_keys_do_not_reveal_identifiers():
+    key = rate_limit_key("agent-7")
+    assert "agent-7" not in key
+    assert key == rate_limit_key("agent-7") != rate_limit_key("agent-8")
+
+
+class Producer:
+    def __init__(self, delay: float = 0.0):
+        self.delay = delay
+        self.calls = 0
+
+    async def __call__(self):
+        self.calls += 1
+        await asyncio.sleep(self.delay)
+        return {"pack": self.calls}
+
+
+def limiter(agent_burst: int = 10, conversation_burst: int = 1) -> CoalescingLimiter:
+    return CoalescingLimiter(
+        {"agent": InMemoryTokenBuckets(rate=0.01, burst=agent_burst),
+         "conversation": InMemoryTokenBuckets(rate=0.01, burst=conversation_burst)},
+        TTLCache(ttl_seconds=60, name="test_recent_results"),
+    )
+
+
+LIMITS = {"agent": "agent-1", "conversation": "conv-1"}
+
+
+def test_concurrent_calls_share_one_run():
+    produce = Producer(delay=0.05)
+    limited = limiter()
+
+    async def run():
+        return await asyncio.gather(*(limited.run("conv-1", LIMITS, produce) for _ in range(5)))
+
+    results = asyncio.run(run())
+    assert results == [{"pack": 1}] * 5
+    assert produce.calls == 1
+
+
+def test_calls_over_the_limit_get_the_recent_result():
+    produce = Producer()
+    limited = limiter(conversation_burst=1)
+
+    async def run():
+        first = await limited.run("conv-1", LIMITS, produce)
+        second = await limited.run("conv-1", LIMITS, produce)
+        return first, second
+
+    assert asyncio.run(run()) == ({"pack": 1}, {"pack": 1})
+    assert produce.calls == 1
+
+
+def test_calls_over_the_limit_without_a_result_are_rejected():
+    produce = Producer()
+    limited = limiter(agent_burst=1)
+
+    async def run():
+        await limited.run("conv-1", LIMITS, produce)
+        await limited.run("conv-2", {"agent": "agent-1", "conversation": "conv-2"}, produce)
+
+    with pytest.raises(RateLimited) as info:
+        asyncio.run(run())
+    assert info.value.scope == "agent"
+    assert info.value.retry_after >= 1
+
+
+def test_rejected_results_are_neither_stored_nor_shared():
+    produce = Producer(delay=0.05)
+    limited = limiter(conversation_burst=2)
+    keep = lambda result: result["pack"] > 1  # noqa: E731
+
+    async def run():
+        # The second call joins the first, whose result is rejected, and runs on its own
+        results = await asyncio.gather(limited.run("conv-1", LIMITS, produce, keep),
+                                       limited.run("conv-1", LIMITS, produce, keep))
+        assert limited.results.get("conv-1") == {"pack": 2}
+        return results
+
+    assert asyncio.run(run()) == [{"pack": 1}, {"pack": 2}]
+    assert produce.calls == 2
+
+
+def test_joiners_retry_when_the_call_they_joined_is_cancelled():
+    produce = Producer(delay=0.05)
+    limited = limiter(conversation_burst=2)
+
+    async def run():
+        first = asyncio.create_task(limited.run("conv-1", LIMITS, produce))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(limited.run("conv-1", LIMITS, produce))
+        await asyncio.sleep(0.01)
+        first.cancel()
+        return await second
+
+    assert asyncio.run(run()) == {"pack": 2}
+    assert produce.calls == 2
+
+
+def test_failed_calls_propagate_to_joiners():
+    limited = limiter()
+
+    async def fail():
+        await asyncio.sleep(0.05)
+        raise RuntimeError("BigQuery unavailable")
+
+    async def run():
+        return await asyncio.gather(limited.run("conv-1", LIMITS, fail), limited.run("conv-1", LIMITS, fail),
+                                    return_exceptions=True)
+
+    results = asyncio.run(run())
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert limited.results.get("conv-1") is None
+
+
+def test_recent_results_in_a_shared_tier(tmp_path):
+    shared = RedisCache(InMemoryRedis(), ttl_seconds=60, name="test_shared_results")
+    path = str(tmp_path / "buckets.sqlite3")
+    produce = Producer()
+
+    def worker() -> CoalescingLimiter:
+        # Workers share the bucket file and the Redis tier, but not their local tiers
+        return CoalescingLimiter(
+            {"agent": SQLiteTokenBuckets(path, rate=0.01, burst=10),
+             "conversation": SQLiteTokenBuckets(path, rate=0.01, burst=1)},
+            TieredCache(TTLCache(ttl_seconds=5, name="test_local_results"), shared),
+        )
+
+    async def run():
+        return await worker().run("conv-1", LIMITS, produce), await worker().run("conv-1", LIMITS, produce)
+
+    assert asyncio.run(run()) == ({"pack": 1}, {"pack": 1})
+    assert produce.calls == 1
+
+
+def test_process_over_the_agent_limit(client, monkeypatch):
+    limited = limiter(agent_burst=1)
+    monkeypatch.setattr(conversation_controller, "get_rate_limiter", lambda: limited)
+
+    def process(conversation_id):
+        return client.post("/api/v1/process", json={
+            "conversationId": conversation_id, "authorizationCode": "code", "codeVerifier": "verifier",
+        })
+
+    first = process("conv-1")
+    assert first.status_code == 200
+    # Same agent, another conversation: nothing to share, so 429
+    rejected = process("conv-2")
+    assert rejected.status_code == 429
+    assert int(rejected.headers["Retry-After"]) >= 1
+    assert rejected.json() == {"detail": "Too many requests for this agent"}
+    # The first conversation again gets its recent pack rather than a 429
+    repeat = process("conv-1")
+    assert repeat.status_code == 200
+    assert repeat.json()["prep_pack_data"] == first.json()["prep_pack_data"]
@@ -0,0 +1,88 @@
+import asyncio
+import json
+import time
+
+import pytest
+
+from app.routers import health
+from app.services import warmup_service
+from app.services.warmup_service import WarmupState
+
+
+@pytest.fixture
+def state(monkeypatch):
+    """A fresh warm-up state in place of the process-wide one."""
+    state = WarmupState()
+    monkeypatch.setattr(warmup_service, "_state", state)
+    monkeypatch.setattr(health, "get_warmup_state", lambda: state)
+    return state
+
+
+def readiness():
+    response = asyncio.run(health.readiness())
+    return response.status_code, json.loads(response.body)["status"]
+
+
+def test_readiness_follows_warmup(state):
+    assert readiness() == (503, "pending")
+    state.status = "running"
+    assert readiness() == (503, "running")
+    state.status = "done"
+    assert readiness() == (200, "done")
+    state.status = "timed_out"
+    assert readiness() == (200, "timed_out")
+
+
+def test_draining_is_not_ready(state):
+    state.status = "done"
+    state.draining = True
+    assert not state.ready
+    assert readiness() == (503, "draining")
+
+
+def test_warm_up_records_steps_and_failures(state, monkeypatch):
+    def fail():
+        raise RuntimeError("BigQuery unreachable")
+
+    monkeypatch.setattr(warmup_service, "_init_clients", fail)
+    monkeypatch.setattr(warmup_service, "WARMUP_CUSTOMERS", [])
+    asyncio.run(warmup_service.warm_up())
+    assert state.status == "done"
+    assert state.errors == {"clients": "BigQuery unreachable"}
+    assert set(state.steps_ms) == {"clients", "faker", "models"}
+    assert readiness()[0] == 200
+
+
+def test_slow_warm_up_times_out_ready(state, monkeypatch):
+    monkeypatch.setattr(warmup_service, "_init_clients", lambda: time.sleep(0.2))
+    monkeypatch.setattr(warmup_service, "WARMUP_TIMEOUT_SECONDS", 0.05)
+    asyncio.run(warmup_service.warm_up())
+    assert state.status == "timed_out"
+    assert readiness() == (200, "timed_out")
+
+
+def test_shutdown_reports_draining_for_the_drain_period(state, monkeypatch):
+    state.status = "done"
+    monkeypatch.setattr(warmup_service, "SHUTDOWN_DRAIN_SECONDS", 0.05)
+
+    async def run():
+        stopping = asyncio.create_task(warmup_service.stop_warmup())
+        await asyncio.sleep(0.01)
+        # Still inside the drain wait, and already not ready
+        status_code = (await health.readiness()).status_code
+        assert not stopping.done()
+        await asyncio.wait_for(stopping, 1)
+        return status_code
+
+    assert asyncio.run(run()) == 503
+    assert state.draining
+
+
+def test_ready_route(client, state):
+    response = client.get("/health/ready")
+    assert (response.status_code, response.json()["status"]) == (503, "pending")
+    state.status = "done"
+    assert client.get("/health/ready").status_code == 200
+    state.draining = True
+    response = client.get("/health/ready")
+    assert (response.status_code, response.json()["status"]) == (503, "draining")
@@ -0,0 +1,83 @@
+from datetime import date
+
+from app.models.schemas import PREP_PACK_SECTIONS, Complaint
+from app.services.prep_pack_service import (
+    cached_section, changed_sections, generate_prep_pack_data, invalidate_sections, section_versions,
+)
+
+# Has one row in bq_mock_data/complaints
+CUSTOMER = "CUST_000481"
+
+
+def test_section_versions_follow_content(fake_bigquery):
+    pack = generate_prep_pack_data(CUSTOMER)
+    assert set(pack.section_versions) == set(PREP_PACK_SECTIONS)
+    assert section_versions(pack.model_dump(mode="json")) == pack.section_versions
+    # The same customer always gets the same pack, so the same versions
+    assert generate_prep_pack_data(CUSTOMER).section_versions == pack.section_versions
+
+    sections = pack.model_dump(mode="json")
+    sections["complaints"] = []
+    versions = section_versions(sections)
+    assert [name for name in PREP_PACK_SECTIONS if versions[name] != pack.section_versions[name]] == ["complaints"]
+
+
+def test_changed_sections(fake_bigquery):
+    pack = generate_prep_pack_data(CUSTOMER)
+    assert changed_sections(pack, pack.section_versions) == {}
+    assert set(changed_sections(pack, {})) == set(PREP_PACK_SECTIONS)
+
+    stale = dict(pack.section_versions, complaints="outdated")
+    assert changed_sections(pack, stale) == {"complaints": pack.model_dump(mode="json")["complaints"]}
+
+
+def test_sections_come_from_bigquery_and_are_cached(fake_bigquery):
+    pack = generate_prep_pack_data(CUSTOMER)
+    assert [c.date for c in pack.complaints] == [date(2024, 4, 12)]
+    queries = dict(fake_bigquery.queries_by_table)
+    assert queries["complaints"] == 1
+
+    generate_prep_pack_data(CUSTOMER)
+    assert fake_bigquery.queries_by_table == queries
+
+
+def test_invalidation_evicts_sections(fake_bigquery):
+    generate_prep_pack_data(CUSTOMER)
+    assert invalidate_sections([("complaints", CUSTOMER)]) == 1
+    generate_prep_pack_data(CUSTOMER)
+    assert fake_bigquery.queries_by_table["complaints"] == 2
+    assert fake_bigquery.queries_by_table["inhibits"] == 1
+
+
+def test_result_invalidated_while_in_flight_is_not_cached(fake_bigquery):
+    section = [Complaint(date=date(2024, 1, 1), description="stale", status="open")]
+    fetches = []
+
+    def fetch(customer_id):
+        fetches.append(customer_id)
+        if len(fetches) == 1:
+            # The change event lands while this query is still running
+            invalidate_sections([("complaints", customer_id)])
+        return section
+
+    assert cached_section("complaints", "CUST_X", fetch) == section
+    assert cached_section("complaints", "CUST_X", fetch) == section
+    assert cached_section("complaints", "CUST_X", fetch) == section
+    assert len(fetches) == 2
+
+
+def test_failed_fetches_are_not_cached(fake_bigquery):
+    fetches = []
+
+    def fetch(customer_id):
+        fetches.append(customer_id)
+        return None
+
+    assert cached_section("complaints", "CUST_X", fetch) is None
+    assert cached_section("complaints", "CUST_X", fetch) is None
+    assert len(fetches) == 2
+
+
+def test_cached_only_never_queries(fake_bigquery):
+    generate_prep_pack_data("CUST_000001", cached_only=True)
+    assert fake_bigquery.queries_by_table == {}
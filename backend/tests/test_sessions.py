@@ -0,0 +1,59 @@
+import time
+
+import pytest
+
+from app.services.session_service import InvalidSession, issue_session, verify_session
+
+KEY = b"k" * 32
+
+
+def test_session_round_trip():
+    token = issue_session("conv-1", "CUST_1", "agent-1", key=KEY)
+    session = verify_session(token, key=KEY)
+    assert (session.conversation_id, session.customer_id, session.agent_id) == ("conv-1", "CUST_1", "agent-1")
+
+
+@pytest.mark.parametrize("mangle", [
+    lambda token: token + "x",
+    lambda token: "e30" + token[3:],
+    lambda token: token.partition(".")[0],
+    lambda token: "garbage",
+])
+def test_tampered_tokens_are_rejected(mangle):
+    token = issue_session("conv-1", "CUST_1", "agent-1", key=KEY)
+    with pytest.raises(InvalidSession):
+        verify_session(mangle(token), key=KEY)
+
+
+def test_tokens_are_bound_to_the_key():
+    token = issue_session("conv-1", "CUST_1", "agent-1", key=KEY)
+    with pytest.raises(InvalidSession):
+        verify_session(token, key=b"other")
+
+
+def test_expired_sessions_are_rejected():
+    token = issue_session("conv-1", "CUST_1", "agent-1", ttl=60, key=KEY)
+    verify_session(token, key=KEY, now=time.time() + 30)
+    with pytest.raises(InvalidSession):
+        verify_session(token, key=KEY, now=time.time() + 61)
+
+
+PROCESS = {"conversationId": "conv-1", "authorizationCode": "code", "codeVerifier": "verifier"}
+
+
+def test_sync_takes_the_session_token_from_process(client):
+    processed = client.post("/api/v1/process", json=PROCESS).json()
+    versions = processed["prep_pack_data"]["section_versions"]
+
+    response = client.post("/api/v1/sync", json={"sessionToken": processed["session_token"], "versions": versions})
+    assert response.status_code == 200
+    assert response.json() == {"section_versions": versions, "changed": {}}
+
+    stale = dict(versions, complaints="outdated")
+    delta = client.post("/api/v1/sync", json={"sessionToken": processed["session_token"], "versions": stale}).json()
+    assert list(delta["changed"]) == ["complaints"]
+
+
+def test_sync_rejects_a_bad_session_token(client):
+    response = client.post("/api/v1/sync", json={"sessionToken": "garbage", "versions": {}})
+    assert response.status_code == 401
@@ -0,0 +1,116 @@
+import sys
+import time
+from types import SimpleNamespace
+from datetime import date, datetime
+from decimal import Decimal
+
+import pytest
+
+from app.core.cache import TTLCache
+from app.core import shared_cache
+from app.core.shared_cache import InMemoryRedis, RedisCache, SQLiteCache, TieredCache, dumps, loads, redis_client
+from app.models.schemas import Complaint
+
+COMPLAINT = Complaint(date=date(2024, 4, 12), description="Fees", status="Closed")
+
+
+def test_codec_round_trip():
+    value = {"when": datetime(2024, 1, 2, 3, 4, 5), "day": date(2024, 1, 2), "amount": Decimal("1.10"),
+             "sections": [COMPLAINT], "text": "x" * 1000}
+    assert loads(dumps(value)) == value
+    # Large entries are compressed
+    assert len(dumps(value)) < 1000
+
+
+def test_codec_rejects_unknown_values():
+    with pytest.raises(TypeError):
+        dumps(object())
+    with pytest.raises(ValueError):
+        loads(b"\xffunknown")
+
+
+@pytest.fixture(params=["sqlite", "redis"])
+def shared(request, tmp_path):
+    if request.param == "sqlite":
+        return SQLiteCache(str(tmp_path / "shared.sqlite3"), ttl_seconds=60, max_size=3, name="test_sqlite")
+    return RedisCache(InMemoryRedis(), ttl_seconds=60, max_size=3, name="test_redis")
+
+
+def test_shared_tier_get_set_delete(shared):
+    shared.set(("complaints", "CUST_1"), [COMPLAINT])
+    assert shared.get(("complaints", "CUST_1")) == [COMPLAINT]
+    assert shared.get(("complaints", "CUST_2"), "default") == "default"
+    shared.delete(("complaints", "CUST_1"))
+    assert shared.get(("complaints", "CUST_1")) is None
+    assert (shared.hits, shared.misses) == (1, 2)
+
+
+def test_shared_tier_expiry(shared):
+    shared.set("short", 1, ttl_seconds=0.01)
+    time.sleep(0.02)
+    assert shared.get("short") is None
+
+
+def test_shared_tier_clear(shared):
+    shared.set("a", 1)
+    shared.set("b", 2)
+    assert len(shared) == 2
+    shared.clear()
+    assert len(shared) == 0
+
+
+def test_sqlite_tier_is_shared_between_instances(tmp_path):
+    path = str(tmp_path / "shared.sqlite3")
+    writer = SQLiteCache(path, ttl_seconds=60, name="test_shared")
+    reader = SQLiteCache(path, ttl_seconds=60, name="test_shared")
+    other = SQLiteCache(path, ttl_seconds=60, name="test_other")
+    writer.set("key", {"day": date(2024, 1, 2)})
+    assert reader.get("key") == {"day": date(2024, 1, 2)}
+    # Caches sharing the file are kept apart by name
+    assert other.get("key") is None
+
+
+def test_sqlite_tier_is_bounded(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "shared.sqlite3"), ttl_seconds=60, max_size=3, name="test_bounded")
+    writes = SQLiteCache.EVICT_CHECK_EVERY
+    for i in range(writes):
+        cache.set(i, i)
+    assert len(cache) <= 3
+    assert cache.get(writes - 1) == writes - 1
+
+
+def test_sqlite_tier_treats_foreign_entries_as_misses(tmp_path):
+    cache = SQLiteCache(str(tmp_path / "shared.sqlite3"), ttl_seconds=60, name="test_foreign")
+    cache.set("key", 1)
+    cache._connection().execute("UPDATE entries SET value = ?", (b"\xffunknown",))
+    assert cache.get("key") is None
+
+
+def test_tiered_cache_fills_local_tier_and_deletes_both():
+    shared = RedisCache(InMemoryRedis(), ttl_seconds=60, name="test_tiered_shared")
+    first = TieredCache(TTLCache(ttl_seconds=5, name="test_tiered_a"), shared)
+    second = TieredCache(TTLCache(ttl_seconds=5, name="test_tiered_b"), shared)
+
+    first.set("key", [COMPLAINT])
+    assert second.get("key") == [COMPLAINT]
+    assert second.local.get("key") == [COMPLAINT]
+
+    second.delete("key")
+    assert shared.get("key") is None
+    assert second.get("key") is None
+    # The other worker's local copy lives until its (short) local TTL runs out
+    assert first.get("key") == [COMPLAINT]
+
+
+def test_one_redis_client_per_url(monkeypatch):
+    created = []
+
+    def from_url(url):
+        created.append(url)
+        return InMemoryRedis()
+
+    monkeypatch.setitem(sys.modules, "redis", SimpleNamespace(Redis=SimpleNamespace(from_url=from_url)))
+    monkeypatch.setattr(shared_cache, "_redis_clients", {})
+    assert redis_client("redis://cache-a") is redis_client("redis://cache-a")
+    assert redis_client("redis://cache-b") is not redis_client("redis://cache-a")
+    assert created == ["redis://cache-a", "redis://cache-b"]
@@ -1,28 +1,134 @@
 import requests
+import json
+import logging
 import os
-from typing import Dict, Any
+import random
+import threading
+import time
+from typing import Dict, Any, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 # It's a good practice to have the backend URL configurable
 BACKEND_URL = os.getenv("BACKEND_URL", "http://localhost:8000")
 API_V1_PREFIX = "/api/v1"
 
+# Connect fails fast when the backend is down; read allows for a cold prep pack build
+CONNECT_TIMEOUT_SECONDS = float(os.getenv("BACKEND_CONNECT_TIMEOUT_SECONDS", "3.05"))
+READ_TIMEOUT_SECONDS = float(os.getenv("BACKEND_READ_TIMEOUT_SECONDS", "30"))
+POOL_SIZE = int(os.getenv("BACKEND_POOL_SIZE", "10"))
+# Retries of a 503 from /sync, after its Retry-After. /process is never retried: by the
+# time an overloaded backend turns its build away, the single-use auth code is spent
+OVERLOAD_RETRIES = int(os.getenv("BACKEND_OVERLOAD_RETRIES", "1"))
+
+# Optional local span log (same JSON-lines format as the backend's TRACE_FILE)
+TRACE_FILE = os.getenv("TRACE_FILE")
+
+logger = logging.getLogger(__name__)
+
+
+_session: Optional[requests.Session] = None
+_session_lock = threading.Lock()
+
+
+def _adapter(overload_retries: int) -> HTTPAdapter:
+    retries = Retry(total=2 + overload_retries, connect=2, read=0, status=overload_retries,
+                    status_forcelist=[503] if overload_retries else [], allowed_methods=None,
+                    backoff_factor=0.2, respect_retry_after_header=True, raise_on_status=False)
+    return HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE, max_retries=retries)
+
+
+def get_session() -> requests.Session:
+    """
+    Returns the process-wide keep-alive session shared by every Streamlit
+    script run. Failed connection attempts are retried (nothing was sent);
+    reads are not, since every call is a POST. Only /sync, which is safe to
+    repeat, also retries a 503 after its Retry-After.
+    """
+    global _session
+    if _session is None:
+        with _session_lock:
+            if _session is None:
+                session = requests.Session()
+                adapter = _adapter(0)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                # The longest matching prefix wins, so /sync calls get their own adapter
+                session.mount(f"{BACKEND_URL}{API_V1_PREFIX}/sync", _adapter(OVERLOAD_RETRIES))
+                _session = session
+    return _session
+
+
+def _new_traceparent() -> Dict[str, str]:
+    """Starts a new W3C trace for one backend call."""
+    trace_id = f"{random.getrandbits(128):032x}"
+    span_id = f"{random.getrandbits(64):016x}"
+    return {"trace_id": trace_id, "span_id": span_id, "header": f"00-{trace_id}-{span_id}-01"}
+
+
+def _record_span(trace: Dict[str, str], name: str, start_time: float, duration_ms: float, attributes: Dict[str, Any]):
+    if not TRACE_FILE:
+        return
+    span = {
+        "service": "bcs-assist-frontend",
+        "trace_id": trace["trace_id"],
+        "span_id": trace["span_id"],
+        "parent_span_id": None,
+        "name": name,
+        "start_time": start_time,
+        "duration_ms": round(duration_ms, 3),
+        "status": "ok" if attributes.get("http.status_code", 500) < 400 else "error",
+        "attributes": attributes,
+    }
+    with open(TRACE_FILE, "a") as f:
+        f.write(json.dumps(span) + "\n")
+
+
+def _post(path: str, payload: Dict[str, Any], conversation_id: str) -> Optional[Dict[str, Any]]:
+    """POSTs to a backend API path over the shared session; returns the JSON body or None on failure."""
+    endpoint = f"{BACKEND_URL}{API_V1_PREFIX}{path}"
+
+    # Propagate a trace context so the backend spans join this call's trace
+    trace = _new_traceparent()
+    start_time = time.time()
+    start = time.perf_counter()
+    attributes = {"http.url": endpoint, "conversation_id": conversation_id}
+    try:
+        response = get_session().post(
+            endpoint, json=payload, headers={"traceparent": trace["header"]},
+            timeout=(CONNECT_TIMEOUT_SECONDS, READ_TIMEOUT_SECONDS)
+        )
+        attributes["http.status_code"] = response.status_code
+        response.raise_for_status()  # Raises an exception for 4XX/5XX errors
+        return response.json()
+    except requests.exceptions.RequestException as e:
+        logger.warning("Backend call to %s failed (trace %s): %s", path, trace['trace_id'], e)
+        return None
+    finally:
+        _record_span(trace, f"POST {API_V1_PREFIX}{path}", start_time, (time.perf_counter() - start) * 1000, attributes)
+
+
 def get_prep_pack_data(conversation_id: str, auth_code: str, code_verifier: str) -> Dict[str, Any]:
     """
     Calls the backend to get the prep pack data for the dashboard.
     """
-    endpoint = f"{BACKEND_URL}{API_V1_PREFIX}/process"
-    
     payload = {
         "conversationId": conversation_id,
         "authorizationCode": auth_code,
         "codeVerifier": code_verifier,
     }
+    return _post("/process", payload, conversation_id)
 
-    try:
-        response = requests.post(endpoint, json=payload)
-        response.raise_for_status()  # Raises an exception for 4XX/5XX errors
-        return response.json()
-    except requests.exceptions.RequestException as e:
-        # In a real app, you'd want more robust error handling and logging
-        print(f"An error occurred while calling the backend: {e}")
-        return None
+
+def sync_prep_pack(conversation_id: str, session_token: str,
+                   versions: Dict[str, str]) -> Optional[Dict[str, Any]]:
+    """
+    Asks the backend which prep pack sections changed since the given version
+    vector, using the session token from the /process response (the auth code
+    is single-use). Returns {"section_versions": ..., "changed": {section: data}}.
+    """
+    payload = {
+        "sessionToken": session_token,
+        "versions": versions,
+    }
+    return _post("/sync", payload, conversation_id)
@@ -1,5 +1,8 @@
+import os
+import time
 import streamlit as st
-from api_client import get_prep_pack_data
+from api_client import get_prep_pack_data, sync_prep_pack
+from push_client import open_channel
 from components import (
     render_kpi_row, render_network_relationship, render_summary_text, render_ai_insights,
     render_chart, render_transaction_summary,
@@ -27,6 +30,23 @@ st.markdown("""
         .block-container {
             padding-top: 2rem;
         }
+        /* Pre-built list sections (components._render_list_section) */
+        .bcs-list-item {
+            padding: 0.6rem 0;
+            border-bottom: 1px solid rgba(49, 51, 63, 0.2);
+        }
+        .bcs-caption {
+            color: rgba(49, 51, 63, 0.6);
+            font-size: 0.875rem;
+            margin-top: 0.25rem;
+        }
+        .bcs-quote {
+            background-color: rgba(28, 131, 225, 0.1);
+            color: #004280;
+            border-radius: 0.5rem;
+            padding: 0.75rem 1rem;
+            margin-top: 0.5rem;
+        }
     </style>
 """, unsafe_allow_html=True)
 
@@ -53,16 +73,81 @@ if "conversationId" in query_params:
     st.toast(f"Loaded Context for Conversation: {CONVERSATION_ID}", icon="✅")
 
 
-@st.cache_data(show_spinner=False)
-def load_data(conversation_id, auth_code, code_verifier):
-    return get_prep_pack_data(conversation_id, auth_code, code_verifier)
+def load_prep_pack(conversation_id, auth_code, code_verifier):
+    """
+    This session's copy of the prep pack, which pushed or polled updates keep
+    current. The auth code is single-use, so /process is called once per
+    session and conversation; its pack and session token are kept in
+    session_state and every later refresh goes through /sync. A failed call
+    is remembered too rather than retried with the spent code.
+    """
+    key = f"prep_pack:{conversation_id}"
+    if key not in st.session_state:
+        data = get_prep_pack_data(conversation_id, auth_code, code_verifier) or {}
+        st.session_state[key] = {
+            "pack": dict(data['prep_pack_data']) if 'prep_pack_data' in data else None,
+            "session_token": data.get('session_token'),
+            # An overload fallback pack is replaced by the next /sync, even while push is connected
+            "degraded": bool(data.get('degraded')),
+            "synced_at": time.monotonic(),
+        }
+    return st.session_state[key]
+
+
+# "push" subscribes to the backend's update channel; "poll" only polls /sync
+PREP_PACK_UPDATES = os.getenv("PREP_PACK_UPDATES", "push")
+# How often the fragment applies pushed updates (a local check, no backend call)
+PREP_PACK_PUSH_CHECK_SECONDS = float(os.getenv("PREP_PACK_PUSH_CHECK_SECONDS", "2"))
+# Without a push connection the dashboard polls /sync for changed sections (0 disables)
+PREP_PACK_POLL_SECONDS = float(os.getenv("PREP_PACK_POLL_SECONDS", "30"))
+# Sections rendered inside the live fragment; a change anywhere else reruns the whole page
+LIVE_SECTIONS = {"inhibits", "journeys", "complaints", "ics_results"}
+LIVE_INTERVAL_SECONDS = PREP_PACK_PUSH_CHECK_SECONDS if PREP_PACK_UPDATES == "push" else PREP_PACK_POLL_SECONDS
+
+
+def push_channel(conversation_id, session_token, versions):
+    """This session's push subscription, reopened if it went idle."""
+    key = f"push:{conversation_id}"
+    channel = st.session_state.get(key)
+    if channel is None or channel.closed:
+        channel = st.session_state[key] = open_channel(conversation_id, session_token, versions)
+    return channel
+
+
+@st.fragment(run_every=LIVE_INTERVAL_SECONDS or None)
+def render_live_sections(conversation_id):
+    state = st.session_state[f"prep_pack:{conversation_id}"]
+    session_token = state["session_token"]
+    pack = state["pack"]
+    delta = None
+    channel = None
+    if PREP_PACK_UPDATES == "push" and session_token:
+        channel = push_channel(conversation_id, session_token, pack.get('section_versions', {}))
+        delta = channel.take()
+    # Fall back to polling while the push connection is down. The fragment also
+    # runs with every full page run, so only poll when an interval has passed.
+    if (delta is None and (state["degraded"] or not (channel and channel.connected)) and PREP_PACK_POLL_SECONDS
+            and session_token and time.monotonic() - state["synced_at"] >= PREP_PACK_POLL_SECONDS * 0.9):
+        state["synced_at"] = time.monotonic()
+        delta = sync_prep_pack(conversation_id, session_token, pack.get('section_versions', {}))
+        if delta is not None:
+            state["degraded"] = False
+    if delta and delta.get('changed'):
+        pack.update(delta['changed'])
+        pack['section_versions'] = delta['section_versions']
+        if not LIVE_SECTIONS.issuperset(delta['changed']):
+            st.rerun()
+
+    render_inhibits(pack.get('inhibits', []))
+    render_journeys(pack.get('journeys', []))
+    render_complaints(pack.get('complaints', []))
+    render_ics_results(pack.get('ics_results', []))
 
 if CONVERSATION_ID:
     with st.spinner("Authenticating with Genesys & Retrieving Customer Profile..."):
-        data = load_data(CONVERSATION_ID, AUTH_CODE, CODE_VERIFIER)
+        prep_pack = load_prep_pack(CONVERSATION_ID, AUTH_CODE, CODE_VERIFIER)["pack"]
 
-    if data:
-        prep_pack = data.get('prep_pack_data', {})
+    if prep_pack is not None:
     
             # --- Top Row: 3 Columns (No Cards) ---
         col1, col2, col3 = st.columns([1.5, 2, 2], gap="large")
@@ -87,10 +172,7 @@ if CONVERSATION_ID:
         # --- Bottom Row: 2 Columns (No Cards) ---
         col4, col5 = st.columns([1, 2], gap="large")
         with col4:
-            render_inhibits(prep_pack.get('inhibits', []))
-            render_journeys(prep_pack.get('journeys', []))
-            render_complaints(prep_pack.get('complaints', []))
-            render_ics_results(prep_pack.get('ics_results', []))
+            render_live_sections(CONVERSATION_ID)
         with col5:
             st.header("Financial Overview")
             
@@ -102,5 +184,5 @@ if CONVERSATION_ID:
             # Enlarge the transaction summary table
             render_transaction_summary(prep_pack.get('transaction_volume_summary', []))
 else:
-    st.error("Failed to fetch data from the backend. Please ensure the backend server is running.")
+    st.error("Failed to fetch data from the backend. Please ensure the backend server is running, then reopen the widget.")
 
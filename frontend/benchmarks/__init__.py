@@ -0,0 +1 @@
+# Performance benchmarks for the Streamlit frontend (run from the frontend directory with python -m)
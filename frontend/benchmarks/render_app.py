@@ -0,0 +1,251 @@
+"""
+Headless render benchmark for the dashboard (app.py)
+
+Runs the whole Streamlit script with streamlit.testing's AppTest against a
+canned prep pack, so no backend or browser is involved, and times each
+render_* component as well as the full script run. The list sections are
+scaled (10, 100, 1000 rows by default) to show where rendering stops being
+linear; the report includes per-row cost and the number of elements each run
+produced.
+
+The canned pack is built from the bq_mock_data CSVs, cycled to the requested
+length, so runs are comparable across commits.
+
+Usage (from the frontend directory):
+    python -m benchmarks.render_app
+    python -m benchmarks.render_app --sizes 10 100 1000 --repeats 5 --output render.json
+    python -m benchmarks.render_app --compare render.json
+"""
+
+import argparse
+import csv
+import functools
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Callable, Dict, List, Optional
+
+FRONTEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..")
+DATA_DIR = os.path.join(FRONTEND_DIR, "..", "bq_mock_data")
+
+LIST_SECTIONS = ("inhibits", "journeys", "complaints", "ics_results")
+
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True,
+                                       stderr=subprocess.DEVNULL).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def _read_table(name: str) -> List[Dict[str, str]]:
+    with open(os.path.join(DATA_DIR, name), newline="") as f:
+        return list(csv.DictReader(f))
+
+
+def _cycled(rows: List[Dict], count: int) -> List[Dict]:
+    return [rows[i % len(rows)] for i in range(count)]
+
+
+def canned_prep_pack(rows: int) -> Dict:
+    """A prep pack payload shaped like the backend's, with rows entries in each list section."""
+    inhibits = [{"title": r["inhibit_name"], "description": r["inhibit_desc"], "date": r["inhibit_date"]}
+                for r in _cycled(_read_table("inhibits"), rows)]
+    journeys = [{"title": r["journey_name"], "subtitle": r["journey_desc"], "status": r["status"],
+                 "date": r["journey_date"]}
+                for r in _cycled(_read_table("journeys"), rows)]
+    complaints = [{"date": r["complaint_date"], "description": r["description"], "status": r["status"]}
+                  for r in _cycled(_read_table("complaints"), rows)]
+    ics_results = [{"date": r["score_date"], "score": r["ics_score"], "quote": r["ics_summary"]}
+                   for r in _cycled(_read_table("ics_results"), rows)]
+    months = ["Jan", "Feb", "Mar", "Apr", "May", "Jun", "Jul", "Aug", "Sep", "Oct", "Nov", "Dec"]
+    return {
+        "prep_pack_data": {
+            "summary_text": "Customer CUST_000001 is a valued HSBC client with comprehensive banking relationships.",
+            "network_relationship": {
+                "cin": "1047382956", "parent": "Acme Corporation PLC", "md_name": "Acme Group", "md_id": "1025",
+                "linked_businesses": ["Acme Manufacturing Ltd", "Acme Distribution Inc"],
+            },
+            "ai_insights": [f"Insight {i}" for i in range(4)],
+            "kpis": [{"title": f"KPI {i}", "value": str(i), "sub_lines": ["+0.2%", "from previous quarter"]}
+                     for i in range(10)],
+            "inhibits": inhibits,
+            "journeys": journeys,
+            "complaints": complaints,
+            "ics_results": ics_results,
+            "monthly_revenue_distribution": {
+                "title": "Monthly Revenue Distribution",
+                "data": [{"label": m, "value": 2000 + 250 * i} for i, m in enumerate(months)],
+            },
+            "monthly_revenue_trend": {
+                "title": "Monthly Revenue Trend",
+                "data": [{"label": m, "value": 80 + 3 * i} for i, m in enumerate(months)],
+            },
+            "transaction_volume_summary": [
+                {"date": "2023-11-04", "product": "Retail Payments", "amount": "£68,400", "status": "completed"},
+                {"date": "2023-11-02", "product": "Commercial Cards", "amount": "£23,400", "status": "completed"},
+                {"date": "2023-10-25", "product": "Retail Payments", "amount": "£54,720", "status": "completed"},
+                {"date": "2023-10-22", "product": "Trade Finance", "amount": "£27,600", "status": "completed"},
+            ],
+        }
+    }
+
+
+class ComponentTimer:
+    """Wraps the render_* functions in components.py so each call is timed."""
+
+    def __init__(self):
+        self.current: Dict[str, float] = {}
+
+    def wrap(self, name: str, func: Callable) -> Callable:
+        @functools.wraps(func)
+        def timed(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                self.current[name] = self.current.get(name, 0.0) + (time.perf_counter() - start) * 1000
+        return timed
+
+    def install(self) -> None:
+        import components
+
+        for name in dir(components):
+            if name.startswith("render_"):
+                setattr(components, name, self.wrap(name, getattr(components, name)))
+
+
+def _count_elements(node) -> int:
+    children = getattr(node, "children", None)
+    if not children:
+        return 1
+    values = children.values() if isinstance(children, dict) else children
+    return 1 + sum(_count_elements(child) for child in values)
+
+
+def _summary(values: List[float]) -> Dict[str, float]:
+    values = sorted(values)
+    return {
+        "median_ms": round(statistics.median(values), 3),
+        "min_ms": round(values[0], 3),
+        "max_ms": round(values[-1], 3),
+    }
+
+
+def run_size(rows: int, repeats: int, timer: ComponentTimer, timeout: float) -> Dict:
+    from streamlit.testing.v1 import AppTest
+
+    script_ms: List[float] = []
+    components_ms: Dict[str, List[float]] = {}
+    elements = None
+    for i in range(repeats + 1):
+        at = AppTest.from_file(os.path.join(FRONTEND_DIR, "app.py"), default_timeout=timeout)
+        # A fresh conversation per run, so only the first load goes through the data layer
+        at.query_params["conversationId"] = f"bench-render-{rows}-{i}"
+        timer.current = {}
+        start = time.perf_counter()
+        at.run()
+        elapsed = (time.perf_counter() - start) * 1000
+        if at.exception:
+            raise RuntimeError(f"app.py raised while rendering {rows} rows: {at.exception[0].message}")
+        if i == 0:
+            continue  # warm-up: imports and the first cache fill are not rendering cost
+        script_ms.append(elapsed)
+        for name, duration in timer.current.items():
+            components_ms.setdefault(name, []).append(duration)
+        elements = _count_elements(at._tree)
+
+    components = {name: _summary(values) for name, values in sorted(components_ms.items())}
+    for section in LIST_SECTIONS:
+        stats = components.get(f"render_{section}")
+        if stats:
+            stats["per_row_us"] = round(stats["median_ms"] * 1000 / rows, 2)
+    return {"rows": rows, "script": _summary(script_ms), "elements": elements, "components": components}
+
+
+def compare(result: Dict, baseline: Dict, max_regression: float) -> List[str]:
+    regressions = []
+    old_sizes = {entry["rows"]: entry for entry in baseline.get("sizes", [])}
+    for entry in result["sizes"]:
+        old = old_sizes.get(entry["rows"])
+        if old is None:
+            continue
+        new_ms, old_ms = entry["script"]["median_ms"], old["script"]["median_ms"]
+        if old_ms and new_ms > old_ms * (1 + max_regression):
+            regressions.append(f"script at {entry['rows']} rows: {old_ms} -> {new_ms} ms")
+        for name, stats in entry["components"].items():
+            old_stats = old["components"].get(name)
+            if old_stats and old_stats["median_ms"] and stats["median_ms"] > old_stats["median_ms"] * (1 + max_regression):
+                regressions.append(f"{name} at {entry['rows']} rows: {old_stats['median_ms']} -> {stats['median_ms']} ms")
+    return regressions
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(description="Headless render benchmark for the Streamlit dashboard")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10, 100, 1000], help="Rows per list section")
+    parser.add_argument("--repeats", type=int, default=5, help="Timed script runs per size")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Seconds allowed for one script run")
+    parser.add_argument("--output", help="Write the JSON report here as well as to stdout")
+    parser.add_argument("--compare", help="Baseline JSON report to compare against")
+    parser.add_argument("--max-regression", type=float, default=0.15,
+                        help="Allowed fractional slowdown before --compare fails")
+    return parser
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = build_parser().parse_args(argv)
+    # No backend is running, so keep the dashboard from opening push connections
+    os.environ.setdefault("PREP_PACK_UPDATES", "poll")
+    sys.path.insert(0, os.path.abspath(FRONTEND_DIR))
+    # Streamlit logs a warning per call outside a real session; keep stderr readable
+    for name in ("streamlit.runtime.scriptrunner_utils.script_run_context", "streamlit.deprecation_util"):
+        logging.getLogger(name).addFilter(lambda record: False)
+
+    import api_client
+
+    timer = ComponentTimer()
+    timer.install()
+    payloads: Dict[int, Dict] = {}
+
+    def canned_get_prep_pack_data(conversation_id, *args, **kwargs):
+        rows = int(conversation_id.split("-")[2])
+        if rows not in payloads:
+            payloads[rows] = canned_prep_pack(rows)
+        return payloads[rows]
+
+    # app.py imports the function by name at each run, so patching the module is enough
+    api_client.get_prep_pack_data = canned_get_prep_pack_data
+
+    sizes = [run_size(rows, args.repeats, timer, args.timeout) for rows in args.sizes]
+    result = {
+        "benchmark": "render_app",
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(),
+        "config": {"sizes": args.sizes, "repeats": args.repeats, "python": sys.version.split()[0]},
+        "sizes": sizes,
+    }
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        regressions = compare(result, baseline, args.max_regression)
+        result["comparison"] = {"baseline_commit": baseline.get("commit"), "regressions": regressions}
+        exit_code = 1 if regressions else 0
+
+    report = json.dumps(result, indent=2)
+    print(report)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(report + "\n")
+    return exit_code
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,9 +1,15 @@
+import os
 import streamlit as st
 import pandas as pd
+from html import escape
 from typing import List, Dict, Any
 
 HSBC_RED = "#db0011"
 
+# List sections show this many rows inline; the rest go in a collapsed, scrollable table
+LIST_PREVIEW_ROWS = int(os.getenv("LIST_PREVIEW_ROWS", "10"))
+LIST_TABLE_HEIGHT = 400
+
 def render_kpi_row(kpis: List[Dict[str, Any]], num_columns: int):
     """Renders a row of KPIs with colored sub-lines."""
     cols = st.columns(num_columns)
@@ -47,37 +53,71 @@ def render_ai_insights(insights: List[str]):
     for insight in insights:
         st.markdown(f"💡 {insight}")
 
+def _html_text(value: Any) -> str:
+    # Escaped, with line breaks as <br>: a newline in the data would end the raw HTML block
+    return "<br>".join(escape(str(value)).splitlines())
+
+def _list_html(rows: List[str]) -> str:
+    # One line, no blank lines: markdown must treat the whole block as raw HTML
+    return "<div class='bcs-list'>" + "".join(f"<div class='bcs-list-item'>{row}</div>" for row in rows) + "</div>"
+
+def _render_list_section(title: str, items: List[Dict[str, Any]], row_html, columns: List[str]):
+    """
+    Renders a list section as one HTML block for the first LIST_PREVIEW_ROWS
+    items and one scrollable dataframe (virtualised by Streamlit) for the rest,
+    inside a collapsed expander. The element count stays the same however
+    long the history is, instead of three or four elements per row.
+    """
+    st.subheader(title)
+    if not items:
+        st.caption("Nothing to display.")
+        return
+    st.markdown(_list_html([row_html(item) for item in items[:LIST_PREVIEW_ROWS]]), unsafe_allow_html=True)
+    remaining = items[LIST_PREVIEW_ROWS:]
+    if remaining:
+        with st.expander(f"Show {len(remaining)} more"):
+            st.dataframe(
+                pd.DataFrame(remaining, columns=columns),
+                use_container_width=True,
+                hide_index=True,
+                height=min(LIST_TABLE_HEIGHT, (len(remaining) + 1) * 35 + 3)
+            )
+
 def render_inhibits(inhibits: List[Dict[str, Any]]):
     """Renders the Inhibits section."""
-    st.subheader("Inhibits")
-    for item in inhibits:
-        st.markdown(f"**{item['title']}** ({item['date']})")
-        st.caption(item['description'])
-        st.divider()
+    _render_list_section(
+        "Inhibits", inhibits,
+        lambda item: (f"<strong>{_html_text(item['title'])}</strong> ({_html_text(item['date'])})"
+                      f"<div class='bcs-caption'>{_html_text(item['description'])}</div>"),
+        ["date", "title", "description"]
+    )
 
 def render_journeys(journeys: List[Dict[str, Any]]):
     """Renders the Journeys section."""
-    st.subheader("Journeys")
-    for item in journeys:
-        st.markdown(f"**{item['title']}** - `{item['status']}`")
-        st.caption(f"{item['subtitle']} ({item['date']})")
-        st.divider()
+    _render_list_section(
+        "Journeys", journeys,
+        lambda item: (f"<strong>{_html_text(item['title'])}</strong> - <code>{_html_text(item['status'])}</code>"
+                      f"<div class='bcs-caption'>{_html_text(item['subtitle'])} ({_html_text(item['date'])})</div>"),
+        ["date", "title", "status", "subtitle"]
+    )
 
 def render_complaints(complaints: List[Dict[str, Any]]):
     """Renders the Complaints section."""
-    st.subheader("Complaints")
-    for item in complaints:
-        st.markdown(f"**{item['description']}** - `{item['status']}`")
-        st.caption(f"Date: {item['date']}")
-        st.divider()
+    _render_list_section(
+        "Complaints", complaints,
+        lambda item: (f"<strong>{_html_text(item['description'])}</strong> - <code>{_html_text(item['status'])}</code>"
+                      f"<div class='bcs-caption'>Date: {_html_text(item['date'])}</div>"),
+        ["date", "status", "description"]
+    )
 
 def render_ics_results(results: List[Dict[str, Any]]):
     """Renders the ICS Results section."""
-    st.subheader("ICS Results")
-    for item in results:
-        st.markdown(f"**Score: {item['score']}** ({item['date']})")
-        st.info(f"'{item['quote']}'")
-        st.divider()
+    _render_list_section(
+        "ICS Results", results,
+        lambda item: (f"<strong>Score: {_html_text(item['score'])}</strong> ({_html_text(item['date'])})"
+                      f"<div class='bcs-quote'>'{_html_text(item['quote'])}'</div>"),
+        ["date", "score", "quote"]
+    )
         
 def render_chart(chart_data: Dict[str, Any], chart_type: str = "bar"):
     """Renders a chart (bar or line) with HSBC red."""
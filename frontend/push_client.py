@@ -0,0 +1,109 @@
+import asyncio
+import json
+import logging
+import os
+import threading
+import time
+from typing import Any, Dict, Optional
+
+from websockets.asyncio.client import connect
+from websockets.exceptions import WebSocketException
+
+from api_client import API_V1_PREFIX, BACKEND_URL, CONNECT_TIMEOUT_SECONDS
+
+logger = logging.getLogger(__name__)
+
+# A channel nobody has read for this long belongs to a closed browser tab and is dropped
+PUSH_IDLE_SECONDS = float(os.getenv("PREP_PACK_PUSH_IDLE_SECONDS", "300"))
+PUSH_RECONNECT_MAX_SECONDS = float(os.getenv("PREP_PACK_PUSH_RECONNECT_MAX_SECONDS", "30"))
+
+UPDATES_URL = BACKEND_URL.replace("http", "ws", 1) + f"{API_V1_PREFIX}/updates"
+
+
+class PushChannel:
+    """
+    One dashboard session's subscription to /api/v1/updates. Deltas arrive on
+    the shared push thread and are merged here until the page takes them, so
+    however many arrive between two fragment runs the page applies one.
+    Every (re)connect presents the session token from /process; the auth
+    code was spent on that call.
+    """
+
+    def __init__(self, conversation_id: str, session_token: str, versions: Dict[str, str]):
+        self.conversation_id = conversation_id
+        self._session_token = session_token
+        self.versions = dict(versions)
+        self.connected = False
+        self.closed = False
+        self.last_read = time.monotonic()
+        self._changed: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def take(self) -> Optional[Dict[str, Any]]:
+        """Returns the merged delta since the last call ({"section_versions", "changed"}), or None."""
+        with self._lock:
+            self.last_read = time.monotonic()
+            if not self._changed:
+                return None
+            changed, self._changed = self._changed, {}
+            return {"section_versions": dict(self.versions), "changed": changed}
+
+    def _merge(self, delta: Dict[str, Any]) -> None:
+        with self._lock:
+            self._changed.update(delta.get("changed", {}))
+            self.versions = delta.get("section_versions", self.versions)
+
+    def _hello(self) -> str:
+        return json.dumps({
+            "sessionToken": self._session_token,
+            "versions": self.versions,
+        })
+
+    async def _run(self) -> None:
+        """Keeps the subscription open, reconnecting with backoff, until the channel goes idle."""
+        backoff = 0.5
+        while not self._idle():
+            try:
+                async with connect(UPDATES_URL, open_timeout=CONNECT_TIMEOUT_SECONDS) as websocket:
+                    await websocket.send(self._hello())
+                    self.connected = True
+                    backoff = 0.5
+                    while not self._idle():
+                        try:
+                            message = await asyncio.wait_for(websocket.recv(), PUSH_IDLE_SECONDS)
+                        except asyncio.TimeoutError:
+                            continue
+                        self._merge(json.loads(message))
+            except (OSError, asyncio.TimeoutError, WebSocketException) as e:
+                logger.debug("Push channel for %s dropped: %s", self.conversation_id, e)
+            finally:
+                self.connected = False
+            await asyncio.sleep(backoff)
+            backoff = min(backoff * 2, PUSH_RECONNECT_MAX_SECONDS)
+        self.closed = True
+
+    def _idle(self) -> bool:
+        return time.monotonic() - self.last_read > PUSH_IDLE_SECONDS
+
+
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_loop_lock = threading.Lock()
+
+
+def _get_loop() -> asyncio.AbstractEventLoop:
+    """One event loop thread per Streamlit process carries every session's channel."""
+    global _loop
+    if _loop is None:
+        with _loop_lock:
+            if _loop is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="prep-pack-push", daemon=True).start()
+                _loop = loop
+    return _loop
+
+
+def open_channel(conversation_id: str, session_token: str, versions: Dict[str, str]) -> PushChannel:
+    """Subscribes to pushed prep pack updates for a conversation, starting from the given versions."""
+    channel = PushChannel(conversation_id, session_token, versions)
+    asyncio.run_coroutine_threadsafe(channel._run(), _get_loop())
+    return channel